@@ -2,10 +2,22 @@ import discord
 import asyncio
 import logging
 from discord.ext import commands
-from config import BOT_TOKEN, ENABLE_CROSS_POSTING, FORUM_CHANNEL_ID, ALLOWED_ROLES, UNIVERSE_ID, ROBLOX_API_KEY
-from moderation import setup_moderation_commands
+from config import BOT_TOKEN, ENABLE_CROSS_POSTING, FORUM_CHANNEL_ID, DISCORD_UPDATES_CHANNEL_ID, UNIVERSE_ID, ROBLOX_API_KEY, REST_MAX_RATELIMIT_WAIT
+from moderation import (
+    setup_moderation_commands, handle_ban_command, handle_kick_command,
+    handle_timeout_command, handle_ticketblacklist_command, handle_modstats_command
+)
 from crosspost import handle_discord_update_message, setup_cross_posting, cleanup_cross_posting
 from robloxBan import setup_roblox_ban_command, get_id_from_username, send_ban_request
+from utils import has_permission
+from moderation_pipeline import moderation_pipeline, ModerationContext
+from rest_scheduler import rest_scheduler, Priority
+from deletion_scheduler import deletion_scheduler
+from conversations import conversations
+from permissions import permission_resolver
+from role_index import role_index
+from command_router import CommandRegistry, ChannelRouter
+from rate_limit import RateLimit, rate_limits
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -26,11 +38,17 @@ intents.voice_states = False  # Not needed unless voice features added later
 intents.presences = False  # Not needed - privacy conscious and saves bandwidth
 
 # Use commands.Bot instead of discord.Client for slash command support
-bot = commands.Bot(command_prefix='!', intents=intents)
+bot = commands.Bot(
+    command_prefix='!',
+    intents=intents,
+    http_trace=rest_scheduler.trace_config(),  # Rate limit headers feed the outbound scheduler
+    max_ratelimit_timeout=REST_MAX_RATELIMIT_WAIT
+)
 
 @bot.event
 async def on_ready():
     logging.info(f'Logged in as {bot.user}')
+    rate_limits.start_snapshots()
     
     # Setup cross-posting functionality
     if ENABLE_CROSS_POSTING:
@@ -38,9 +56,10 @@ async def on_ready():
     
     # Setup role management system
     try:
-        from role_manager import setup_role_management
+        from role_manager import setup_role_management, catch_up_role_changes
         await setup_role_management(bot)
         logging.info("✅ Role management system initialized")
+        asyncio.create_task(catch_up_role_changes())
     except Exception as e:
         logging.error(f"❌ Failed to setup role management: {e}")
     
@@ -57,6 +76,7 @@ async def on_ready():
             logging.error(f"❌ Failed to setup Roblox commands: {e}")
 
         # Verify forum channel access
+        channel_router.rebuild()
         forum_channel = bot.get_channel(FORUM_CHANNEL_ID)
         if forum_channel:
             logging.info(f"✅ Found Forum Channel: {forum_channel.name} (ID: {forum_channel.id})")
@@ -112,11 +132,9 @@ async def on_thread_join(thread):
 
 async def handle_sync_commands(bot, message):
     """Handle the !synccommands command to manually sync slash commands"""
-    from utils import has_permission
-    from config import ALLOWED_ROLES
     
     # Check permissions - only moderators can sync commands
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         await message.channel.send("❌ You don't have permission to sync commands.", delete_after=5)
         return
     
@@ -175,201 +193,266 @@ async def on_message(message):
     if message.author == bot.user:
         return  # Ignore messages from the bot itself
     
-    # Enforce forum channel restrictions (Only owner and mods can chat)
-    if isinstance(message.channel, discord.Thread) and message.channel.parent_id == FORUM_CHANNEL_ID:
-        is_owner = message.author.id == message.channel.owner_id
-        is_mod = any(role.name in ALLOWED_ROLES for role in message.author.roles)
-        
-        if not (is_owner or is_mod):
-            try:
-                await message.delete()
-                # Optional: Send a temporary warning message
-                # await message.channel.send(f"{message.author.mention}, only the post owner can comment here.", delete_after=5)
-            except Exception as e:
-                logging.error(f"Failed to delete unauthorized forum message: {e}")
-            return
+    # Only the subsystems routed to this channel see the message
+    await channel_router.dispatch(bot, message)
 
-    # Handle cross-posting for updates channel
-    if ENABLE_CROSS_POSTING:
-        await handle_discord_update_message(message)
-    
-    # Keep existing message commands for backward compatibility
-    command = message.content.lower()
-    
-    if command.startswith("!ban"):
-        from moderation import handle_ban_command
-        await handle_ban_command(bot, message)
-    elif command.startswith("!kick"):
-        from moderation import handle_kick_command
-        await handle_kick_command(bot, message)
-    elif command.startswith("!timeout"):
-        from moderation import handle_timeout_command
-        await handle_timeout_command(bot, message)
-    elif command.startswith("!unban"):
-        # Simple message command handler for unban
-        if not any(role.name in ALLOWED_ROLES for role in message.author.roles):
-            return
-            
-        parts = message.content.split(" ", 2)
-        if len(parts) < 3:
-            await message.channel.send("Usage: !unban <user_id> <reason>")
-            return
-            
-        user_id = parts[1]
-        reason = parts[2]
-        
-        try:
-            user_obj = await bot.fetch_user(int(user_id))
-            await message.guild.unban(user_obj, reason=reason)
-            await message.channel.send(f"✅ **{user_obj.name}** has been unbanned.")
-            from utils import log_action
-            
-            # Create a mock message for logging since we don't have mentions in the command for ID-based unban
-            mock_msg = type('MockMessage', (), {
-                'mentions': [user_obj],
-                'attachments': [],
-                'content': message.content,
-                'author': message.author,
-                'channel': message.channel
-            })()
-            
-            await log_action(bot, mock_msg, "Unban", message.author, reason)
-        except Exception as e:
-            await message.channel.send(f"❌ Failed to unban: {e}")
+async def enforce_forum_restrictions(bot, message):
+    """Enforce forum channel restrictions (Only owner and mods can chat)"""
+    is_owner = message.author.id == message.channel.owner_id
+    is_mod = has_permission(message.author)
+    
+    if not (is_owner or is_mod):
+        # Deleted on the next tick, in one bulk delete with other replies arriving meanwhile
+        deletion_scheduler.schedule(message, priority=Priority.ENFORCE)
+        # Optional: Send a temporary warning message
+        # await message.channel.send(f"{message.author.mention}, only the post owner can comment here.", delete_after=5)
+        return True
+    return False
 
-    elif command.startswith("!untimeout"):
-        # Simple message command handler for untimeout
-        if not any(role.name in ALLOWED_ROLES for role in message.author.roles):
-            return
-            
-        parts = message.content.split(" ", 2)
-        if len(parts) < 3:
-            await message.channel.send("Usage: !untimeout <@user> <reason>")
-            return
-            
-        if not message.mentions:
-            await message.channel.send("❌ Please mention a user to untimeout.")
-            return
-            
-        user = message.mentions[0]
-        reason = parts[2]
-        
-        try:
-            await user.timeout(None, reason=reason)
-            await message.channel.send(f"✅ **{user.name}**'s timeout has been removed.")
-            from utils import log_action, notify_user_dm
-            
-            # Debug logging.info to verify arguments and ensure new code is running
-            logging.info(f"DEBUG: notify_user_dm args: user={type(user)}, guild_name={type(message.guild.name)}, moderator={type(message.author)}, reason={type(reason)}")
-            
-            # Correct order: user, action_type, guild_name, moderator, reason
-            await notify_user_dm(user, "Timeout Removed", message.guild.name, message.author, reason)
-            # Use the original message for logging since it has mentions
-            await log_action(bot, message, "Untimeout", message.author, reason)
-        except Exception as e:
-            await message.channel.send(f"❌ Failed to remove timeout: {e}")
-            logging.error(f"❌ Error in untimeout: {e}")
-
-    elif command.startswith("!ticketblacklist"):
-        from moderation import handle_ticketblacklist_command
-        await handle_ticketblacklist_command(bot, message)
-    elif command.startswith("!synccommands"):
-        await handle_sync_commands(bot, message)
-    elif command.startswith("!testcrosspost"):
-        await handle_test_crosspost(bot, message)
-    elif command.startswith("!debugguilded"):
-        await handle_debug_guilded(bot, message)
-    elif command.startswith("!testroblox"):
-        await handle_test_roblox(bot, message)
-    elif command.startswith("!debugroblox"):
-        await handle_debug_roblox(bot, message)
-    elif command.startswith("!testupdate"):
-        await handle_test_update(bot, message)
-    elif command.startswith("!listannouncements"):
-        await handle_list_announcements(bot, message)
-    elif command.startswith("!checkroles"):
-        await handle_check_roles_command(bot, message)
-    elif command.startswith("!listrolecombo"):
-        await handle_list_role_combos_command(bot, message)
-    elif command.startswith("!rolepanel"):
-        await handle_role_panel_command(bot, message)
-    elif command.startswith("!robloxban"):
-        # 1. Permission Check
-        if not any(role.name in ALLOWED_ROLES for role in message.author.roles):
-            await message.channel.send("❌ You don't have permission to use this command.")
-            return
+async def route_conversations(bot, message):
+    """Hand replies to an interactive prompt to the command waiting for them
 
-        # 2. Parse Arguments
-        # Expected format: !robloxban <username_or_id> <reason> [duration]
-        parts = message.content.split(" ", 3)
-        
-        if len(parts) < 3:
-            await message.channel.send("Usage: `!robloxban <username_or_id> <reason> [duration_seconds]`\nExample: `!robloxban Player1 Being mean 60` (or leave duration blank for permanent)")
-            return
+    Commands always run, even from a user with a prompt open. Routed after
+    the forum guard, so a reply it deletes never reaches a prompt.
+    """
+    return command_registry.resolve_name(message.content) is None and conversations.feed(message)
 
-        target_input = parts[1]
-        # Check if duration is provided in the 3rd slot, otherwise assume it's part of the reason?
-        # Actually, let's stick to a simpler parser: Last argument is duration IF it's a number, otherwise default to -1.
-        
-        # Re-parsing to handle multi-word reasons safely
-        args = message.content.split(" ")
-        target_input = args[1]
-        
-        # Check if the last argument is a number (duration)
-        possible_duration = args[-1]
-        if possible_duration.isdigit() or (possible_duration.startswith("-") and possible_duration[1:].isdigit()):
-             duration = int(possible_duration)
-             # Re-join everything between target and duration as the reason
-             reason = " ".join(args[2:-1])
-        else:
-             duration = -1 # Permanent
-             # Re-join everything after target as the reason
-             reason = " ".join(args[2:])
+async def route_cross_post(bot, message):
+    """Handle cross-posting for updates channel"""
+    await handle_discord_update_message(message)
+    return False
 
-        if not reason:
-             await message.channel.send("❌ You must provide a ban reason.")
-             return
+async def route_commands(bot, message):
+    """Keep existing message commands for backward compatibility"""
+    await command_registry.dispatch(bot, message)
+    return False
 
-        await message.channel.send(f"🔄 **Processing Roblox ban for '{target_input}'...**")
+ROUTED_CHANNEL_IDS = (FORUM_CHANNEL_ID, DISCORD_UPDATES_CHANNEL_ID)
 
-        # 3. Resolve ID (if username was given)
-        target_id = None
-        if target_input.isdigit():
-            target_id = int(target_input)
-            target_name = f"ID: {target_id}"
-        else:
-            # It's a username, look it up
-            found_id, error = await get_id_from_username(target_input)
-            if not found_id:
-                await message.channel.send(f"❌ **Error:** {error}")
-                return
-            target_id = found_id
-            target_name = target_input
-            # --- Add this temporarily to debug ---
-        logging.info("--- DEBUGGING VARIABLES ---")
-        logging.info(f"Universe ID Type: {type(UNIVERSE_ID)}")
-        logging.info(f"Universe ID Length: {len(str(UNIVERSE_ID))}")
-        logging.info(f"Universe ID Value: '{UNIVERSE_ID}'") # The quotes will reveal hidden spaces
-        logging.info(f"Key Length: {len(str(ROBLOX_API_KEY))}")
-        logging.info("---------------------------")
-
-        # 4. Execute Ban
-        success, api_response = await send_ban_request(target_id, reason, duration)
+@bot.event
+async def on_guild_channel_create(channel):
+    """Rebuild message routes when a routed channel appears"""
+    if channel.id in ROUTED_CHANNEL_IDS:
+        channel_router.rebuild()
 
-        if success:
-            await message.channel.send(f"✅ **Success!** {target_name} has been banned from Roblox.\nReason: {reason}\nDuration: {'Permanent' if duration == -1 else str(duration) + 's'}")
-        else:
-            await message.channel.send(f"❌ **Roblox API Failed:** {api_response}")
+@bot.event
+async def on_guild_channel_delete(channel):
+    """Rebuild message routes when a routed channel is removed"""
+    if channel.id in ROUTED_CHANNEL_IDS:
+        channel_router.rebuild()
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    """Rebuild message routes when a routed channel changes"""
+    if after.id in ROUTED_CHANNEL_IDS:
+        channel_router.rebuild()
+
+@bot.event
+async def on_guild_role_create(role):
+    """Refresh cached role lookups when a role is created"""
+    role_index.invalidate_guild(role.guild)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    """Refresh cached role lookups when a role is renamed"""
+    role_index.invalidate_guild(after.guild)
+
+@bot.event
+async def on_guild_role_delete(role):
+    """Refresh cached role lookups when a role is deleted"""
+    role_index.invalidate_guild(role.guild)
+
+@bot.event
+async def on_member_join(member):
+    """Count new members in the role statistics"""
+    try:
+        from role_manager import handle_member_join
+        await handle_member_join(member)
+    except Exception as e:
+        logging.info(f"❌ Error in member join handler: {e}")
+
+@bot.event
+async def on_member_remove(member):
+    """Drop cached state for members who leave"""
+    permission_resolver.invalidate_member(member)
+    
+    try:
+        from role_manager import handle_member_remove
+        await handle_member_remove(member)
+    except Exception as e:
+        logging.info(f"❌ Error in member remove handler: {e}")
+
+@bot.event
+async def on_resumed():
+    """Catch up on role changes after a gateway gap"""
+    from role_manager import catch_up_role_changes
+    await catch_up_role_changes()
 
 @bot.event
 async def on_member_update(before, after):
     """Handle member update events for automatic role management"""
+    if before.roles != after.roles:
+        permission_resolver.invalidate_member(after)
+    
     try:
         from role_manager import handle_member_update
         await handle_member_update(before, after)
     except Exception as e:
         logging.info(f"❌ Error in member update handler: {e}")
 
+async def handle_unban_command(bot, message):
+    """Handle the !unban command"""
+    if not has_permission(message.author):
+        return
+        
+    parts = message.content.split(" ", 2)
+    if len(parts) < 3:
+        await message.channel.send("Usage: !unban <user_id> <reason>")
+        return
+        
+    user_id = parts[1]
+    reason = parts[2]
+    
+    try:
+        user_obj = await bot.fetch_user(int(user_id))
+    except (ValueError, discord.NotFound):
+        await message.channel.send("❌ Failed to unban: unknown user ID")
+        return
+    
+    await moderation_pipeline.execute(bot, ModerationContext(
+        action='unban',
+        target=user_obj,
+        moderator=message.author,
+        guild=message.guild,
+        reason=reason,
+        origin=message,
+        content=message.content
+    ))
+
+async def handle_untimeout_command(bot, message):
+    """Handle the !untimeout command"""
+    if not has_permission(message.author):
+        return
+        
+    parts = message.content.split(" ", 2)
+    if len(parts) < 3:
+        await message.channel.send("Usage: !untimeout <@user> <reason>")
+        return
+        
+    if not message.mentions:
+        await message.channel.send("❌ Please mention a user to untimeout.")
+        return
+        
+    await moderation_pipeline.execute(bot, ModerationContext(
+        action='untimeout',
+        target=message.mentions[0],
+        moderator=message.author,
+        guild=message.guild,
+        reason=parts[2],
+        origin=message,
+        content=message.content
+    ))
+
+async def handle_prompts_command(bot, message):
+    """Handle the !prompts command: list pending interactive prompts, or cancel them with !prompts cancel [@user]"""
+    if not has_permission(message.author):
+        return
+    
+    guild_channel_ids = {channel.id for channel in message.guild.channels} | {thread.id for thread in message.guild.threads}
+    sessions = conversations.list_sessions(guild_channel_ids)
+    parts = message.content.split()
+    
+    if len(parts) > 1 and parts[1].lower() == 'cancel':
+        target = message.mentions[0] if message.mentions else None
+        cancelled = 0
+        for conversation in sessions:
+            channel_id, author_id = conversation.key
+            if target is None or author_id == target.id:
+                cancelled += conversations.cancel(channel_id, author_id)
+        await message.channel.send(f"🛑 Cancelled {cancelled} pending prompt(s).")
+        return
+    
+    if not sessions:
+        await message.channel.send("💬 No pending prompts.")
+        return
+    
+    lines = [
+        f"• <#{conversation.key[0]}> <@{conversation.key[1]}> `{conversation.label}` ({conversation.remaining:.0f}s left)"
+        for conversation in sessions[:25]
+    ]
+    if len(sessions) > 25:
+        lines.append(f"...and {len(sessions) - 25} more")
+    await message.channel.send(f"💬 **Pending prompts ({len(sessions)}):**\n" + "\n".join(lines))
+
+async def handle_roblox_ban_command(bot, message):
+    """Handle the !robloxban command"""
+    # 1. Permission Check
+    if not has_permission(message.author):
+        await message.channel.send("❌ You don't have permission to use this command.", delete_after=5)
+        return
+
+    # 2. Parse Arguments
+    # Expected format: !robloxban <username_or_id> <reason> [duration]
+    parts = message.content.split(" ", 3)
+    
+    if len(parts) < 3:
+        await message.channel.send("Usage: `!robloxban <username_or_id> <reason> [duration_seconds]`\nExample: `!robloxban Player1 Being mean 60` (or leave duration blank for permanent)")
+        return
+
+    target_input = parts[1]
+    # Check if duration is provided in the 3rd slot, otherwise assume it's part of the reason?
+    # Actually, let's stick to a simpler parser: Last argument is duration IF it's a number, otherwise default to -1.
+    
+    # Re-parsing to handle multi-word reasons safely
+    args = message.content.split(" ")
+    target_input = args[1]
+    
+    # Check if the last argument is a number (duration)
+    possible_duration = args[-1]
+    if possible_duration.isdigit() or (possible_duration.startswith("-") and possible_duration[1:].isdigit()):
+         duration = int(possible_duration)
+         # Re-join everything between target and duration as the reason
+         reason = " ".join(args[2:-1])
+    else:
+         duration = -1 # Permanent
+         # Re-join everything after target as the reason
+         reason = " ".join(args[2:])
+
+    if not reason:
+         await message.channel.send("❌ You must provide a ban reason.")
+         return
+
+    await message.channel.send(f"🔄 **Processing Roblox ban for '{target_input}'...**")
+
+    # 3. Resolve ID (if username was given)
+    target_id = None
+    if target_input.isdigit():
+        target_id = int(target_input)
+        target_name = f"ID: {target_id}"
+    else:
+        # It's a username, look it up
+        found_id, error = await get_id_from_username(target_input)
+        if not found_id:
+            await message.channel.send(f"❌ **Error:** {error}")
+            return
+        target_id = found_id
+        target_name = target_input
+        # --- Add this temporarily to debug ---
+    logging.info("--- DEBUGGING VARIABLES ---")
+    logging.info(f"Universe ID Type: {type(UNIVERSE_ID)}")
+    logging.info(f"Universe ID Length: {len(str(UNIVERSE_ID))}")
+    logging.info(f"Universe ID Value: '{UNIVERSE_ID}'") # The quotes will reveal hidden spaces
+    logging.info(f"Key Length: {len(str(ROBLOX_API_KEY))}")
+    logging.info("---------------------------")
+
+    # 4. Execute Ban
+    success, api_response = await send_ban_request(target_id, reason, duration)
+
+    if success:
+        await message.channel.send(f"✅ **Success!** {target_name} has been banned from Roblox.\nReason: {reason}\nDuration: {'Permanent' if duration == -1 else str(duration) + 's'}")
+    else:
+        await message.channel.send(f"❌ **Roblox API Failed:** {api_response}")
+
 async def handle_check_roles_command(bot, message):
     """Handle the !checkroles command"""
     try:
@@ -402,12 +485,10 @@ async def handle_role_panel_command(bot, message):
 
 async def handle_test_crosspost(bot, message):
     """Handle the !testcrosspost command to test cross-posting functionality"""
-    from utils import has_permission
-    from config import ALLOWED_ROLES
     from crosspost import cross_poster
     
     # Check permissions - only moderators can test cross-posting
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         await message.channel.send("❌ You don't have permission to test cross-posting.", delete_after=5)
         return
     
@@ -439,13 +520,12 @@ async def handle_test_crosspost(bot, message):
 
 async def handle_debug_guilded(bot, message):
     """Handle the !debugguilded command to debug Guilded API connection"""
-    from utils import has_permission
-    from config import ALLOWED_ROLES, GUILDED_SERVER_ID, GUILDED_ANNOUNCEMENTS_CHANNEL_ID
+    from config import GUILDED_SERVER_ID, GUILDED_ANNOUNCEMENTS_CHANNEL_ID
     from crosspost import cross_poster
     import aiohttp
     
     # Check permissions - only moderators can debug
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         await message.channel.send("❌ You don't have permission to debug Guilded.", delete_after=5)
         return
     
@@ -513,12 +593,11 @@ async def handle_debug_guilded(bot, message):
 
 async def handle_test_roblox(bot, message):
     """Handle the !testroblox command to test Roblox posting functionality"""
-    from utils import has_permission
-    from config import ALLOWED_ROLES, ENABLE_ROBLOX_POSTING
+    from config import ENABLE_ROBLOX_POSTING
     from roblox_integration import roblox_poster, format_message_for_roblox
     
     # Check permissions - only moderators can test Roblox posting
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         await message.channel.send("❌ You don't have permission to test Roblox posting.", delete_after=5)
         return
     
@@ -554,12 +633,11 @@ async def handle_test_roblox(bot, message):
 
 async def handle_debug_roblox(bot, message):
     """Handle the !debugroblox command to debug Roblox API connection"""
-    from utils import has_permission
-    from config import ALLOWED_ROLES, ROBLOX_GROUP_ID, ENABLE_ROBLOX_POSTING
+    from config import ROBLOX_GROUP_ID, ENABLE_ROBLOX_POSTING
     from roblox_integration import roblox_poster
     
     # Check permissions - only moderators can debug
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         await message.channel.send("❌ You don't have permission to debug Roblox.", delete_after=5)
         return
     
@@ -614,12 +692,11 @@ async def handle_debug_roblox(bot, message):
 
 async def handle_test_update(bot, message):
     """Handle the !testupdate command to test updating existing announcements"""
-    from utils import has_permission
-    from config import ALLOWED_ROLES, ENABLE_CROSS_POSTING
+    from config import ENABLE_CROSS_POSTING
     from crosspost import cross_poster
     
     # Check permissions - only moderators can test updates
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         await message.channel.send("❌ You don't have permission to test announcement updates.", delete_after=5)
         return
     
@@ -664,12 +741,11 @@ async def handle_test_update(bot, message):
 
 async def handle_list_announcements(bot, message):
     """Handle the !listannouncements command to show recent announcements"""
-    from utils import has_permission
-    from config import ALLOWED_ROLES, ENABLE_CROSS_POSTING, GUILDED_ANNOUNCEMENTS_CHANNEL_ID
+    from config import ENABLE_CROSS_POSTING, GUILDED_ANNOUNCEMENTS_CHANNEL_ID
     from crosspost import cross_poster
     
     # Check permissions - only moderators can list announcements
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         await message.channel.send("❌ You don't have permission to list announcements.", delete_after=5)
         return
     
@@ -726,9 +802,54 @@ async def handle_list_announcements(bot, message):
     except Exception as e:
         await message.channel.send(f"❌ **Error fetching announcements:** {e}")
 
+def build_command_registry():
+    """Bind every prefix command to its handler once at startup"""
+    # Every prefix command is for moderators; the handlers refuse everyone else
+    registry = CommandRegistry(prefix='!', default_limit=RateLimit(5, 10, burst=5), permission=has_permission)
+    registry.register("ban", handle_ban_command)
+    registry.register("kick", handle_kick_command)
+    registry.register("timeout", handle_timeout_command)
+    registry.register("unban", handle_unban_command)
+    registry.register("untimeout", handle_untimeout_command)
+    registry.register("ticketblacklist", handle_ticketblacklist_command)
+    registry.register("modstats", handle_modstats_command)
+    registry.register("prompts", handle_prompts_command)
+    registry.register("synccommands", handle_sync_commands, limit=RateLimit(1, 60, scope='guild'))
+    registry.register("testcrosspost", handle_test_crosspost)
+    registry.register("debugguilded", handle_debug_guilded)
+    registry.register("testroblox", handle_test_roblox)
+    registry.register("debugroblox", handle_debug_roblox)
+    registry.register("testupdate", handle_test_update)
+    registry.register("listannouncements", handle_list_announcements)
+    registry.register("checkroles", handle_check_roles_command)
+    registry.register("listrolecombo", handle_list_role_combos_command)
+    registry.register("rolepanel", handle_role_panel_command, limit=RateLimit(1, 30, scope='channel'))
+    registry.register("robloxban", handle_roblox_ban_command)
+    return registry
+
+command_registry = build_command_registry()
+
+def build_channel_routes():
+    """Map each channel (and thread parent) to the handlers that care about it"""
+    default_route = (route_conversations, route_commands)
+    channel_routes = {}
+    thread_routes = {}
+    
+    if ENABLE_CROSS_POSTING and DISCORD_UPDATES_CHANNEL_ID:
+        channel_routes[DISCORD_UPDATES_CHANNEL_ID] = (route_conversations, route_cross_post, route_commands)
+    
+    if FORUM_CHANNEL_ID:
+        # Messages in a forum are always posted inside one of its threads
+        thread_routes[FORUM_CHANNEL_ID] = (enforce_forum_restrictions, route_conversations, route_commands)
+    
+    return channel_routes, thread_routes, default_route
+
+channel_router = ChannelRouter(build_channel_routes)
+
 @bot.event
 async def on_disconnect():
     """Cleanup when bot disconnects"""
+    rate_limits.save()
     if ENABLE_CROSS_POSTING:
         await cleanup_cross_posting()
 
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Standalone micro-benchmarks for the bot's hot paths.
+Run with `python benchmark.py [name ...]`; no Discord connection is made.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+# config.py refuses to import without a token; benchmarks never connect
+os.environ.setdefault('DISCORD_BOT_TOKEN', 'benchmark')
+
+def report(label, seconds, operations):
+    """Print the per-operation cost of a timed loop"""
+    per_op = seconds / operations * 1e9
+    print(f"   • {label:<38} {per_op:10.1f} ns/op  ({operations:,} ops in {seconds:.3f}s)")
+
+def timed(func, operations):
+    """Run func over the given number of operations and return elapsed seconds"""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+# --- Command dispatch ---
+
+LEGACY_PREFIXES = [
+    "!ban", "!kick", "!timeout", "!unban", "!untimeout", "!ticketblacklist",
+    "!synccommands", "!testcrosspost", "!debugguilded", "!testroblox",
+    "!debugroblox", "!testupdate", "!listannouncements", "!checkroles",
+    "!listrolecombo", "!rolepanel", "!robloxban",
+]
+
+def legacy_resolve(content):
+    """The startswith chain on_message used before the command registry"""
+    command = content.lower()
+    for prefix in LEGACY_PREFIXES:
+        if command.startswith(prefix):
+            return prefix
+    return None
+
+def bench_dispatch():
+    """Per-message dispatch cost: startswith chain vs. command registry"""
+    from command_router import CommandRegistry
+
+    async def noop(bot, message):
+        pass
+
+    registry = CommandRegistry(prefix='!')
+    for prefix in LEGACY_PREFIXES:
+        registry.register(prefix[1:], noop)
+
+    rng = random.Random(1)
+    chatter = [
+        "hey everyone, is the server up?",
+        "lol that was a great round " * 4,
+        "does anyone know when the next update drops? " * 6,
+        "gg",
+    ]
+    commands = [
+        "!ban <@123> yes spamming https://example.com/proof.png",
+        "!robloxban Player1 exploiting 3600",
+        "!checkroles",
+        "!bank balance",
+    ]
+    # Roughly what a busy server looks like: almost every message is chatter
+    corpus = [rng.choice(commands) if rng.random() < 0.05 else rng.choice(chatter) for _ in range(10_000)]
+    rounds = 50
+    operations = len(corpus) * rounds
+
+    def run_legacy():
+        for _ in range(rounds):
+            for content in corpus:
+                legacy_resolve(content)
+
+    def run_registry():
+        resolve = registry.resolve
+        for _ in range(rounds):
+            for content in corpus:
+                resolve(content)
+
+    print("📨 Command dispatch (10k messages, 5% commands)")
+    report("startswith chain", timed(run_legacy, operations), operations)
+    report("command registry", timed(run_registry, operations), operations)
+
+    worst = "!robloxban Player1 exploiting 3600"
+    report("startswith chain (last branch)", timed(lambda: [legacy_resolve(worst) for _ in range(100_000)], 100_000), 100_000)
+    report("command registry (last branch)", timed(lambda: [registry.resolve(worst) for _ in range(100_000)], 100_000), 100_000)
+    print(f"   • '!bank balance' resolves to: legacy={legacy_resolve('!bank balance')!r}, "
+          f"registry={registry.resolve('!bank balance')!r}")
+
+# --- Role lookups ---
+
+class FakeRole:
+    """Just enough of discord.Role for name and ID lookups"""
+    __slots__ = ('id', 'name', 'position')
+
+    def __init__(self, role_id, name, position):
+        self.id = role_id
+        self.name = name
+        self.position = position
+
+class FakeGuild:
+    """Just enough of discord.Guild for the role index"""
+
+    def __init__(self, guild_id, role_count):
+        self.id = guild_id
+        self.name = f"Benchmark Guild {guild_id}"
+        self.roles = [FakeRole(1000 + i, f"Role {i}", i) for i in range(role_count)]
+        self._roles_by_id = {role.id: role for role in self.roles}
+
+    def get_role(self, role_id):
+        return self._roles_by_id.get(role_id)
+
+def bench_role_lookup():
+    """Role-by-name lookup: discord.utils.get scan vs. role index"""
+    import discord
+    from role_index import RoleIndex
+
+    guild = FakeGuild(1, 300)
+    index = RoleIndex()
+    names = ["Role 5", "Role 150", "Role 299", "ticket blacklist"]  # Early, middle, last, missing
+    rounds = 20_000
+    operations = rounds * len(names)
+
+    def run_scan():
+        for _ in range(rounds):
+            for name in names:
+                discord.utils.get(guild.roles, name=name)
+
+    def run_index():
+        get_role = index.get_role
+        for _ in range(rounds):
+            for name in names:
+                get_role(guild, name)
+
+    print(f"🎭 Role lookup by name ({len(guild.roles)} roles, one name missing)")
+    report("discord.utils.get(guild.roles)", timed(run_scan, operations), operations)
+    report("role index", timed(run_index, operations), operations)
+
+# --- Auto-role rules ---
+
+def make_combinations(guild, count, rng):
+    """Random two- and three-role combinations over the guild's roles"""
+    names = [role.name for role in guild.roles]
+    combos = []
+    for i in range(count):
+        required = rng.sample(names[:-count], rng.choice((2, 3)))
+        combos.append({
+            'name': f"Combo {i}",
+            'required_roles': required,
+            'target_role': names[-count + i],
+            'enabled': True,
+            'remove_on_loss': True,
+        })
+    return combos
+
+def legacy_evaluate(combos, old_role_names, new_role_names):
+    """The per-update loop check_and_update_roles used before rule compilation"""
+    decisions = 0
+    for combo in combos:
+        if not combo.get('enabled', False):
+            continue
+        required_roles = set(combo['required_roles'])
+        has_all_required = required_roles.issubset(new_role_names)
+        had_all_required = required_roles.issubset(old_role_names)
+        has_target_role = combo['target_role'] in new_role_names
+        if has_all_required and not has_target_role:
+            decisions += 1
+        elif not has_all_required and had_all_required and has_target_role:
+            decisions += 1
+    return decisions
+
+def bench_rule_engine():
+    """Member update evaluation: loop over every combo vs. inverted index"""
+    from role_rules import RoleRuleEngine
+
+    rng = random.Random(2)
+    guild = FakeGuild(2, 900)
+    combos = make_combinations(guild, 500, rng)
+    engine = RoleRuleEngine(combos)
+    engine.rules_for(guild)
+
+    # Members hold a handful of roles; each update adds one
+    updates = []
+    for _ in range(2_000):
+        held = rng.sample(guild.roles[:400], 12)
+        gained = rng.choice(guild.roles[:400])
+        updates.append((held, held + [gained]))
+
+    named = [({r.name for r in old}, {r.name for r in new}) for old, new in updates]
+    with_ids = [(frozenset(r.id for r in old), frozenset(r.id for r in new)) for old, new in updates]
+
+    def run_legacy():
+        for old_names, new_names in named:
+            legacy_evaluate(combos, old_names, new_names)
+
+    def run_engine():
+        for old_ids, new_ids in with_ids:
+            engine.evaluate(guild, old_ids, new_ids)
+
+    print(f"🧮 Auto-role evaluation per member update ({len(combos)} combinations, 1 role changed)")
+    report("loop over all combinations", timed(run_legacy, len(updates)), len(updates))
+    report("compiled rules + inverted index", timed(run_engine, len(updates)), len(updates))
+
+class FakeMember:
+    """Just enough of discord.Member for a role sweep"""
+    __slots__ = ('id', 'bot', '_roles')
+
+    def __init__(self, member_id, role_ids, bot=False):
+        self.id = member_id
+        self.bot = bot
+        self._roles = role_ids
+
+def bench_role_bitmap():
+    """Full role check pre-filter: plan every member vs. member x role bitmap"""
+    from role_rules import RoleRuleEngine
+    from role_bitmap import MemberRoleBitmap
+
+    rng = random.Random(3)
+    guild = FakeGuild(3, 300)
+    combos = make_combinations(guild, 50, rng)
+    for combo in combos[:5]:
+        # Negated roles, which a member can match without holding any role
+        first, second = combo['required_roles'][:2]
+        combo['expression'] = f'not("{first}")' if combo is combos[0] else f'all("{first}", not("{second}"))'
+    engine = RoleRuleEngine(combos)
+    compiled = engine.rules_for(guild)
+
+    role_ids = [role.id for role in guild.roles]
+    members = [
+        FakeMember(10_000 + i, rng.sample(role_ids, rng.randint(0, 8)), bot=i % 200 == 0)
+        for i in range(200_000)
+    ]
+    found = {}
+
+    def run_per_member():
+        found['per_member'] = [
+            i for i, member in enumerate(members)
+            if not member.bot and engine.full_plan(guild, member._roles)
+        ]
+
+    def run_bitmap():
+        found['bitmap'] = MemberRoleBitmap.for_rules(members, compiled).members_needing_change(compiled)
+
+    print(f"🗺️ Full role check pre-filter ({len(members)} members, {len(compiled.rules)} combinations)")
+    report("engine.full_plan per member", timed(run_per_member, len(members)), len(members))
+    report("member x role bitmap", timed(run_bitmap, len(members)), len(members))
+    print(f"  {len(found['bitmap'])} members need changes, results match: {found['bitmap'] == found['per_member']}")
+
+# --- Rate limiting ---
+
+def bench_rate_limit():
+    """Cooldown checks: dict of datetimes vs. GCRA limiter, with 1M distinct keys"""
+    import tracemalloc
+    from datetime import datetime
+    from rate_limit import RateLimit, RateLimiter
+
+    keys = 1_000_000
+    rng = random.Random(4)
+    ids = [rng.getrandbits(63) for _ in range(keys)]
+
+    def run_legacy():
+        cooldowns = {}
+        for user_id in ids:
+            now = datetime.utcnow()
+            last_used = cooldowns.get(user_id)
+            if last_used is None or (now - last_used).total_seconds() >= 60:
+                cooldowns[user_id] = now
+        return cooldowns
+
+    def run_limiter(limiter, clock):
+        hit = limiter.hit
+        for user_id in ids:
+            hit(user_id, next(clock))
+        return limiter
+
+    def measure(label, build):
+        # Time and memory are measured in separate runs; tracemalloc slows allocation down
+        start = time.perf_counter()
+        kept = build()
+        seconds = time.perf_counter() - start
+        del kept
+
+        tracemalloc.start()
+        kept = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report(label, seconds, keys)
+        print(f"     {len(kept):,} keys kept, {current / 2**20:.1f} MiB")
+        del kept
+
+    def clock(step):
+        # Synthetic monotonic clock: 1M clicks spread over `step * keys` seconds
+        return (i * step for i in range(keys))
+
+    print(f"⏱️ Cooldown checks ({keys:,} distinct users, 60s cooldown)")
+    measure("dict of datetime.utcnow()", run_legacy)
+    measure("GCRA, all keys active", lambda: run_limiter(RateLimiter(RateLimit(1, 60), max_keys=keys), clock(0.00001)))
+    measure("GCRA, 1k clicks/s (lazy eviction)", lambda: run_limiter(RateLimiter(RateLimit(1, 60), max_keys=keys), clock(0.001)))
+    measure("GCRA, max_keys=100k", lambda: run_limiter(RateLimiter(RateLimit(1, 60), max_keys=100_000), clock(0.00001)))
+
+# --- Interactive prompts ---
+
+def bench_conversations(sessions=200, messages=200_000):
+    """Busy channel with many open prompts: wait_for check scan vs. conversation router"""
+    import asyncio
+    from types import SimpleNamespace
+    from conversations import ConversationRouter
+
+    rng = random.Random(5)
+    channel = SimpleNamespace(id=1)
+    # Most traffic is chatter from other members; ~2% are replies from users with an open prompt
+    authors = [SimpleNamespace(id=i) for i in range(10_000)]
+    stream = [
+        SimpleNamespace(channel=channel, author=authors[rng.randrange(sessions) if rng.random() < 0.02 else rng.randrange(sessions, 10_000)])
+        for _ in range(messages)
+    ]
+
+    def run_wait_for():
+        # discord.py runs every pending wait_for check against every message
+        listeners = {}
+        for author in authors[:sessions]:
+            listeners[author.id] = lambda msg, author=author: msg.author == author and msg.channel == channel
+        matched = 0
+        for message in stream:
+            for author_id, check in list(listeners.items()):
+                if check(message):
+                    matched += 1
+                    break  # The listener is replaced by the next prompt of the same flow
+        return matched
+
+    async def run_router():
+        router = ConversationRouter()
+        answered = 0
+
+        async def session(author):
+            nonlocal answered
+            while True:
+                try:
+                    await router.wait_for_reply(channel.id, author.id, timeout=60)
+                except asyncio.TimeoutError:
+                    return
+                answered += 1
+
+        tasks = [asyncio.create_task(session(author)) for author in authors[:sessions]]
+        await asyncio.sleep(0)  # Let every session open its prompt
+        start = time.perf_counter()
+        for message in stream:
+            if router.feed(message):
+                # Let the answered session open its next prompt before the next message, as
+                # the wait_for scan assumes; on a live event loop messages are far apart
+                while (channel.id, message.author.id) not in router.sessions:
+                    await asyncio.sleep(0)
+        feed_seconds = time.perf_counter() - start
+        await asyncio.sleep(0)
+        open_sessions = len(router.sessions)
+        router.cancel()
+        await asyncio.gather(*tasks)
+        return feed_seconds, answered, open_sessions
+
+    print(f"💬 Prompt routing ({sessions} open sessions, {messages:,} messages in one channel)")
+    matched = 0
+    def legacy():
+        nonlocal matched
+        matched = run_wait_for()
+    report(f"wait_for checks ({sessions} listeners)", timed(legacy, messages), messages)
+    feed_seconds, answered, open_sessions = asyncio.run(run_router())
+    report("conversation router (dict lookup)", feed_seconds, messages)
+    print(f"     {answered:,} replies delivered ({matched:,} with wait_for), {open_sessions} sessions still open")
+
+# --- Timed deletions ---
+
+def bench_deletions(pending=20_000, wave=2_000):
+    """Pending timed deletions and a forum spam wave: one sleeping task per message vs. the timer wheel"""
+    import asyncio
+    import tracemalloc
+    from types import SimpleNamespace
+    import discord
+    import deletion_scheduler as deletion_module
+    from deletion_scheduler import DeletionScheduler
+
+    rng = random.Random(6)
+    created_at = discord.utils.utcnow()
+
+    class Channel:
+        def __init__(self, channel_id):
+            self.id = channel_id
+            self.requests = 0
+
+        async def delete_messages(self, messages):
+            self.requests += 1
+
+    def message(message_id, channel):
+        async def delete():
+            channel.requests += 1
+        return SimpleNamespace(id=message_id, channel=channel, created_at=created_at, delete=delete)
+
+    channels = [Channel(i) for i in range(4)]
+    messages = [message(i, channels[i % len(channels)]) for i in range(pending)]
+    delays = [rng.uniform(1, 3600) for _ in range(pending)]
+
+    async def run_tasks():
+        async def delete_after(msg, delay):
+            await asyncio.sleep(delay)
+            await msg.delete()
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(delete_after(msg, delay)) for msg, delay in zip(messages, delays)]
+        await asyncio.sleep(0)  # Let every task reach its sleep
+        elapsed = time.perf_counter() - start
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return elapsed
+
+    async def run_wheel():
+        scheduler = DeletionScheduler()
+        start = time.perf_counter()
+        for msg, delay in zip(messages, delays):
+            scheduler.schedule(msg, delay)
+        elapsed = time.perf_counter() - start
+        scheduler.task.cancel()
+        return elapsed
+
+    def peak_memory(coroutine_factory):
+        tracemalloc.start()
+        elapsed = asyncio.run(coroutine_factory())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak
+
+    print(f"🗑️ Timed deletions ({pending:,} pending, delays up to an hour)")
+    for label, factory in (("one sleeping task per message", run_tasks), ("timer wheel, one task", run_wheel)):
+        elapsed, peak = peak_memory(factory)
+        report(label, elapsed, pending)
+        print(f"     peak {peak / 1024 / 1024:.1f} MB traced")
+
+    # Spam wave: unauthorized forum replies arriving over ten seconds, deleted right away
+    clock = [0.0]
+    real_time = deletion_module.time
+    deletion_module.time = SimpleNamespace(monotonic=lambda: clock[0])
+    try:
+        async def run_wave():
+            scheduler = DeletionScheduler()
+            arrivals = sorted(rng.uniform(0, 10) for _ in range(wave))
+            for channel in channels:
+                channel.requests = 0
+            for i, arrival in enumerate(arrivals):
+                while clock[0] < arrival:  # The background task's ticks, driven by the fake clock
+                    clock[0] += scheduler.tick_seconds
+                    await scheduler._flush(scheduler.take_due())
+                scheduler.schedule(message(pending + i, channels[rng.randrange(len(channels))]))
+            clock[0] += 1
+            await scheduler._flush(scheduler.take_due())
+            scheduler.task.cancel()
+            return sum(channel.requests for channel in channels)
+
+        requests = asyncio.run(run_wave())
+    finally:
+        deletion_module.time = real_time
+    print(f"   • forum spam wave: {wave:,} replies in 10s → {wave:,} single deletes vs. {requests} bulk/single requests")
+
+BENCHMARKS = {
+    'dispatch': bench_dispatch,
+    'role_lookup': bench_role_lookup,
+    'rule_engine': bench_rule_engine,
+    'role_bitmap': bench_role_bitmap,
+    'rate_limit': bench_rate_limit,
+    'conversations': bench_conversations,
+    'deletions': bench_deletions,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Run bot micro-benchmarks")
+    parser.add_argument('names', nargs='*', help=f"Benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
+        print()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Command Routing for Discord Bot
+Resolves prefix commands to their handlers with a single dictionary lookup
+"""
+
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+from rate_limit import RateLimit, rate_limits, format_retry_after
+
+logger = logging.getLogger(__name__)
+
+CommandHandler = Callable[..., Awaitable[None]]
+PermissionCheck = Callable[[object], bool]
+
+DENIED_LIMIT = RateLimit(1, 30)  # A member without permission is refused once per 30s, across all commands
+
+class CommandRegistry:
+    """Table of prefix commands built once at startup
+
+    The prefix is checked once per message and the first token is looked up
+    in a dict, so messages without the prefix exit immediately and similar
+    names such as ``!bank`` never reach the ``!ban`` handler. Each command
+    can declare a rate limit; commands without one use the registry default.
+    Members failing `permission` don't use up the command's cooldown; their
+    first attempt goes to the handler, which refuses them, and further
+    attempts within `denied_limit` are dropped silently. A limited member is
+    likewise told once per cooldown and otherwise ignored.
+    """
+
+    def __init__(self, prefix: str = '!', default_limit: Optional[RateLimit] = None,
+                 permission: Optional[PermissionCheck] = None, denied_limit: RateLimit = DENIED_LIMIT):
+        self.prefix = prefix
+        self.default_limit = default_limit
+        self.permission = permission
+        self.denied_limit = denied_limit
+        self.handlers: Dict[str, CommandHandler] = {}
+        self.limits: Dict[str, Optional[RateLimit]] = {}
+
+    def register(self, name: str, handler: CommandHandler, limit: Optional[RateLimit] = None):
+        """Bind a command name (without prefix) to its handler and optional rate limit"""
+        name = name.lower()
+        if name in self.handlers:
+            raise ValueError(f"Command '{self.prefix}{name}' is already registered")
+        self.handlers[name] = handler
+        self.limits[name] = limit or self.default_limit
+
+    def resolve_name(self, content: str) -> Optional[str]:
+        """Return the registered command name for a message body, if any"""
+        if not content.startswith(self.prefix):
+            return None
+
+        # Only the first token is lowercased, not the whole message body
+        parts = content.split(None, 1)
+        if not parts:
+            return None
+        name = parts[0][len(self.prefix):].lower()
+        return name if name in self.handlers else None
+
+    def resolve(self, content: str) -> Optional[CommandHandler]:
+        """Return the handler for a message body, or None if it is not a command"""
+        name = self.resolve_name(content)
+        return self.handlers[name] if name is not None else None
+
+    async def dispatch(self, bot, message) -> bool:
+        """Run the handler for a message if it is a registered command"""
+        name = self.resolve_name(message.content)
+        if name is None:
+            return False
+
+        if self.permission is not None and not self.permission(message.author):
+            # Only the first refusal in a window is answered, so denied spam posts one reply
+            if rate_limits.should_warn("denied", self.denied_limit, message, self.denied_limit.per):
+                await self.handlers[name](bot, message)
+            return True
+
+        limit = self.limits[name]
+        if limit is not None:
+            command = f"{self.prefix}{name}"
+            retry_after = rate_limits.check(command, limit, message)
+            if retry_after:
+                if rate_limits.should_warn(command, limit, message, retry_after):
+                    await message.channel.send(
+                        f"⏰ {message.author.mention}, slow down! You can use `{command}` again in {format_retry_after(retry_after)}.",
+                        delete_after=min(retry_after, 10)
+                    )
+                return True
+
+        await self.handlers[name](bot, message)
+        return True
+
+    def command_names(self):
+        """List registered commands with their prefix"""
+        return [f"{self.prefix}{name}" for name in self.handlers]
+
+MessageHandler = Callable[..., Awaitable[Optional[bool]]]
+
+class ChannelRouter:
+    """Precomputed table of which message handlers apply to which channel
+
+    Routes are keyed by channel ID, with a second table keyed by the parent ID
+    of threads. A handler that returns True consumes the message and stops the
+    rest of its route.
+    """
+
+    def __init__(self, build_routes: Callable[[], tuple]):
+        self.build_routes = build_routes
+        self.channel_routes: Dict[int, tuple] = {}
+        self.thread_routes: Dict[int, tuple] = {}
+        self.default_route: tuple = ()
+        self.rebuild()
+
+    def rebuild(self):
+        """Recompute the routing table (call after channel or config changes)"""
+        self.channel_routes, self.thread_routes, self.default_route = self.build_routes()
+        logger.info(
+            f"Rebuilt channel routes: {len(self.channel_routes)} channel(s), "
+            f"{len(self.thread_routes)} thread parent(s)"
+        )
+
+    def route_for(self, channel) -> tuple:
+        """Return the handlers that apply to a channel"""
+        route = self.channel_routes.get(channel.id)
+        if route is not None:
+            return route
+
+        parent_id = getattr(channel, 'parent_id', None)
+        if parent_id is not None:
+            return self.thread_routes.get(parent_id, self.default_route)
+        return self.default_route
+
+    async def dispatch(self, bot, message):
+        """Run the handlers routed to the message's channel in order"""
+        for handler in self.route_for(message.channel):
+            if await handler(bot, message):
+                return
@@ -12,10 +12,21 @@ FORUM_CHANNEL_ID = 1441865464740581561  # Forum channel ID for restricted commen
 COMMAND_TIMEOUT = 30.0
 MESSAGE_DELETE_DELAY = 5
 
-# Rate limiting configuration
-RATE_LIMIT_DELAY = 2  # seconds between API calls when rate limited
-RATE_LIMIT_RETRY_DELAY = 5  # seconds to wait before retrying after rate limit
-ATTACHMENT_SEND_DELAY = 1  # seconds between sending multiple attachments
+# Outbound REST scheduler: every bot-initiated call is queued by priority and paced per route
+REST_CONCURRENCY = int(os.getenv('REST_CONCURRENCY', '4'))  # REST calls in flight at once
+REST_RESERVED_WORKERS = int(os.getenv('REST_RESERVED_WORKERS', '1'))  # Extra workers kept free for enforcement and DMs
+REST_MAX_RETRIES = int(os.getenv('REST_MAX_RETRIES', '3'))  # Times a rate-limited call is retried before failing
+REST_MAX_RATELIMIT_WAIT = 30  # Longer waits are handed back to the scheduler instead of blocking a worker (discord.py minimum)
+
+# Moderation DMs: paced separately, since DM limits are stricter than channel limits
+DM_SEND_INTERVAL = float(os.getenv('DM_SEND_INTERVAL', '0.5'))  # Seconds between DMs
+DM_ENFORCE_WAIT = float(os.getenv('DM_ENFORCE_WAIT', '2'))  # Seconds an action waits for its DM before enforcing anyway; the DM still goes out
+DM_CLOSED_TTL = int(os.getenv('DM_CLOSED_TTL', str(6 * 3600)))  # Seconds to skip users whose DMs returned 403
+DM_DEDUPE_WINDOW = int(os.getenv('DM_DEDUPE_WINDOW', '60'))  # Seconds in which the same notification to a user is sent once
+DM_CACHE_SIZE = int(os.getenv('DM_CACHE_SIZE', '10000'))  # Users kept in each DM cache
+
+# Timed message deletions share one timer wheel and are flushed per channel as bulk deletes
+DELETION_TICK = float(os.getenv('DELETION_TICK', '0.25'))  # Seconds per wheel tick; deletions due in the same tick are batched
 
 # Bot token from environment variable
 BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
@@ -55,6 +66,8 @@ GUILDED_FALLBACK_TO_NEW = os.getenv('GUILDED_FALLBACK_TO_NEW', 'true').lower() =
 
 # Automatic role management configuration
 # Role combinations that should trigger automatic role assignment
+# These seed DATA_DIR/auto_roles.json on first start; edit them at runtime with /rolecombo afterwards
+# A combination may use 'expression' (all/any/not/atleast) instead of 'required_roles'
 # Format: {'required_roles': ['Role1', 'Role2'], 'target_role': 'NewRole', 'enabled': True}
 AUTO_ROLE_COMBINATIONS = [
     {
@@ -82,3 +95,49 @@ AUTO_ROLE_LOG_CHANNEL_ID = int(os.getenv('AUTO_ROLE_LOG_CHANNEL_ID', LOG_CHANNEL
 
 # Role self-service configuration
 ROLE_CHECK_COOLDOWN = int(os.getenv('ROLE_CHECK_COOLDOWN', '60'))  # Cooldown in seconds between user role checks
+
+# Member update queue: bursts of role changes per member are merged before processing
+ROLE_UPDATE_CONCURRENCY = int(os.getenv('ROLE_UPDATE_CONCURRENCY', '8'))  # Members processed in parallel
+ROLE_UPDATE_BATCH_WINDOW = float(os.getenv('ROLE_UPDATE_BATCH_WINDOW', '0.25'))  # Seconds to wait for more events per member
+ROLE_UPDATE_MAX_PENDING = int(os.getenv('ROLE_UPDATE_MAX_PENDING', '10000'))  # Members queued before new updates are dropped
+
+# Offline catch-up: members whose combo roles changed while the bot was away are re-checked
+ROLE_DRIFT_CHECK_INTERVAL = int(os.getenv('ROLE_DRIFT_CHECK_INTERVAL', '60'))  # Seconds between drift check slices
+ROLE_DRIFT_CHECK_SLICE = int(os.getenv('ROLE_DRIFT_CHECK_SLICE', '500'))  # Members compared per slice
+
+# Command and button rate limits
+RATE_LIMIT_SNAPSHOT = os.getenv('RATE_LIMIT_SNAPSHOT', 'true').lower() == 'true'  # Keep cooldowns across restarts
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))  # Tracked users/channels per limiter
+
+# Role statistics (/rolestats): counters are kept live and fully recounted occasionally
+ROLE_STATS_RECOUNT_INTERVAL = int(os.getenv('ROLE_STATS_RECOUNT_INTERVAL', '3600'))  # Seconds between recounts
+
+# Log channel writer: embeds are packed per message, bursts are summarized in digests
+LOG_FLUSH_DELAY = float(os.getenv('LOG_FLUSH_DELAY', '2'))  # Seconds to wait for more embeds before sending
+LOG_DIGEST_THRESHOLD = int(os.getenv('LOG_DIGEST_THRESHOLD', '30'))  # Role log entries per minute before switching to digests
+LOG_DIGEST_INTERVAL = int(os.getenv('LOG_DIGEST_INTERVAL', '60'))  # Seconds between digest messages
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '1000'))  # Queued log entries before producers wait
+
+# Evidence re-upload: downloads are streamed to temp files and uploaded up to ten per message
+EVIDENCE_DOWNLOAD_CONCURRENCY = int(os.getenv('EVIDENCE_DOWNLOAD_CONCURRENCY', '4'))  # Attachments downloaded at once
+EVIDENCE_SPOOL_THRESHOLD = int(os.getenv('EVIDENCE_SPOOL_THRESHOLD', str(1024 * 1024)))  # Bytes kept in memory before spilling to disk
+EVIDENCE_DOWNLOAD_TIMEOUT = int(os.getenv('EVIDENCE_DOWNLOAD_TIMEOUT', '60'))  # Seconds per attachment download
+EVIDENCE_STORE_MAX_BYTES = int(os.getenv('EVIDENCE_STORE_MAX_BYTES', str(512 * 1024 * 1024)))  # Local evidence kept before the least recently used is evicted
+EVIDENCE_COLLECT_TIMEOUT = int(os.getenv('EVIDENCE_COLLECT_TIMEOUT', '30'))  # Seconds to add more evidence after a slash command
+EVIDENCE_MAX_FILES = int(os.getenv('EVIDENCE_MAX_FILES', '25'))  # Files collected per action
+EVIDENCE_UPLOAD_WAIT = int(os.getenv('EVIDENCE_UPLOAD_WAIT', '120'))  # Seconds to wait for another action's upload of the same file
+
+# Optional evidence image compression (requires Pillow); originals stay in the local evidence store
+EVIDENCE_COMPRESS_IMAGES = os.getenv('EVIDENCE_COMPRESS_IMAGES', 'false').lower() == 'true'  # Re-encode large images before upload
+EVIDENCE_COMPRESS_FORMAT = os.getenv('EVIDENCE_COMPRESS_FORMAT', 'webp')  # 'webp' or 'jpeg'
+EVIDENCE_COMPRESS_QUALITY = int(os.getenv('EVIDENCE_COMPRESS_QUALITY', '80'))  # Encoder quality (1-100)
+EVIDENCE_COMPRESS_MIN_BYTES = int(os.getenv('EVIDENCE_COMPRESS_MIN_BYTES', str(1024 * 1024)))  # Smaller images are uploaded as-is
+EVIDENCE_COMPRESS_WORKERS = int(os.getenv('EVIDENCE_COMPRESS_WORKERS', '2'))  # Processes in the compression pool
+EVIDENCE_THUMBNAIL_SIZE = int(os.getenv('EVIDENCE_THUMBNAIL_SIZE', '320'))  # Longest side of the log embed thumbnail
+
+# Local storage for resumable jobs and caches
+DATA_DIR = os.getenv('BOT_DATA_DIR', 'data')
+
+# Bulk role sweep (/checkroles) configuration
+ROLE_SWEEP_WORKERS = int(os.getenv('ROLE_SWEEP_WORKERS', '4'))  # Concurrent role edits during a sweep
+ROLE_SWEEP_CHECKPOINT_INTERVAL = 5  # seconds between saving the sweep cursor
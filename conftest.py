@@ -0,0 +1,10 @@
+"""
+Test setup for Discord Bot
+config.py refuses to import without a token, and stores write under BOT_DATA_DIR
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault('DISCORD_BOT_TOKEN', 'test')
+os.environ.setdefault('BOT_DATA_DIR', tempfile.mkdtemp(prefix='bot-test-data-'))
@@ -0,0 +1,134 @@
+"""
+Conversation Router for Discord Bot
+Pending interactive prompts indexed by (channel, author) so each message needs one lookup
+"""
+
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[int, int]
+MessageCheck = Callable[[object], bool]
+
+class ConversationCancelled(asyncio.TimeoutError):
+    """Raised in a conversation that was cancelled; callers treat it like a timeout"""
+
+class Conversation:
+    """One user's pending prompt in one channel
+
+    Replies are queued, so none are lost between two prompts. The deadline
+    is fixed when the conversation opens; next_message() can wait less but
+    never past it. Only messages passing `check` are taken; the rest are
+    handled as if no prompt were open. A `once` conversation closes as soon
+    as it has its reply.
+    """
+    __slots__ = ('router', 'key', 'label', 'check', 'once', 'started', 'deadline', 'inbox', 'cancelled')
+
+    def __init__(self, router, key: Key, timeout: float, label: str, check: Optional[MessageCheck] = None, once: bool = False):
+        self.router = router
+        self.key = key
+        self.label = label
+        self.check = check
+        self.once = once
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.cancelled = False
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    async def next_message(self, timeout: Optional[float] = None):
+        """The user's next message; raises asyncio.TimeoutError at the deadline"""
+        if not self.inbox.empty():
+            message = self.inbox.get_nowait()
+        else:
+            wait = self.remaining if timeout is None else min(timeout, self.remaining)
+            message = await asyncio.wait_for(self.inbox.get(), wait)
+        if message is None:
+            raise ConversationCancelled(f"Conversation '{self.label}' was cancelled")
+        return message
+
+    def close(self):
+        self.router._remove(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+class ConversationRouter:
+    """Delivers messages to whichever conversation is waiting on their author and channel
+
+    Replaces one bot.wait_for() listener per prompt, whose checks all ran
+    against every message the bot received. on_message calls feed() once
+    per message; the cost no longer depends on how many prompts are open.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[Key, Conversation] = {}
+        self.delivered = 0
+
+    def open(self, channel_id: int, author_id: int, timeout: float, label: str = "prompt",
+             check: Optional[MessageCheck] = None, once: bool = False) -> Conversation:
+        """Start a conversation; use as `async with` so it is always closed"""
+        key = (channel_id, author_id)
+        previous = self.sessions.get(key)
+        if previous is not None:
+            # A newer prompt from the same user in the same channel takes over
+            self._cancel(previous)
+        conversation = self.sessions[key] = Conversation(self, key, timeout, label, check, once)
+        return conversation
+
+    async def wait_for_reply(self, channel_id: int, author_id: int, timeout: float, label: str = "prompt",
+                             check: Optional[MessageCheck] = None):
+        """Wait for a single message from the user; raises asyncio.TimeoutError"""
+        async with self.open(channel_id, author_id, timeout, label, check, once=True) as conversation:
+            return await conversation.next_message()
+
+    def feed(self, message) -> bool:
+        """Hand a message to a waiting conversation; True if one took it"""
+        conversation = self.sessions.get((message.channel.id, message.author.id))
+        if conversation is None:
+            return False
+        if conversation.check is not None and not conversation.check(message):
+            return False
+        if conversation.once:
+            self._remove(conversation)  # Later messages aren't queued behind the reply
+        conversation.inbox.put_nowait(message)
+        self.delivered += 1
+        return True
+
+    def list_sessions(self, channel_ids=None) -> List[Conversation]:
+        """Open conversations, oldest first, optionally only in the given channels"""
+        sessions = [c for c in self.sessions.values() if channel_ids is None or c.key[0] in channel_ids]
+        return sorted(sessions, key=lambda c: c.started)
+
+    def cancel(self, channel_id: Optional[int] = None, author_id: Optional[int] = None) -> int:
+        """Cancel matching conversations (None matches anything); returns how many"""
+        matching = [
+            c for c in self.sessions.values()
+            if (channel_id is None or c.key[0] == channel_id) and (author_id is None or c.key[1] == author_id)
+        ]
+        for conversation in matching:
+            self._cancel(conversation)
+        if matching:
+            logger.info(f"Cancelled {len(matching)} conversation(s)")
+        return len(matching)
+
+    def _cancel(self, conversation: Conversation):
+        conversation.cancelled = True
+        conversation.inbox.put_nowait(None)
+        self._remove(conversation)
+
+    def _remove(self, conversation: Conversation):
+        if self.sessions.get(conversation.key) is conversation:
+            del self.sessions[conversation.key]
+
+# Global instance
+conversations = ConversationRouter()
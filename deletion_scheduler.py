@@ -0,0 +1,187 @@
+"""
+Deletion Scheduler for Discord Bot
+Timed message deletions on a hierarchical timer wheel, flushed per channel with bulk deletes
+"""
+
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, List, Tuple
+import discord
+from config import DELETION_TICK
+from rest_scheduler import rest_scheduler, Priority, message_route, bulk_delete_route
+
+logger = logging.getLogger(__name__)
+
+WHEEL_BITS = 6  # 64 slots per level
+WHEEL_LEVELS = 4  # 64^4 ticks: about 48 days at 0.25s ticks
+WHEEL_MASK = (1 << WHEEL_BITS) - 1
+BULK_DELETE_LIMIT = 100
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=1)  # Discord refuses older messages in bulk deletes
+
+@dataclass
+class PendingDeletion:
+    message: object
+    due: int  # Tick on which the message is deleted
+    priority: Priority = Priority.BACKGROUND
+
+class DeletionScheduler:
+    """Deletes messages after a delay, from a single background task
+
+    Pending deletions sit in a hierarchical timer wheel: four levels of 64
+    slots, each level's slot spanning a full turn of the level below. Adding
+    one is O(1), and a tick only touches its own slot, plus a cascade from
+    the next level every 64 ticks. Due messages are grouped by channel and
+    removed with bulk deletes of up to 100. Messages older than 14 days, or a
+    lone message in its channel, fall back to single deletes. Each deletion
+    keeps the REST priority it was scheduled with, so enforcement deletes
+    don't queue behind evidence cleanup.
+    """
+
+    def __init__(self, tick: float = DELETION_TICK):
+        self.tick_seconds = tick
+        self.origin = time.monotonic()
+        self.tick = 0  # Next tick to process
+        self.wheel: List[List[List[PendingDeletion]]] = [[[] for _ in range(1 << WHEEL_BITS)] for _ in range(WHEEL_LEVELS)]
+        self.pending: Dict[int, PendingDeletion] = {}  # Message ID -> deletion
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+        self.deleted = 0
+        self.failed = 0
+        self.bulk_requests = 0
+        self.single_requests = 0
+
+    def schedule(self, message, delay: float = 0, priority: Priority = Priority.BACKGROUND):
+        """Delete a message after `delay` seconds; scheduling it again keeps the first time"""
+        if message.id in self.pending:
+            return
+        if not self.pending:
+            self.tick = max(self.tick, self._current_tick())  # Nothing to catch up on
+        deletion = PendingDeletion(message, self._current_tick() + max(1, int(-(-delay // self.tick_seconds))), priority)
+        self.pending[message.id] = deletion
+        self._insert(deletion)
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        self.wakeup.set()
+
+    def _current_tick(self) -> int:
+        return int((time.monotonic() - self.origin) / self.tick_seconds)
+
+    def _insert(self, deletion: PendingDeletion):
+        delta = deletion.due - self.tick
+        if delta < 0:
+            deletion.due = self.tick
+            delta = 0
+        for level in range(WHEEL_LEVELS):
+            if delta < 1 << (WHEEL_BITS * (level + 1)):
+                break
+        else:
+            deletion.due = self.tick + (1 << (WHEEL_BITS * WHEEL_LEVELS)) - 1  # Past the last level
+        self.wheel[level][(deletion.due >> (WHEEL_BITS * level)) & WHEEL_MASK].append(deletion)
+
+    def _cascade(self, level: int):
+        """Spread the current slot of a higher level over the levels below it"""
+        index = (self.tick >> (WHEEL_BITS * level)) & WHEEL_MASK
+        deletions, self.wheel[level][index] = self.wheel[level][index], []
+        for deletion in deletions:
+            self._insert(deletion)
+        if index == 0 and level + 1 < WHEEL_LEVELS:
+            self._cascade(level + 1)
+
+    def _advance(self) -> List[PendingDeletion]:
+        """Process one tick and return the deletions that fell due"""
+        index = self.tick & WHEEL_MASK
+        if index == 0:
+            self._cascade(1)
+        due, self.wheel[0][index] = self.wheel[0][index], []
+        self.tick += 1
+        return due
+
+    def take_due(self) -> List[PendingDeletion]:
+        """Every deletion due by now"""
+        due = []
+        now = self._current_tick()
+        while self.tick <= now and self.pending:
+            for deletion in self._advance():
+                if self.pending.pop(deletion.message.id, None) is deletion:
+                    due.append(deletion)
+        return due
+
+    async def _run(self):
+        while True:
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            try:
+                due = self.take_due()
+                if due:
+                    # Deletions falling due while these requests run are batched into the next flush
+                    await self._flush(due)
+            except Exception as e:
+                logger.error(f"Deletion scheduler tick {self.tick} failed: {e}")
+            await asyncio.sleep(max(0.0, self.origin + self.tick * self.tick_seconds - time.monotonic()))
+
+    async def _flush(self, due: List[PendingDeletion]):
+        batches: Dict[Tuple[int, Priority], Tuple[object, List]] = {}
+        for deletion in due:
+            channel = deletion.message.channel
+            batches.setdefault((channel.id, deletion.priority), (channel, []))[1].append(deletion.message)
+        await asyncio.gather(*(
+            self._delete_in(channel, messages, priority)
+            for (_, priority), (channel, messages) in batches.items()
+        ))
+
+    async def _delete_in(self, channel, messages: List, priority: Priority = Priority.BACKGROUND):
+        deleted_before = self.deleted
+        cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+        singles = []
+        recent = []
+        for message in messages:
+            (recent if message.created_at > cutoff else singles).append(message)
+        if not hasattr(channel, 'delete_messages'):
+            singles, recent = singles + recent, []
+
+        for start in range(0, len(recent), BULK_DELETE_LIMIT):
+            chunk = recent[start:start + BULK_DELETE_LIMIT]
+            if len(chunk) == 1:
+                singles.extend(chunk)  # Bulk deletes need at least two messages
+                continue
+            try:
+                self.bulk_requests += 1
+                await rest_scheduler.call(priority, bulk_delete_route(channel), lambda chunk=chunk: channel.delete_messages(chunk))
+                self.deleted += len(chunk)
+            except discord.Forbidden:
+                logger.error(f"❌ No permission to delete messages in #{channel}")
+                self.failed += len(chunk)
+            except (discord.HTTPException, discord.RateLimited) as e:
+                logger.warning(f"Bulk delete of {len(chunk)} message(s) in #{channel} failed, deleting one by one: {e}")
+                singles.extend(chunk)
+
+        for message in singles:
+            self.single_requests += 1
+            try:
+                await rest_scheduler.call(priority, message_route(channel, 'DELETE'), message.delete)
+                self.deleted += 1
+            except discord.NotFound:
+                pass  # Already deleted
+            except (discord.HTTPException, discord.RateLimited) as e:
+                logger.error(f"❌ Error deleting message {message.id} in #{channel}: {e}")
+                self.failed += 1
+        logger.info(f"🗑️ Deleted {self.deleted - deleted_before}/{len(messages)} message(s) in #{channel}")
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "pending": len(self.pending),
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "bulk_requests": self.bulk_requests,
+            "single_requests": self.single_requests,
+        }
+
+# Global instance
+deletion_scheduler = DeletionScheduler()
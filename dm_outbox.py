@@ -0,0 +1,156 @@
+"""
+DM Outbox for Discord Bot
+Paced moderation DMs with a DM channel cache and a negative cache of closed DMs
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+import discord
+from config import DM_SEND_INTERVAL, DM_CLOSED_TTL, DM_DEDUPE_WINDOW, DM_CACHE_SIZE
+from rest_scheduler import rest_scheduler, Priority, channel_route, CREATE_DM_ROUTE
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 500  # Recent DM latencies kept
+
+class DMOutbox:
+    """Sends moderation DMs one paced slot at a time
+
+    - Users whose DMs answered 403 are remembered for DM_CLOSED_TTL seconds
+      and skipped without a request.
+    - DM channels are cached, so only the first DM to a user opens one.
+    - The same notification to the same user within DM_DEDUPE_WINDOW seconds
+      is sent once; concurrent duplicates share the one send.
+    """
+
+    def __init__(self, interval: float = DM_SEND_INTERVAL, closed_ttl: float = DM_CLOSED_TTL,
+                 dedupe_window: float = DM_DEDUPE_WINDOW, cache_size: int = DM_CACHE_SIZE):
+        self.interval = interval
+        self.closed_ttl = closed_ttl
+        self.dedupe_window = dedupe_window
+        self.cache_size = cache_size
+        self.next_slot = 0.0
+
+        self.closed: 'OrderedDict[int, float]' = OrderedDict()  # User ID -> when to try again
+        self.channels: 'OrderedDict[int, discord.DMChannel]' = OrderedDict()
+        self.recent: Dict[Tuple[int, str], Tuple[float, asyncio.Future]] = {}
+
+        self.sent = 0
+        self.failed = 0
+        self.closed_hits = 0
+        self.closed_misses = 0
+        self.channel_hits = 0
+        self.channel_misses = 0
+        self.deduped = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    async def send(self, user, embed: discord.Embed, key: str = "") -> bool:
+        """DM an embed to a user; True if it was delivered (now or by an identical recent send)"""
+        if self._dms_closed(user.id):
+            self.closed_hits += 1
+            return False
+        self.closed_misses += 1
+
+        now = time.monotonic()
+        dedupe_key = (user.id, key)
+        recent = self.recent.get(dedupe_key)
+        if recent is not None and now - recent[0] < self.dedupe_window:
+            self.deduped += 1
+            return await asyncio.shield(recent[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self._remember(dedupe_key, now, future)
+        try:
+            delivered = await self._deliver(user, embed)
+        except BaseException:
+            future.set_result(False)  # Duplicates waiting on this send see a failed DM, not our error
+            self.recent.pop(dedupe_key, None)
+            raise
+        future.set_result(delivered)
+        if delivered:
+            self.latencies.append(time.monotonic() - now)
+        else:
+            self.recent.pop(dedupe_key, None)  # A later attempt may still get through
+        return delivered
+
+    async def _deliver(self, user, embed: discord.Embed) -> bool:
+        await self._wait_for_slot()
+        try:
+            channel = await self._dm_channel(user)
+            await rest_scheduler.call(Priority.DM, channel_route(channel), lambda: channel.send(embed=embed))
+        except discord.Forbidden:
+            # DMs closed or the bot is blocked; don't ask again for a while
+            self._mark_closed(user.id)
+            self.failed += 1
+            return False
+        except (discord.HTTPException, discord.RateLimited) as e:
+            logger.warning(f"Error sending DM to {user}: {e}")
+            self.failed += 1
+            return False
+        self.sent += 1
+        return True
+
+    async def _wait_for_slot(self):
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _dm_channel(self, user) -> discord.DMChannel:
+        channel = self.channels.get(user.id) or getattr(user, 'dm_channel', None)
+        if channel is not None:
+            self.channel_hits += 1
+        else:
+            self.channel_misses += 1
+            channel = await rest_scheduler.call(Priority.DM, CREATE_DM_ROUTE, user.create_dm)
+        self.channels[user.id] = channel
+        self.channels.move_to_end(user.id)
+        if len(self.channels) > self.cache_size:
+            self.channels.popitem(last=False)
+        return channel
+
+    def _dms_closed(self, user_id: int) -> bool:
+        retry_at = self.closed.get(user_id)
+        if retry_at is None:
+            return False
+        if retry_at > time.monotonic():
+            return True
+        del self.closed[user_id]
+        return False
+
+    def _mark_closed(self, user_id: int):
+        self.closed[user_id] = time.monotonic() + self.closed_ttl
+        self.closed.move_to_end(user_id)
+        if len(self.closed) > self.cache_size:
+            self.closed.popitem(last=False)
+
+    def _remember(self, dedupe_key: Tuple[int, str], now: float, future: asyncio.Future):
+        if len(self.recent) >= self.cache_size:
+            self.recent = {k: v for k, v in self.recent.items() if now - v[0] < self.dedupe_window}
+        self.recent[dedupe_key] = (now, future)
+
+    def latency_summary(self) -> Optional[Tuple[int, float, float]]:
+        """(samples, median, worst) seconds from queuing a DM until it was sent"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return len(ordered), ordered[len(ordered) // 2], ordered[-1]
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "closed_cached": len(self.closed),
+            "closed_hits": self.closed_hits,
+            "closed_misses": self.closed_misses,
+            "channel_hits": self.channel_hits,
+            "channel_misses": self.channel_misses,
+            "deduped": self.deduped,
+        }
+
+# Global instance
+dm_outbox = DMOutbox()
@@ -0,0 +1,179 @@
+"""
+Evidence Re-upload for Discord Bot
+Streams moderation evidence into spooled temp files and packs it into as few log messages as possible
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass, field
+from typing import IO, List, Optional
+import aiohttp
+import discord
+from config import EVIDENCE_DOWNLOAD_CONCURRENCY, EVIDENCE_SPOOL_THRESHOLD, EVIDENCE_DOWNLOAD_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+MAX_FILES_PER_MESSAGE = 10
+CHUNK_SIZE = 64 * 1024
+
+@dataclass
+class EvidenceFile:
+    """One downloaded attachment, or the reason it couldn't be"""
+    index: int
+    filename: str
+    url: str
+    fp: Optional[IO[bytes]] = None
+    size: int = 0
+    sha256: Optional[str] = None
+    error: Optional[str] = None
+    transformed: bool = False  # The upload differs from the downloaded file
+
+    @property
+    def label(self) -> str:
+        return f"Evidence {self.index + 1}"
+
+    @property
+    def upload_name(self) -> str:
+        return f"evidence_{self.index + 1}_{self.filename}"
+
+    def to_file(self) -> discord.File:
+        self.fp.seek(0)
+        return discord.File(fp=self.fp, filename=self.upload_name)
+
+    def replace_data(self, fp: IO[bytes], size: int, extension: str):
+        """Upload different data (e.g. a re-encoded image) under a matching file extension"""
+        self.close()
+        self.fp = fp
+        self.size = size
+        self.filename = os.path.splitext(self.filename)[0] + extension
+        self.transformed = True
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+@dataclass
+class EvidenceDownload:
+    """Results of downloading one action's evidence, with memory and timing figures"""
+    files: List[EvidenceFile] = field(default_factory=list)
+    in_memory: int = 0  # Bytes currently buffered in memory rather than on disk
+    peak_memory: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def downloaded(self) -> List[EvidenceFile]:
+        return [file for file in self.files if file.error is None]
+
+    @property
+    def failed(self) -> List[EvidenceFile]:
+        return [file for file in self.files if file.error is not None]
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(file.size for file in self.downloaded)
+
+    def _buffered(self, delta: int):
+        self.in_memory += delta
+        self.peak_memory = max(self.peak_memory, self.in_memory)
+
+    def close(self):
+        for file in self.files:
+            file.close()
+
+def pack_files(files: List[EvidenceFile], size_limit: int) -> List[List[EvidenceFile]]:
+    """Group files into messages of at most ten whose combined size fits the upload limit"""
+    batches: List[List[EvidenceFile]] = []
+    batch: List[EvidenceFile] = []
+    size = 0
+    for file in files:
+        if batch and (len(batch) == MAX_FILES_PER_MESSAGE or size + file.size > size_limit):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(file)
+        size += file.size
+    if batch:
+        batches.append(batch)
+    return batches
+
+def format_size(size: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024 or unit == 'MB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+class EvidenceDownloader:
+    """Downloads attachments concurrently without holding them all in memory
+
+    Each attachment is streamed in chunks into a SpooledTemporaryFile, which
+    moves to disk once it passes EVIDENCE_SPOOL_THRESHOLD. A shared semaphore
+    bounds concurrent downloads across all moderation actions.
+    """
+
+    def __init__(self, concurrency: int = EVIDENCE_DOWNLOAD_CONCURRENCY, spool_threshold: int = EVIDENCE_SPOOL_THRESHOLD):
+        self.spool_threshold = spool_threshold
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def init_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=EVIDENCE_DOWNLOAD_TIMEOUT))
+
+    async def close_session(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def download_all(self, attachments, size_limit: int) -> EvidenceDownload:
+        """Download every attachment, skipping ones too large to re-upload"""
+        started = time.perf_counter()
+        result = EvidenceDownload(files=[
+            EvidenceFile(index=i, filename=attachment.filename, url=attachment.url)
+            for i, attachment in enumerate(attachments)
+        ])
+        await self.init_session()
+        await asyncio.gather(*(
+            self._download(attachment, file, size_limit, result)
+            for attachment, file in zip(attachments, result.files)
+        ))
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    async def _download(self, attachment, file: EvidenceFile, size_limit: int, result: EvidenceDownload):
+        if (getattr(attachment, 'size', 0) or 0) > size_limit:
+            file.error = f"larger than the {format_size(size_limit)} upload limit"
+            return
+
+        async with self.semaphore:
+            fp = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold)
+            buffered = 0
+            digest = hashlib.sha256()
+            try:
+                async with self.session.get(file.url) as response:
+                    if response.status != 200:
+                        raise ValueError(f"HTTP {response.status}")
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        fp.write(chunk)
+                        digest.update(chunk)
+                        file.size += len(chunk)
+                        if file.size > size_limit:
+                            raise ValueError(f"larger than the {format_size(size_limit)} upload limit")
+                        # The file rolls over to disk once it passes the threshold
+                        now_buffered = file.size if file.size <= self.spool_threshold else 0
+                        result._buffered(now_buffered - buffered)
+                        buffered = now_buffered
+                file.fp = fp
+                file.sha256 = digest.hexdigest()
+            except Exception as e:
+                fp.close()
+                result._buffered(-buffered)
+                file.size = 0
+                file.error = str(e) or type(e).__name__
+                logger.warning(f"Failed to download evidence {file.filename}: {file.error}")
+
+# Global instance
+evidence_downloader = EvidenceDownloader()
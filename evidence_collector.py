@@ -0,0 +1,185 @@
+"""
+Evidence Collection for Discord Bot
+Gathers extra evidence after a slash command until the moderator is done or the deadline passes
+"""
+
+import re
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+import discord
+from config import EVIDENCE_COLLECT_TIMEOUT, EVIDENCE_MAX_FILES
+from conversations import conversations
+from rest_scheduler import rest_scheduler, Priority, followup_edit_route
+from utils import send_followup
+
+logger = logging.getLogger(__name__)
+
+DONE_WORDS = ('done', 'proceed', 'continue')
+PROGRESS_EDIT_INTERVAL = 1.0  # Seconds between edits of the progress message
+MESSAGE_LINK = re.compile(r'https://(?:\w+\.)?discord(?:app)?\.com/channels/(\d+)/(\d+)/(\d+)')
+URL = re.compile(r'https?://\S+')
+
+@dataclass
+class EvidenceBundle:
+    """Evidence for one action, ready to hand to the moderation pipeline"""
+    attachments: List = field(default_factory=list)
+    links: List[str] = field(default_factory=list)
+    messages_to_delete: List = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.attachments or self.links)
+
+    def command_text(self, text: str) -> str:
+        """Command text with the collected links appended, so log_action lists them as evidence"""
+        return " ".join([text, *self.links])
+
+class EvidenceSession:
+    """One moderator adding evidence in a channel
+
+    Messages arrive through the conversation router, so nothing polls. The
+    session ends on `done`, at an absolute deadline, or once EVIDENCE_MAX_FILES
+    files are collected. Progress is shown by editing a single ephemeral
+    followup, at most once a second. Besides attachments, a reply to a
+    message or a link to one adds that message's attachments. Only messages
+    that could add evidence or end the session are taken; anything else the
+    moderator says goes on to the usual handlers.
+    """
+
+    def __init__(self, bot, interaction: discord.Interaction, initial_evidence=None,
+                 timeout: float = EVIDENCE_COLLECT_TIMEOUT, max_files: int = EVIDENCE_MAX_FILES):
+        self.bot = bot
+        self.interaction = interaction
+        self.timeout = timeout
+        self.max_files = max_files
+        self.bundle = EvidenceBundle(attachments=[initial_evidence] if initial_evidence else [])
+        self.seen_attachment_ids = {initial_evidence.id} if initial_evidence else set()
+        self.deadline = time.monotonic() + timeout
+        self.progress: Optional[discord.WebhookMessage] = None
+        self.dirty = asyncio.Event()
+        self.note = ""
+
+    @property
+    def full(self) -> bool:
+        return len(self.bundle.attachments) >= self.max_files
+
+    async def collect(self) -> EvidenceBundle:
+        self.progress = await send_followup(self.interaction, self._progress_text(), ephemeral=True, wait=True)
+        updater = asyncio.create_task(self._update_progress())
+        try:
+            async with conversations.open(self.interaction.channel_id, self.interaction.user.id, self.timeout,
+                                          label="/evidence", check=self.wants) as conversation:
+                while not self.full:
+                    try:
+                        message = await conversation.next_message()
+                    except asyncio.TimeoutError:
+                        break
+                    if message.content.lower().strip() in DONE_WORDS:
+                        await self._delete(message)  # Clean up the command message immediately
+                        break
+                    if await self._add_from(message):
+                        self.dirty.set()
+        finally:
+            updater.cancel()
+
+        if self.full:
+            self.note = f"Reached the limit of {self.max_files} files."
+        await self._edit(final=True)
+        return self.bundle
+
+    @staticmethod
+    def wants(message) -> bool:
+        """Whether a message belongs to the session: evidence or a done word"""
+        if message.attachments or URL.search(message.content):
+            return True
+        reference = message.reference.resolved if message.reference else None
+        if isinstance(reference, discord.Message) and reference.attachments:
+            return True
+        return message.content.lower().strip() in DONE_WORDS
+
+    async def _add_from(self, message) -> bool:
+        """Take evidence from one of the moderator's messages; False if it had none"""
+        sources = [message]
+        reference = message.reference.resolved if message.reference else None
+        if isinstance(reference, discord.Message):
+            sources.append(reference)  # Included in the gateway event, no fetch needed
+
+        links = []
+        for match in MESSAGE_LINK.finditer(message.content):
+            linked = await self._resolve_link(*map(int, match.groups()))
+            if linked is not None:
+                sources.append(linked)
+        for url in URL.findall(MESSAGE_LINK.sub('', message.content)):
+            if url not in self.bundle.links:
+                links.append(url)
+
+        added = 0
+        for source in sources:
+            for attachment in source.attachments:
+                if self.full or attachment.id in self.seen_attachment_ids:
+                    continue
+                self.seen_attachment_ids.add(attachment.id)
+                self.bundle.attachments.append(attachment)
+                added += 1
+        self.bundle.links.extend(links)
+
+        if not (added or links):
+            return False
+        self.bundle.messages_to_delete.append(message)  # Only the moderator's own message, never the linked one
+        return True
+
+    async def _resolve_link(self, guild_id: int, channel_id: int, message_id: int) -> Optional[discord.Message]:
+        if guild_id != self.interaction.guild_id:
+            return None
+        cached = discord.utils.get(self.bot.cached_messages, id=message_id)
+        if cached is not None:
+            return cached
+        channel = self.interaction.guild.get_channel_or_thread(channel_id)
+        if channel is None:
+            return None
+        try:
+            return await channel.fetch_message(message_id)
+        except discord.HTTPException as e:
+            logger.info(f"Could not resolve evidence link to message {message_id}: {e}")
+            return None
+
+    async def _update_progress(self):
+        while True:
+            await self.dirty.wait()
+            self.dirty.clear()
+            await self._edit()
+            await asyncio.sleep(PROGRESS_EDIT_INTERVAL)  # Updates arriving meanwhile share the next edit
+
+    async def _edit(self, final: bool = False):
+        try:
+            content = self._progress_text(final)
+            await rest_scheduler.call(Priority.PROMPT, followup_edit_route(self.interaction),
+                                      lambda: self.progress.edit(content=content))
+        except discord.HTTPException as e:
+            logger.info(f"Could not update evidence progress message: {e}")
+
+    def _progress_text(self, final: bool = False) -> str:
+        files = len(self.bundle.attachments)
+        links = len(self.bundle.links)
+        summary = f"{files} file(s)" + (f", {links} link(s)" if links else "")
+        if final:
+            return f"📎 **Final evidence count:** {summary} collected. {self.note}".strip()
+
+        names = ", ".join(f"`{attachment.filename}`" for attachment in self.bundle.attachments[-5:])
+        remaining = max(0, int(self.deadline - time.monotonic()))
+        return (
+            f"📎 **Evidence so far:** {summary}" + (f" ({names})" if names else "") + "\n\n"
+            "**Do you want to add more evidence?**\n"
+            f"• Send images/files, reply to a message, or paste a message link in this channel (about {remaining}s left)\n"
+            "• Type `done` when finished\n"
+            "• Type `proceed` to continue with just the current evidence"
+        )
+
+    @staticmethod
+    async def _delete(message):
+        try:
+            await message.delete()
+        except discord.HTTPException:
+            pass
@@ -0,0 +1,131 @@
+"""
+Evidence Image Compression for Discord Bot
+Re-encodes large screenshots and builds embed thumbnails in a process pool, off the event loop
+"""
+
+import io
+import os
+import time
+import asyncio
+import logging
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional
+import discord
+from config import (
+    EVIDENCE_COMPRESS_IMAGES, EVIDENCE_COMPRESS_FORMAT, EVIDENCE_COMPRESS_QUALITY,
+    EVIDENCE_COMPRESS_MIN_BYTES, EVIDENCE_COMPRESS_WORKERS, EVIDENCE_THUMBNAIL_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
+FORMATS = {'webp': ('WEBP', '.webp'), 'jpeg': ('JPEG', '.jpg')}
+
+@dataclass
+class CompressedImage:
+    """What the worker produced for one image"""
+    data: Optional[bytes]  # Re-encoded image, or None if it wasn't worth it
+    thumbnail: Optional[bytes]
+    cpu_time: float
+    original_size: int
+
+def _encode(image, image_format: str, quality: int) -> bytes:
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def compress_image(path: str, image_format: str, quality: int, min_bytes: int, thumbnail_size: int) -> CompressedImage:
+    """Runs in a worker process: re-encode the image if it is large, and build a thumbnail"""
+    from PIL import Image
+
+    started = time.process_time()
+    original_size = os.path.getsize(path)
+    data = thumbnail = None
+    with Image.open(path) as image:
+        image.load()
+        if original_size >= min_bytes:
+            encoded = _encode(image, image_format, quality)
+            if len(encoded) < original_size:
+                data = encoded
+        if thumbnail_size:
+            image.thumbnail((thumbnail_size, thumbnail_size))
+            thumbnail = _encode(image, image_format, quality)
+    return CompressedImage(data, thumbnail, time.process_time() - started, original_size)
+
+class EvidenceImageCompressor:
+    """Optional stage between downloading evidence and uploading it
+
+    Images at least EVIDENCE_COMPRESS_MIN_BYTES large are re-encoded to WebP
+    or JPEG when that makes them smaller; the original stays in the evidence
+    store. The work runs in a ProcessPoolExecutor that reads the stored
+    original from disk; only the smaller re-encoded bytes and the thumbnail
+    come back through the process pipe.
+    Requires Pillow and is off unless EVIDENCE_COMPRESS_IMAGES is set.
+    """
+
+    def __init__(self, enabled: bool = EVIDENCE_COMPRESS_IMAGES, workers: int = EVIDENCE_COMPRESS_WORKERS):
+        self.image_format, self.extension = FORMATS.get(EVIDENCE_COMPRESS_FORMAT.lower(), FORMATS['webp'])
+        self.enabled = enabled
+        if enabled and importlib.util.find_spec('PIL') is None:
+            logger.warning("EVIDENCE_COMPRESS_IMAGES is set but Pillow is not installed; image compression is disabled")
+            self.enabled = False
+        self.workers = workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+        self.files = 0
+        self.failed = 0
+        self.cpu_time = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @staticmethod
+    def is_image(filename: str) -> bool:
+        return filename.lower().endswith(IMAGE_EXTENSIONS)
+
+    async def process(self, file, path: str, thumbnail: bool = False) -> Optional[discord.File]:
+        """Swap an EvidenceFile's data for a smaller encoding; return a thumbnail if asked for one"""
+        if not self.enabled or not self.is_image(file.filename) or not os.path.exists(path):
+            return None
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self.executor, compress_image, path, self.image_format, EVIDENCE_COMPRESS_QUALITY,
+                EVIDENCE_COMPRESS_MIN_BYTES, EVIDENCE_THUMBNAIL_SIZE if thumbnail else 0
+            )
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Could not compress evidence {file.filename}: {e}")
+            return None
+
+        self.files += 1
+        self.cpu_time += result.cpu_time
+        self.bytes_in += result.original_size
+        if result.data is not None:
+            file.replace_data(io.BytesIO(result.data), len(result.data), self.extension)
+            logger.info(f"🗜️ Compressed {file.filename}: {result.original_size // 1024} KB → "
+                        f"{len(result.data) // 1024} KB ({result.cpu_time:.2f}s CPU)")
+        self.bytes_out += file.size
+
+        if result.thumbnail is None:
+            return None
+        return discord.File(io.BytesIO(result.thumbnail), filename=f"thumbnail_{file.index + 1}{self.extension}")
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "files": self.files,
+            "failed": self.failed,
+            "cpu_seconds": round(self.cpu_time, 3),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+        }
+
+# Global instance
+evidence_images = EvidenceImageCompressor()
@@ -0,0 +1,164 @@
+"""
+Evidence Store for Discord Bot
+Content-addressed copies of moderation evidence, so each file is kept and uploaded once
+"""
+
+import os
+import time
+import shutil
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from config import EVIDENCE_STORE_MAX_BYTES
+from storage import data_path, load_json, save_json, delete_file
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class StoredEvidence:
+    """Index entry for one file, keyed by its SHA-256"""
+    sha256: str
+    size: int
+    filename: str
+    last_used: float
+    message_url: Optional[str] = None  # Log channel message the file was uploaded in
+    attachment_url: Optional[str] = None
+
+    def to_row(self) -> List:
+        return [self.sha256, self.size, self.filename, self.last_used, self.message_url, self.attachment_url]
+
+class EvidenceStore:
+    """Files under DATA_DIR/evidence named by their hash, with an LRU index
+
+    The index is a single JSON list in least-recently-used order, so loading
+    it is one read with no directory scan. Once the stored files exceed
+    max_bytes, the least recently used are deleted. A file's log message
+    link is remembered so later actions can point at it instead of
+    uploading the same file again. Links are only kept for files uploaded
+    unchanged, and are reused without checking the log message still
+    exists: deleting one from the log channel leaves a dead link until the
+    entry is evicted. While a file is being uploaded, other actions with the
+    same file wait for that upload through `uploading`.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: int = EVIDENCE_STORE_MAX_BYTES):
+        self.root = root or os.path.dirname(data_path('evidence', 'index.json'))
+        self.index_path = os.path.join(self.root, 'index.json')
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[str, StoredEvidence]' = OrderedDict()
+        self.uploading: Dict[str, asyncio.Future] = {}  # SHA-256 -> log message URL once uploaded
+        self.total_bytes = 0
+        self.load()
+
+    def load(self):
+        saved = load_json(self.index_path, {})
+        self.entries.clear()
+        for row in saved.get('entries', []):
+            entry = StoredEvidence(*row)
+            self.entries[entry.sha256] = entry
+        self.total_bytes = sum(entry.size for entry in self.entries.values())
+        if self.entries:
+            logger.info(f"Loaded {len(self.entries)} stored evidence file(s) ({self.total_bytes // 1024} KB)")
+
+    def save(self):
+        try:
+            save_json(self.index_path, {"entries": [entry.to_row() for entry in self.entries.values()]})
+        except OSError as e:
+            logger.error(f"Failed to save evidence index: {e}")
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def lookup(self, sha256: str) -> Optional[StoredEvidence]:
+        """Find a stored file, marking it recently used"""
+        entry = self.entries.get(sha256)
+        if entry is not None:
+            entry.last_used = time.time()
+            self.entries.move_to_end(sha256)
+        return entry
+
+    async def put(self, file) -> StoredEvidence:
+        """Keep a downloaded EvidenceFile, writing it only if its hash is new"""
+        entry = self.lookup(file.sha256)
+        if entry is not None:
+            return entry
+
+        try:
+            await asyncio.to_thread(self._write, file.fp, self.path_for(file.sha256))
+        except OSError as e:
+            logger.error(f"Failed to store evidence {file.filename}: {e}")
+            return StoredEvidence(file.sha256, file.size, file.filename, time.time())  # Uploaded, but not kept
+        entry = self.entries.get(file.sha256)
+        if entry is not None:  # Stored by a concurrent action while writing
+            return entry
+        entry = self.entries[file.sha256] = StoredEvidence(file.sha256, file.size, file.filename, time.time())
+        self.total_bytes += entry.size
+        self._evict()
+        self.save()
+        return entry
+
+    @staticmethod
+    def _write(fp, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fp.seek(0)
+        tmp_path = f"{path}.{id(fp)}.tmp"  # Unique, in case two actions store the same file at once
+        with open(tmp_path, 'wb') as out:
+            shutil.copyfileobj(fp, out)
+        os.replace(tmp_path, path)
+
+    def claim_upload(self, sha256: str) -> Tuple[asyncio.Future, bool]:
+        """The pending upload of a file, and whether the caller is the one to make it"""
+        pending = self.uploading.get(sha256)
+        if pending is not None:
+            return pending, False
+        pending = self.uploading[sha256] = asyncio.get_running_loop().create_future()
+        return pending, True
+
+    def record_upload(self, files, message, claims: Optional[Dict[str, asyncio.Future]] = None):
+        """Remember where each file in a log message was uploaded; message is None if it failed
+
+        Waiters on this action's claims get the message URL, or None so
+        they upload the file themselves.
+        """
+        jump_url = message.jump_url if message is not None else None
+        for file, attachment in zip(files, message.attachments if message is not None else []):
+            entry = self.entries.get(file.sha256)
+            if entry is not None and not file.transformed:  # A re-encoded upload isn't the stored file
+                entry.message_url = jump_url
+                entry.attachment_url = attachment.url
+        for file in files:
+            claim = (claims or {}).get(file.sha256)
+            if claim is not None:
+                self._finish_upload(file.sha256, claim, jump_url)
+        if message is not None:
+            self.save()
+
+    def release_uploads(self, claims: Dict[str, asyncio.Future]):
+        """Give up claims that won't be uploaded, so waiting actions upload the files themselves"""
+        for sha256, claim in claims.items():
+            self._finish_upload(sha256, claim, None)
+
+    def _finish_upload(self, sha256: str, claim: asyncio.Future, jump_url: Optional[str]):
+        if self.uploading.get(sha256) is claim:
+            del self.uploading[sha256]
+        if not claim.done():
+            claim.set_result(jump_url)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            sha256, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry.size
+            delete_file(self.path_for(sha256))
+            logger.info(f"Evicted stored evidence {entry.filename} ({sha256[:12]})")
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "files": len(self.entries),
+            "bytes": self.total_bytes,
+            "uploaded": sum(1 for entry in self.entries.values() if entry.message_url),
+        }
+
+# Global instance
+evidence_store = EvidenceStore()
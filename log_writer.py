@@ -0,0 +1,241 @@
+"""
+Log Channel Writer for Discord Bot
+One background writer per log channel that packs embeds and digests bursts
+"""
+
+import io
+import csv
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import discord
+from rest_scheduler import rest_scheduler, Priority, channel_route
+from config import LOG_FLUSH_DELAY, LOG_DIGEST_THRESHOLD, LOG_DIGEST_INTERVAL, LOG_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+MAX_BATCH = 100  # Entries taken off the queue per flush
+DIGEST_WINDOW = 60  # Seconds over which the digest threshold is measured
+
+@dataclass
+class LogEntry:
+    """One log message: an embed, or content with files which is always sent on its own
+
+    `digest` holds (summary, CSV row) pairs; while the channel is busy the
+    entry is folded into a periodic digest instead of being sent.
+    """
+    embed: Optional[discord.Embed] = None
+    content: Optional[str] = None
+    files: List[discord.File] = field(default_factory=list)
+    fallback: Optional[str] = None  # Sent instead if sending the files fails
+    digest: List[Tuple[str, Dict]] = field(default_factory=list)
+    on_done: Optional[Callable[[Optional[discord.Message]], None]] = None  # Called with the sent message, or None if it failed
+
+class LogWriter:
+    """Serializes every send to one log channel
+
+    Plain embeds are packed up to ten per message and flushed when a batch is
+    full or after a short delay. Once more than LOG_DIGEST_THRESHOLD digestible
+    entries arrive within a minute, they are counted into a digest with a CSV
+    attachment instead. The queue is bounded so producers wait rather than
+    piling up tasks.
+    """
+
+    def __init__(self, bot, channel_id: int):
+        self.bot = bot
+        self.channel_id = channel_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.task: Optional[asyncio.Task] = None
+
+        self.recent = deque()  # Arrival times of digestible entries
+        self.digest: Dict[str, int] = {}
+        self.digest_rows: List[Dict] = []
+        self.digest_started = 0.0
+        self.digest_due = 0.0
+
+        self.messages_sent = 0
+        self.entries_written = 0
+
+    async def write(self, entry: LogEntry):
+        """Queue an entry, waiting if the writer is behind"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        await self.queue.put(entry)
+
+    def _busy(self, now: float) -> bool:
+        while self.recent and self.recent[0] < now - DIGEST_WINDOW:
+            self.recent.popleft()
+        return len(self.recent) >= LOG_DIGEST_THRESHOLD
+
+    async def _run(self):
+        while True:
+            timeout = max(0.0, self.digest_due - time.monotonic()) if self.digest else None
+            try:
+                entry = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await self._send_digest()
+                continue
+
+            batch = [entry]
+            deadline = time.monotonic() + LOG_FLUSH_DELAY
+            while len(batch) < MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._process(batch)
+                if self.digest and (time.monotonic() >= self.digest_due or not self._busy(time.monotonic())):
+                    await self._send_digest()
+            except Exception as e:
+                logger.error(f"Log writer for channel {self.channel_id} failed: {e}")
+
+    async def _process(self, batch: List[LogEntry]):
+        embeds: List[discord.Embed] = []
+        size = 0
+        for entry in batch:
+            self.entries_written += 1
+            now = time.monotonic()
+            if entry.digest:
+                self.recent.append(now)
+                if self._busy(now):
+                    self._add_to_digest(entry, now)
+                    continue
+
+            if entry.files or entry.content:
+                if embeds:
+                    await self._send_embeds(embeds)
+                    embeds, size = [], 0
+                await self._send_entry(entry)
+                continue
+
+            if entry.embed is None:
+                continue
+            entry_size = len(entry.embed)
+            if embeds and (len(embeds) == MAX_EMBEDS_PER_MESSAGE or size + entry_size > MAX_EMBED_CHARS_PER_MESSAGE):
+                await self._send_embeds(embeds)
+                embeds, size = [], 0
+            embeds.append(entry.embed)
+            size += entry_size
+
+        if embeds:
+            await self._send_embeds(embeds)
+
+    def _add_to_digest(self, entry: LogEntry, now: float):
+        if not self.digest:
+            self.digest_started = time.time()
+            self.digest_due = now + LOG_DIGEST_INTERVAL
+        for summary, row in entry.digest:
+            self.digest[summary] = self.digest.get(summary, 0) + 1
+            self.digest_rows.append(row)
+
+    async def _send_digest(self):
+        digest, rows = self.digest, self.digest_rows
+        self.digest, self.digest_rows = {}, []
+        if not digest:
+            return
+
+        embed = discord.Embed(
+            title="📦 Log Digest",
+            description="\n".join(f"• **{count}** {summary}" for summary, count in sorted(digest.items(), key=lambda item: -item[1]))[:4000],
+            color=0x0099ff,
+            timestamp=discord.utils.utcnow()
+        )
+        embed.set_footer(text=f"{len(rows)} entries since {time.strftime('%H:%M:%S', time.gmtime(self.digest_started))} UTC • full list attached")
+
+        buffer = io.StringIO()
+        fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+        csv_file = discord.File(io.BytesIO(buffer.getvalue().encode('utf-8')), filename=f"log_digest_{int(time.time())}.csv")
+        await self._send(embed=embed, file=csv_file)
+
+    async def _send_embeds(self, embeds: List[discord.Embed]):
+        try:
+            await self._send(embeds=embeds)
+        except Exception as e:
+            logger.error(f"Failed to send {len(embeds)} log embed(s) to channel {self.channel_id}: {e}")
+
+    async def _send_entry(self, entry: LogEntry):
+        """Send an entry on its own; whatever happens, its callback runs and its files are closed"""
+        kwargs = {'content': entry.content, 'embed': entry.embed}
+        if entry.files:
+            kwargs['files'] = entry.files
+        message = None
+        try:
+            message = await self._send(**kwargs)
+            if message is None and entry.fallback:
+                await self._send(content=entry.fallback)
+        except Exception as e:
+            logger.error(f"Failed to send log entry to channel {self.channel_id}: {e}")
+        finally:
+            self._finish_entry(entry, message)
+
+    @staticmethod
+    def _finish_entry(entry: LogEntry, message: Optional[discord.Message]):
+        if entry.on_done:
+            try:
+                entry.on_done(message)
+            except Exception as e:
+                logger.error(f"Log entry callback failed: {e}")
+        for file in entry.files:
+            # discord.File leaves buffers it didn't open to the caller; release temp files now
+            file.close()
+            file.fp.close()
+
+    async def _send(self, **kwargs) -> Optional[discord.Message]:
+        channel = self.bot.get_channel(self.channel_id)
+        if not channel:
+            logger.error(f"Log channel {self.channel_id} not found")
+            return None
+        try:
+            message = await rest_scheduler.call(Priority.LOG, channel_route(channel), lambda: self._post(channel, kwargs))
+            self.messages_sent += 1
+            return message
+        except discord.Forbidden:
+            logger.error(f"Missing permission to send to log channel {self.channel_id}")
+        except (discord.HTTPException, discord.RateLimited) as e:
+            logger.error(f"Failed to send to log channel {self.channel_id}: {e}")
+        return None
+
+    @staticmethod
+    def _post(channel, kwargs):
+        for file in [*kwargs.get('files', []), *([kwargs['file']] if 'file' in kwargs else [])]:
+            file.reset()  # Rewind in case a rate-limited attempt already read it
+        return channel.send(**kwargs)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize(),
+            "entries": self.entries_written,
+            "messages": self.messages_sent,
+            "digest_pending": len(self.digest_rows),
+        }
+
+class LogWriterRegistry:
+    """Lazily created writers, one per log channel"""
+
+    def __init__(self):
+        self.writers: Dict[int, LogWriter] = {}
+
+    def writer(self, bot, channel_id: int) -> LogWriter:
+        writer = self.writers.get(channel_id)
+        if writer is None:
+            writer = self.writers[channel_id] = LogWriter(bot, channel_id)
+        return writer
+
+    async def write(self, bot, channel_id: int, entry: LogEntry):
+        await self.writer(bot, channel_id).write(entry)
+
+# Global instance
+log_writers = LogWriterRegistry()
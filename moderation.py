@@ -1,91 +1,45 @@
 import discord
 import asyncio
+import logging
 from discord import app_commands
-from config import ALLOWED_ROLES, TICKETBLACKLIST_ROLE_NAME
+from config import TICKETBLACKLIST_ROLE_NAME
+from role_index import role_index
+from moderation_pipeline import moderation_pipeline, ModerationContext
+from evidence_collector import EvidenceBundle, EvidenceSession
+from rest_scheduler import rest_scheduler
+from deletion_scheduler import deletion_scheduler
+from dm_outbox import dm_outbox
+from evidence_images import evidence_images
+from evidence import format_size
 from utils import (
-    has_permission, has_evidence, safe_send_message, log_action,
-    notify_user_dm, ensure_evidence_provided, ask_yes_no_question,
+    has_permission, has_evidence, safe_send_message, send_followup,
+    ensure_evidence_provided, ask_yes_no_question,
     wait_for_user_response, delete_message_after_delay, parse_duration, parse_moderation_command
 )
 
+logger = logging.getLogger(__name__)
+
 async def collect_additional_evidence(bot, interaction, initial_evidence):
     """Helper function to collect additional evidence after a slash command"""
-    evidence_attachments = [initial_evidence] if initial_evidence else []
-    evidence_messages_to_delete = []  # Track messages with evidence to delete later
-    
     if not initial_evidence:
-        return evidence_attachments, evidence_messages_to_delete
-    
-    # Ask if they want to add more evidence
-    await interaction.followup.send(
-        f"📎 Evidence received: `{initial_evidence.filename}`\n\n"
-        "**Do you want to add more evidence?**\n"
-        "• Send additional images/files in this channel within the next 30 seconds\n"
-        "• Type `done` when finished\n"
-        "• Type `proceed` to continue with just the current evidence",
-        ephemeral=True
-    )
-    
-    # Wait for additional evidence
-    additional_evidence = []
-    timeout_time = 30  # 30 seconds to add more evidence
-    start_time = asyncio.get_event_loop().time()
-    
-    def check_additional_evidence(msg):
-        return (msg.author == interaction.user and 
-                msg.channel == interaction.channel and
-                msg.created_at.timestamp() > start_time)
-    
-    while (asyncio.get_event_loop().time() - start_time) < timeout_time:
-        try:
-            additional_msg = await bot.wait_for('message', check=check_additional_evidence, timeout=5.0)
-            
-            if additional_msg.content.lower() in ['done', 'proceed', 'continue']:
-                await additional_msg.delete()  # Clean up the command message immediately
-                break
-            elif additional_msg.attachments:
-                additional_evidence.extend(additional_msg.attachments)
-                evidence_messages_to_delete.append(additional_msg)  # Mark for deletion later
-                await additional_msg.add_reaction('✅')  # Confirm we got the evidence
-                await interaction.followup.send(
-                    f"✅ Added {len(additional_msg.attachments)} more evidence file(s). "
-                    f"Total: {len(evidence_attachments) + len(additional_evidence)} files.\n"
-                    "Send more or type `done` to proceed.",
-                    ephemeral=True
-                )
-            
-        except asyncio.TimeoutError:
-            continue  # Keep checking until the total timeout
-    
-    # Combine all evidence
-    evidence_attachments.extend(additional_evidence)
-    
-    if additional_evidence:
-        await interaction.followup.send(
-            f"📎 **Final evidence count:** {len(evidence_attachments)} files collected.",
-            ephemeral=True
-        )
-    
-    return evidence_attachments, evidence_messages_to_delete
+        return EvidenceBundle()
+    return await EvidenceSession(bot, interaction, initial_evidence).collect()
 
 async def cleanup_evidence_messages(evidence_messages_to_delete, delay=3):
     """Clean up evidence messages after successful logging"""
     if not evidence_messages_to_delete:
         return
     
-    print(f"🧹 Cleaning up {len(evidence_messages_to_delete)} evidence messages in {delay} seconds...")
-    await asyncio.sleep(delay)  # Short delay to ensure logging is complete
-    
+    logger.info(f"🧹 Cleaning up {len(evidence_messages_to_delete)} evidence messages in {delay} seconds...")
     for msg in evidence_messages_to_delete:
-        try:
-            await msg.delete()
-            print(f"🗑️ Deleted evidence message: {msg.id}")
-        except discord.NotFound:
-            print(f"⚠️ Evidence message {msg.id} was already deleted")
-        except discord.Forbidden:
-            print(f"❌ No permission to delete evidence message: {msg.id}")
-        except Exception as e:
-            print(f"❌ Error deleting evidence message {msg.id}: {e}")
+        # Short delay to ensure logging is complete; messages in one channel go in one bulk delete
+        deletion_scheduler.schedule(msg, delay)
+
+def evidence_to_clean_up(command_message, evidence_message):
+    """Separate evidence messages to delete once logged (never the original command message)"""
+    if evidence_message != command_message and evidence_message.attachments:
+        return [evidence_message]
+    return []
 
 async def setup_moderation_commands(bot):
     """Setup slash commands for moderation"""
@@ -108,62 +62,30 @@ async def setup_moderation_commands(bot):
         await interaction.response.defer(ephemeral=True)
         
         # Check permissions
-        if not has_permission(interaction.user, ALLOWED_ROLES):
-            await interaction.followup.send("❌ You don't have permission to use this command.", ephemeral=True)
+        if not has_permission(interaction.user):
+            await send_followup(interaction, "❌ You don't have permission to use this command.", ephemeral=True)
             return
         
         # Handle evidence - collect initial and additional evidence
-        evidence_attachments, evidence_messages_to_delete = await collect_additional_evidence(bot, interaction, evidence)
+        collected = await collect_additional_evidence(bot, interaction, evidence)
         
-        if not evidence_attachments:
-            await interaction.followup.send("❌ Please provide evidence (image or attachment) for the ban.", ephemeral=True)
+        if not collected.attachments:
+            await send_followup(interaction, "❌ Please provide evidence (image or attachment) for the ban.", ephemeral=True)
             return
         
-        # Create a mock message object with all evidence
-        evidence_msg = type('MockMessage', (), {
-            'attachments': evidence_attachments,
-            'content': f"/ban {user.mention} {reason}",
-            'author': interaction.user,
-            'channel': interaction.channel,
-            'mentions': [user],  # Add the target user to mentions
-            'jump_url': f"https://discord.com/channels/{interaction.guild.id}/{interaction.channel.id}/slash_command"
-        })()
-        
-        try:
-            # Log the action (use the evidence message for logging)
-            await log_action(bot, evidence_msg, "Banned", interaction.user, reason)
-            
-            # Send DM notification to user before banning
-            dm_sent = await notify_user_dm(
-                user, 
-                "Banned", 
-                interaction.guild.name, 
-                interaction.user, 
-                reason=reason
-            )
-            
-            # Perform the ban
-            delete_message_days = 7 if delete_messages else 0
-            await interaction.guild.ban(
-                user, 
-                reason=f"Banned by {interaction.user}: {reason}",
-                delete_message_days=delete_message_days
-            )
-            
-            dm_status = " (DM sent)" if dm_sent else " (DM failed - user may have DMs disabled)"
-            delete_status = f" Messages from last 7 days deleted." if delete_messages else ""
-            await interaction.followup.send(f"✅ {user.mention} has been banned!{dm_status}{delete_status}")
-            
-            # Clean up evidence messages after successful ban and logging
-            await cleanup_evidence_messages(evidence_messages_to_delete)
-            
-        except discord.Forbidden:
-            await interaction.followup.send("❌ I don't have permission to ban this user.", ephemeral=True)
-        except discord.HTTPException as e:
-            await interaction.followup.send("❌ Failed to ban the user.", ephemeral=True)
-        except Exception as e:
-            print(f"Ban failed: Unexpected error - {e}")
-            await interaction.followup.send("❌ An unexpected error occurred during the ban.", ephemeral=True)
+        # Ban the user; logging and evidence cleanup continue in the background
+        await moderation_pipeline.execute(bot, ModerationContext(
+            action='ban',
+            target=user,
+            moderator=interaction.user,
+            guild=interaction.guild,
+            reason=reason,
+            origin=interaction,
+            evidence=collected.attachments,
+            content=collected.command_text(f"/ban {user.mention} {reason}"),
+            delete_message_days=7 if delete_messages else 0,
+            cleanup_messages=collected.messages_to_delete
+        ))
     
     @bot.tree.command(name="kick", description="Kick a user from the server")
     @app_commands.describe(
@@ -181,53 +103,29 @@ async def setup_moderation_commands(bot):
         await interaction.response.defer(ephemeral=True)
         
         # Check permissions
-        if not has_permission(interaction.user, ALLOWED_ROLES):
-            await interaction.followup.send("❌ You don't have permission to use this command.", ephemeral=True)
+        if not has_permission(interaction.user):
+            await send_followup(interaction, "❌ You don't have permission to use this command.", ephemeral=True)
             return
         
         # Handle evidence - collect initial and additional evidence
-        evidence_attachments, evidence_messages_to_delete = await collect_additional_evidence(bot, interaction, evidence)
+        collected = await collect_additional_evidence(bot, interaction, evidence)
         
-        if not evidence_attachments:
-            await interaction.followup.send("❌ Please provide evidence (image or attachment) for the kick.", ephemeral=True)
+        if not collected.attachments:
+            await send_followup(interaction, "❌ Please provide evidence (image or attachment) for the kick.", ephemeral=True)
             return
         
-        # Create a mock message object with all evidence
-        evidence_msg = type('MockMessage', (), {
-            'attachments': evidence_attachments,
-            'content': f"/kick {user.mention} {reason}",
-            'author': interaction.user,
-            'channel': interaction.channel,
-            'mentions': [user],  # Add the target user to mentions
-            'jump_url': f"https://discord.com/channels/{interaction.guild.id}/{interaction.channel.id}/slash_command"
-        })()
-        
-        try:
-            # Log the action
-            await log_action(bot, evidence_msg, "Kicked", interaction.user, reason)
-            
-            # Send DM notification to user before kicking
-            dm_sent = await notify_user_dm(
-                user, 
-                "Kicked", 
-                interaction.guild.name, 
-                interaction.user, 
-                reason=reason
-            )
-            
-            # Perform the kick
-            await interaction.guild.kick(user, reason=f"Kicked by {interaction.user}: {reason}")
-            
-            dm_status = " (DM sent)" if dm_sent else " (DM failed - user may have DMs disabled)"
-            await interaction.followup.send(f"✅ {user.mention} has been kicked!{dm_status}")
-            
-            # Clean up evidence messages after successful kick and logging
-            await cleanup_evidence_messages(evidence_messages_to_delete)
-            
-        except discord.Forbidden:
-            await interaction.followup.send("❌ I don't have permission to kick this user.", ephemeral=True)
-        except discord.HTTPException:
-            await interaction.followup.send("❌ Failed to kick the user.", ephemeral=True)
+        # Kick the user; logging and evidence cleanup continue in the background
+        await moderation_pipeline.execute(bot, ModerationContext(
+            action='kick',
+            target=user,
+            moderator=interaction.user,
+            guild=interaction.guild,
+            reason=reason,
+            origin=interaction,
+            evidence=collected.attachments,
+            content=collected.command_text(f"/kick {user.mention} {reason}"),
+            cleanup_messages=collected.messages_to_delete
+        ))
     
     @bot.tree.command(name="timeout", description="Timeout a user")
     @app_commands.describe(
@@ -247,60 +145,37 @@ async def setup_moderation_commands(bot):
         await interaction.response.defer(ephemeral=True)
         
         # Check permissions
-        if not has_permission(interaction.user, ALLOWED_ROLES):
-            await interaction.followup.send("❌ You don't have permission to use this command.", ephemeral=True)
+        if not has_permission(interaction.user):
+            await send_followup(interaction, "❌ You don't have permission to use this command.", ephemeral=True)
             return
         
         # Parse duration
         timeout_duration = parse_duration(duration)
         if timeout_duration == "invalid" or timeout_duration is None:
-            await interaction.followup.send("❌ Invalid duration format. Use 10m, 1h, 2d, or 1w", ephemeral=True)
+            await send_followup(interaction, "❌ Invalid duration format. Use 10m, 1h, 2d, or 1w", ephemeral=True)
             return
         
         # Handle evidence - collect initial and additional evidence
-        evidence_attachments, evidence_messages_to_delete = await collect_additional_evidence(bot, interaction, evidence)
+        collected = await collect_additional_evidence(bot, interaction, evidence)
         
-        if not evidence_attachments:
-            await interaction.followup.send("❌ Please provide evidence (image or attachment) for the timeout.", ephemeral=True)
+        if not collected.attachments:
+            await send_followup(interaction, "❌ Please provide evidence (image or attachment) for the timeout.", ephemeral=True)
             return
         
-        # Create a mock message object with all evidence
-        evidence_msg = type('MockMessage', (), {
-            'attachments': evidence_attachments,
-            'content': f"/timeout {user.mention} {duration} {reason}",
-            'author': interaction.user,
-            'channel': interaction.channel,
-            'mentions': [user],  # Add the target user to mentions
-            'jump_url': f"https://discord.com/channels/{interaction.guild.id}/{interaction.channel.id}/slash_command"
-        })()
-        
-        try:
-            # Log the action
-            await log_action(bot, evidence_msg, "Timed out", interaction.user, reason, duration)
-            
-            # Send DM notification to user before timeout
-            dm_sent = await notify_user_dm(
-                user, 
-                "Timed out", 
-                interaction.guild.name, 
-                interaction.user, 
-                reason=reason,
-                duration=duration
-            )
-            
-            # Perform the timeout
-            await user.timeout(timeout_duration, reason=f"Timed out by {interaction.user}: {reason}")
-            
-            dm_status = " (DM sent)" if dm_sent else " (DM failed - user may have DMs disabled)"
-            await interaction.followup.send(f"✅ {user.mention} has been timed out for {duration}!{dm_status}")
-            
-            # Clean up evidence messages after successful timeout and logging
-            await cleanup_evidence_messages(evidence_messages_to_delete)
-            
-        except discord.Forbidden:
-            await interaction.followup.send("❌ I don't have permission to timeout this user.", ephemeral=True)
-        except discord.HTTPException:
-            await interaction.followup.send("❌ Failed to timeout the user.", ephemeral=True)
+        # Time out the user; logging and evidence cleanup continue in the background
+        await moderation_pipeline.execute(bot, ModerationContext(
+            action='timeout',
+            target=user,
+            moderator=interaction.user,
+            guild=interaction.guild,
+            reason=reason,
+            origin=interaction,
+            duration=duration,
+            timeout=timeout_duration,
+            evidence=collected.attachments,
+            content=collected.command_text(f"/timeout {user.mention} {duration} {reason}"),
+            cleanup_messages=collected.messages_to_delete
+        ))
 
     @bot.tree.command(name="ticketblacklist", description="Add ticket blacklist role to a user")
     @app_commands.describe(
@@ -318,64 +193,41 @@ async def setup_moderation_commands(bot):
         await interaction.response.defer(ephemeral=True)
         
         # Check permissions
-        if not has_permission(interaction.user, ALLOWED_ROLES):
-            await interaction.followup.send("❌ You don't have permission to use this command.", ephemeral=True)
+        if not has_permission(interaction.user):
+            await send_followup(interaction, "❌ You don't have permission to use this command.", ephemeral=True)
             return
         
         # Handle evidence - collect initial and additional evidence
-        evidence_attachments, evidence_messages_to_delete = await collect_additional_evidence(bot, interaction, evidence)
+        collected = await collect_additional_evidence(bot, interaction, evidence)
         
-        if not evidence_attachments:
-            await interaction.followup.send("❌ Please provide evidence (image or attachment) for the ticket blacklist.", ephemeral=True)
+        if not collected.attachments:
+            await send_followup(interaction, "❌ Please provide evidence (image or attachment) for the ticket blacklist.", ephemeral=True)
             return
         
         # Find the ticket blacklist role
-        ticketblacklist_role = discord.utils.get(interaction.guild.roles, name=TICKETBLACKLIST_ROLE_NAME)
+        ticketblacklist_role = role_index.get_role(interaction.guild, TICKETBLACKLIST_ROLE_NAME)
         if not ticketblacklist_role:
-            await interaction.followup.send(f"❌ Ticket blacklist role '{TICKETBLACKLIST_ROLE_NAME}' not found. Please create this role first.", ephemeral=True)
+            await send_followup(interaction, f"❌ Ticket blacklist role '{TICKETBLACKLIST_ROLE_NAME}' not found. Please create this role first.", ephemeral=True)
             return
         
         # Check if user already has the role
         if ticketblacklist_role in user.roles:
-            await interaction.followup.send(f"⚠️ {user.mention} is already ticket blacklisted.", ephemeral=True)
+            await send_followup(interaction, f"⚠️ {user.mention} is already ticket blacklisted.", ephemeral=True)
             return
         
-        # Create a mock message object with all evidence
-        evidence_msg = type('MockMessage', (), {
-            'attachments': evidence_attachments,
-            'content': f"/ticketblacklist {user.mention} {reason}",
-            'author': interaction.user,
-            'channel': interaction.channel,
-            'mentions': [user],  # Add the target user to mentions
-            'jump_url': f"https://discord.com/channels/{interaction.guild.id}/{interaction.channel.id}/slash_command"
-        })()
-        
-        try:
-            # Log the action
-            await log_action(bot, evidence_msg, "Ticket Blacklisted", interaction.user, reason)
-            
-            # Send DM notification to user before adding role
-            dm_sent = await notify_user_dm(
-                user, 
-                "Ticket Blacklisted", 
-                interaction.guild.name, 
-                interaction.user, 
-                reason=reason
-            )
-            
-            # Add the ticket blacklist role
-            await user.add_roles(ticketblacklist_role, reason=f"Ticket blacklisted by {interaction.user}: {reason}")
-            
-            dm_status = " (DM sent)" if dm_sent else " (DM failed - user may have DMs disabled)"
-            await interaction.followup.send(f"✅ {user.mention} has been added to the ticket blacklist!{dm_status}")
-            
-            # Clean up evidence messages after successful action and logging
-            await cleanup_evidence_messages(evidence_messages_to_delete)
-            
-        except discord.Forbidden:
-            await interaction.followup.send("❌ I don't have permission to manage roles for this user.", ephemeral=True)
-        except discord.HTTPException:
-            await interaction.followup.send("❌ Failed to add the ticket blacklist role.", ephemeral=True)
+        # Add the role; logging and evidence cleanup continue in the background
+        await moderation_pipeline.execute(bot, ModerationContext(
+            action='ticketblacklist',
+            target=user,
+            moderator=interaction.user,
+            guild=interaction.guild,
+            reason=reason,
+            origin=interaction,
+            role=ticketblacklist_role,
+            evidence=collected.attachments,
+            content=collected.command_text(f"/ticketblacklist {user.mention} {reason}"),
+            cleanup_messages=collected.messages_to_delete
+        ))
 
     @bot.tree.command(name="unban", description="Unban a user from the server")
     @app_commands.describe(
@@ -391,17 +243,21 @@ async def setup_moderation_commands(bot):
 
         try:
             user_obj = await bot.fetch_user(int(user_id))
-            await interaction.guild.unban(user_obj, reason=reason)
-            
-            await log_action(interaction.guild, interaction.user, user_obj, "Unban", reason)
-            await interaction.followup.send(f"✅ **{user_obj.name}** has been unbanned.\nReason: {reason}")
-            
         except ValueError:
-             await interaction.followup.send("❌ Invalid User ID provided.", ephemeral=True)
+            await send_followup(interaction, "❌ Invalid User ID provided.", ephemeral=True)
+            return
         except discord.NotFound:
-            await interaction.followup.send("❌ User not found or not banned.", ephemeral=True)
-        except Exception as e:
-            await interaction.followup.send(f"❌ Failed to unban user: {e}", ephemeral=True)
+            await send_followup(interaction, "❌ User not found or not banned.", ephemeral=True)
+            return
+        
+        await moderation_pipeline.execute(bot, ModerationContext(
+            action='unban',
+            target=user_obj,
+            moderator=interaction.user,
+            guild=interaction.guild,
+            reason=reason,
+            origin=interaction
+        ))
 
     @bot.tree.command(name="untimeout", description="Remove timeout from a user")
     @app_commands.describe(
@@ -415,21 +271,18 @@ async def setup_moderation_commands(bot):
 
         await interaction.response.defer()
 
-        try:
-            if not user.is_timed_out():
-                await interaction.followup.send(f"⚠️ **{user.name}** is not currently timed out.", ephemeral=True)
-                return
-
-            await user.timeout(None, reason=reason)
-            
-            # Notify user
-            await notify_user_dm(user, "Timeout Removed", interaction.guild.name, interaction.user, reason)
-            
-            await log_action(interaction.guild, interaction.user, user, "Untimeout", reason)
-            await interaction.followup.send(f"✅ **{user.name}**'s timeout has been removed.\nReason: {reason}")
-            
-        except Exception as e:
-            await interaction.followup.send(f"❌ Failed to remove timeout: {e}", ephemeral=True)
+        if not user.is_timed_out():
+            await send_followup(interaction, f"⚠️ **{user.name}** is not currently timed out.", ephemeral=True)
+            return
+        
+        await moderation_pipeline.execute(bot, ModerationContext(
+            action='untimeout',
+            target=user,
+            moderator=interaction.user,
+            guild=interaction.guild,
+            reason=reason,
+            origin=interaction
+        ))
 
 
 # Keep existing message-based commands for backward compatibility
@@ -439,7 +292,7 @@ async def handle_ban_command(client, message):
     Single-line format: !ban @user yes/no reason
     Interactive format: !ban (then follow prompts)
     """
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         return
     
     # Try to parse arguments from the original message
@@ -451,14 +304,14 @@ async def handle_ban_command(client, message):
         
         # Find the user from the mention
         if not message.mentions:
-            await message.channel.send("❌ Please mention a valid user to ban.")
+            await safe_send_message(message.channel, "❌ Please mention a valid user to ban.")
             return
         
         user_to_ban = message.mentions[0]
         
         # Check if the original message has evidence
         if not has_evidence(message):
-            await message.channel.send("❌ Please provide a link or image as evidence in your ban command.")
+            await safe_send_message(message.channel, "❌ Please provide a link or image as evidence in your ban command.")
             return
         
         evidence_message = message
@@ -466,13 +319,13 @@ async def handle_ban_command(client, message):
         
     else:
         # Interactive format
-        await message.channel.send("Who do you want to ban? Please mention them and attach evidence.")
+        await safe_send_message(message.channel, "Who do you want to ban? Please mention them and attach evidence.")
         
         try:
             next_message = await wait_for_user_response(client, message)
             
             if not next_message.mentions:
-                await message.channel.send("❌ Please mention a valid user to ban.")
+                await safe_send_message(message.channel, "❌ Please mention a valid user to ban.")
                 return
             
             user_to_ban = next_message.mentions[0]
@@ -483,7 +336,7 @@ async def handle_ban_command(client, message):
                 return  # Command was cancelled due to lack of evidence
             
             # Ask for reason
-            await message.channel.send("Please provide a reason for the ban:")
+            await safe_send_message(message.channel, "Please provide a reason for the ban:")
             
             reason_message = await wait_for_user_response(client, message)
             ban_reason = reason_message.content.strip()
@@ -495,44 +348,23 @@ async def handle_ban_command(client, message):
             delete_message_days = 7 if delete_messages else 0
             
         except asyncio.TimeoutError:
-            await message.channel.send("You took too long to respond!")
+            await safe_send_message(message.channel, "You took too long to respond!")
             return
     
-    # Common ban logic for both formats
-    try:
-        # Log the action (use the evidence message for logging)
-        await log_action(client, evidence_message, "Banned", message.author, ban_reason)
-        
-        # Send DM notification to user before banning
-        dm_sent = await notify_user_dm(
-            user_to_ban, 
-            "Banned", 
-            message.guild.name, 
-            message.author, 
-            reason=ban_reason
-        )
-        
-        # Perform the ban
-        await message.guild.ban(
-            user_to_ban, 
-            reason=f"Banned by {message.author}: {ban_reason}",
-            delete_message_days=delete_message_days
-        )
-        dm_status = " (DM sent)" if dm_sent else " (DM failed - user may have DMs disabled)"
-        delete_status = f" Messages from last 7 days deleted." if delete_messages else ""
-        await message.channel.send(f"✅ {user_to_ban.mention} has been banned!{dm_status}{delete_status}")
-        
-        # Clean up evidence message after successful ban and logging (but not the original command message)
-        if evidence_message != message and evidence_message.attachments:
-            await cleanup_evidence_messages([evidence_message], delay=5)
-            
-    except discord.Forbidden:
-        await message.channel.send("❌ I don't have permission to ban this user.")
-    except discord.HTTPException:
-        await message.channel.send("❌ Failed to ban the user.")
-
-
-
+    # Common ban logic for both formats; logging and evidence cleanup continue in the background
+    await moderation_pipeline.execute(client, ModerationContext(
+        action='ban',
+        target=user_to_ban,
+        moderator=message.author,
+        guild=message.guild,
+        reason=ban_reason,
+        origin=message,
+        evidence=list(evidence_message.attachments),
+        content=evidence_message.content,
+        delete_message_days=delete_message_days,
+        cleanup_messages=evidence_to_clean_up(message, evidence_message),
+        cleanup_delay=5
+    ))
 
 
 async def handle_kick_command(client, message):
@@ -541,7 +373,7 @@ async def handle_kick_command(client, message):
     Single-line format: !kick @user reason
     Interactive format: !kick (then follow prompts)
     """
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         return
     
     # Try to parse arguments from the original message
@@ -553,27 +385,27 @@ async def handle_kick_command(client, message):
         
         # Find the user from the mention
         if not message.mentions:
-            await message.channel.send("❌ Please mention a valid user to kick.")
+            await safe_send_message(message.channel, "❌ Please mention a valid user to kick.")
             return
         
         user_to_kick = message.mentions[0]
         
         # Check if the original message has evidence
         if not has_evidence(message):
-            await message.channel.send("❌ Please provide a link or image as evidence in your kick command.")
+            await safe_send_message(message.channel, "❌ Please provide a link or image as evidence in your kick command.")
             return
         
         evidence_message = message
         
     else:
         # Interactive format
-        await message.channel.send("Who do you want to kick? Please mention them and attach evidence.")
+        await safe_send_message(message.channel, "Who do you want to kick? Please mention them and attach evidence.")
         
         try:
             next_message = await wait_for_user_response(client, message)
             
             if not next_message.mentions:
-                await message.channel.send("❌ Please mention a valid user to kick.")
+                await safe_send_message(message.channel, "❌ Please mention a valid user to kick.")
                 return
             
             user_to_kick = next_message.mentions[0]
@@ -584,45 +416,28 @@ async def handle_kick_command(client, message):
                 return  # Command was cancelled due to lack of evidence
             
             # Ask for reason
-            await message.channel.send("Please provide a reason for the kick:")
+            await safe_send_message(message.channel, "Please provide a reason for the kick:")
             
             reason_message = await wait_for_user_response(client, message)
             kick_reason = reason_message.content.strip()
             
         except asyncio.TimeoutError:
-            await message.channel.send("You took too long to respond!")
+            await safe_send_message(message.channel, "You took too long to respond!")
             return
     
-    # Common kick logic for both formats
-    try:
-        # Log the action (use the evidence message for logging)
-        await log_action(client, evidence_message, "Kicked", message.author, kick_reason)
-        
-        # Send DM notification to user before kicking
-        dm_sent = await notify_user_dm(
-            user_to_kick, 
-            "Kicked", 
-            message.guild.name, 
-            message.author, 
-            reason=kick_reason
-        )
-        
-        # Perform the kick
-        await message.guild.kick(user_to_kick, reason=f"Kicked by {message.author}: {kick_reason}")
-        dm_status = " (DM sent)" if dm_sent else " (DM failed - user may have DMs disabled)"
-        await message.channel.send(f"✅ {user_to_kick.mention} has been kicked!{dm_status}")
-        
-        # Clean up evidence message after successful kick and logging (but not the original command message)
-        if evidence_message != message and evidence_message.attachments:
-            await cleanup_evidence_messages([evidence_message], delay=5)
-            
-    except discord.Forbidden:
-        await message.channel.send("❌ I don't have permission to kick this user.")
-    except discord.HTTPException:
-        await message.channel.send("❌ Failed to kick the user.")
-
-
-
+    # Common kick logic for both formats; logging and evidence cleanup continue in the background
+    await moderation_pipeline.execute(client, ModerationContext(
+        action='kick',
+        target=user_to_kick,
+        moderator=message.author,
+        guild=message.guild,
+        reason=kick_reason,
+        origin=message,
+        evidence=list(evidence_message.attachments),
+        content=evidence_message.content,
+        cleanup_messages=evidence_to_clean_up(message, evidence_message),
+        cleanup_delay=5
+    ))
 
 
 async def handle_timeout_command(client, message):
@@ -631,7 +446,7 @@ async def handle_timeout_command(client, message):
     Single-line format: !timeout @user 1h reason
     Interactive format: !timeout (then follow prompts)
     """
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         return
     
     # Try to parse arguments from the original message
@@ -643,7 +458,7 @@ async def handle_timeout_command(client, message):
         
         # Find the user from the mention
         if not message.mentions:
-            await message.channel.send("❌ Please mention a valid user to timeout.")
+            await safe_send_message(message.channel, "❌ Please mention a valid user to timeout.")
             return
         
         user_to_timeout = message.mentions[0]
@@ -651,25 +466,25 @@ async def handle_timeout_command(client, message):
         # Parse duration
         timeout_duration = parse_duration(duration_text)
         if timeout_duration == "invalid" or timeout_duration is None:
-            await message.channel.send("❌ Invalid duration format. Use 10m, 1h, 2d, or 1w")
+            await safe_send_message(message.channel, "❌ Invalid duration format. Use 10m, 1h, 2d, or 1w")
             return
         
         # Check if the original message has evidence
         if not has_evidence(message):
-            await message.channel.send("❌ Please provide a link or image as evidence in your timeout command.")
+            await safe_send_message(message.channel, "❌ Please provide a link or image as evidence in your timeout command.")
             return
         
         evidence_message = message
         
     else:
         # Interactive format
-        await message.channel.send("Who do you want to timeout? Please mention them and attach evidence.")
+        await safe_send_message(message.channel, "Who do you want to timeout? Please mention them and attach evidence.")
         
         try:
             next_message = await wait_for_user_response(client, message)
             
             if not next_message.mentions:
-                await message.channel.send("❌ Please mention a valid user to timeout.")
+                await safe_send_message(message.channel, "❌ Please mention a valid user to timeout.")
                 return
             
             user_to_timeout = next_message.mentions[0]
@@ -680,54 +495,41 @@ async def handle_timeout_command(client, message):
                 return  # Command was cancelled due to lack of evidence
             
             # Ask for duration
-            await message.channel.send("How long should the timeout be? (e.g., 10m, 1h, 2d, 1w)")
+            await safe_send_message(message.channel, "How long should the timeout be? (e.g., 10m, 1h, 2d, 1w)")
             
             duration_message = await wait_for_user_response(client, message)
             timeout_duration = parse_duration(duration_message.content)
             duration_text = duration_message.content.lower().strip()
             
             if timeout_duration == "invalid" or timeout_duration is None:
-                await message.channel.send("❌ Invalid duration format. Use 10m, 1h, 2d, or 1w")
+                await safe_send_message(message.channel, "❌ Invalid duration format. Use 10m, 1h, 2d, or 1w")
                 return
             
             # Ask for reason
-            await message.channel.send("Please provide a reason for the timeout:")
+            await safe_send_message(message.channel, "Please provide a reason for the timeout:")
             
             reason_message = await wait_for_user_response(client, message)
             timeout_reason = reason_message.content.strip()
             
         except asyncio.TimeoutError:
-            await message.channel.send("You took too long to respond!")
+            await safe_send_message(message.channel, "You took too long to respond!")
             return
     
-    # Common timeout logic for both formats
-    try:
-        # Log the action (use the evidence message for logging)
-        await log_action(client, evidence_message, "Timed out", message.author, timeout_reason, duration_text)
-        
-        # Send DM notification to user before timeout
-        dm_sent = await notify_user_dm(
-            user_to_timeout, 
-            "Timed out", 
-            message.guild.name, 
-            message.author, 
-            reason=timeout_reason,
-            duration=duration_text
-        )
-        
-        # Perform the timeout
-        await user_to_timeout.timeout(timeout_duration, reason=f"Timed out by {message.author}: {timeout_reason}")
-        dm_status = " (DM sent)" if dm_sent else " (DM failed - user may have DMs disabled)"
-        await message.channel.send(f"✅ {user_to_timeout.mention} has been timed out for {duration_text}{dm_status}")
-        
-        # Clean up evidence message after successful timeout and logging (but not the original command message)
-        if evidence_message != message and evidence_message.attachments:
-            await cleanup_evidence_messages([evidence_message], delay=5)
-            
-    except discord.Forbidden:
-        await message.channel.send("❌ I don't have permission to timeout this user.")
-    except discord.HTTPException:
-        await message.channel.send("❌ Failed to timeout the user.")
+    # Common timeout logic for both formats; logging and evidence cleanup continue in the background
+    await moderation_pipeline.execute(client, ModerationContext(
+        action='timeout',
+        target=user_to_timeout,
+        moderator=message.author,
+        guild=message.guild,
+        reason=timeout_reason,
+        origin=message,
+        duration=duration_text,
+        timeout=timeout_duration,
+        evidence=list(evidence_message.attachments),
+        content=evidence_message.content,
+        cleanup_messages=evidence_to_clean_up(message, evidence_message),
+        cleanup_delay=5
+    ))
 
 
 async def handle_ticketblacklist_command(client, message):
@@ -736,7 +538,7 @@ async def handle_ticketblacklist_command(client, message):
     Single-line format: !ticketblacklist @user reason
     Interactive format: !ticketblacklist (then follow prompts)
     """
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         return
     
     # Try to parse arguments from the original message
@@ -748,27 +550,27 @@ async def handle_ticketblacklist_command(client, message):
         
         # Find the user from the mention
         if not message.mentions:
-            await message.channel.send("❌ Please mention a valid user to ticket blacklist.")
+            await safe_send_message(message.channel, "❌ Please mention a valid user to ticket blacklist.")
             return
         
         user_to_blacklist = message.mentions[0]
         
         # Check if the original message has evidence
         if not has_evidence(message):
-            await message.channel.send("❌ Please provide a link or image as evidence in your ticket blacklist command.")
+            await safe_send_message(message.channel, "❌ Please provide a link or image as evidence in your ticket blacklist command.")
             return
         
         evidence_message = message
         
     else:
         # Interactive format
-        await message.channel.send("Who do you want to add to the ticket blacklist? Please mention them and attach evidence.")
+        await safe_send_message(message.channel, "Who do you want to add to the ticket blacklist? Please mention them and attach evidence.")
         
         try:
             next_message = await wait_for_user_response(client, message)
             
             if not next_message.mentions:
-                await message.channel.send("❌ Please mention a valid user to ticket blacklist.")
+                await safe_send_message(message.channel, "❌ Please mention a valid user to ticket blacklist.")
                 return
             
             user_to_blacklist = next_message.mentions[0]
@@ -779,50 +581,93 @@ async def handle_ticketblacklist_command(client, message):
                 return  # Command was cancelled due to lack of evidence
             
             # Ask for reason
-            await message.channel.send("Please provide a reason for the ticket blacklist:")
+            await safe_send_message(message.channel, "Please provide a reason for the ticket blacklist:")
             
             reason_message = await wait_for_user_response(client, message)
             blacklist_reason = reason_message.content.strip()
             
         except asyncio.TimeoutError:
-            await message.channel.send("You took too long to respond!")
+            await safe_send_message(message.channel, "You took too long to respond!")
             return
     
     # Find the ticket blacklist role
-    ticketblacklist_role = discord.utils.get(message.guild.roles, name=TICKETBLACKLIST_ROLE_NAME)
+    ticketblacklist_role = role_index.get_role(message.guild, TICKETBLACKLIST_ROLE_NAME)
     if not ticketblacklist_role:
-        await message.channel.send(f"❌ Ticket blacklist role '{TICKETBLACKLIST_ROLE_NAME}' not found. Please create this role first.")
+        await safe_send_message(message.channel, f"❌ Ticket blacklist role '{TICKETBLACKLIST_ROLE_NAME}' not found. Please create this role first.")
         return
     
     # Check if user already has the role
     if ticketblacklist_role in user_to_blacklist.roles:
-        await message.channel.send(f"⚠️ {user_to_blacklist.mention} is already ticket blacklisted.")
+        await safe_send_message(message.channel, f"⚠️ {user_to_blacklist.mention} is already ticket blacklisted.")
+        return
+    
+    # Common ticket blacklist logic for both formats; logging and evidence cleanup continue in the background
+    await moderation_pipeline.execute(client, ModerationContext(
+        action='ticketblacklist',
+        target=user_to_blacklist,
+        moderator=message.author,
+        guild=message.guild,
+        reason=blacklist_reason,
+        origin=message,
+        role=ticketblacklist_role,
+        evidence=list(evidence_message.attachments),
+        content=evidence_message.content,
+        cleanup_messages=evidence_to_clean_up(message, evidence_message),
+        cleanup_delay=5
+    ))
+
+
+async def handle_modstats_command(client, message):
+    """Handle the !modstats command: how quickly moderation actions take effect"""
+    if not has_permission(message.author):
         return
     
-    # Common ticket blacklist logic for both formats
-    try:
-        # Log the action (use the evidence message for logging)
-        await log_action(client, evidence_message, "Ticket Blacklisted", message.author, blacklist_reason)
-        
-        # Send DM notification to user before adding role
-        dm_sent = await notify_user_dm(
-            user_to_blacklist, 
-            "Ticket Blacklisted", 
-            message.guild.name, 
-            message.author, 
-            reason=blacklist_reason
+    embed = discord.Embed(
+        title="⏱️ Moderation Action Latency",
+        description="Time from the moderator submitting an action until it took effect",
+        color=0x0099ff
+    )
+    for action_type, (samples, median, worst) in sorted(moderation_pipeline.latency_summary().items()):
+        embed.add_field(
+            name=action_type,
+            value=f"Median: {median:.2f}s\nWorst: {worst:.2f}s\nSamples: {samples}",
+            inline=True
         )
-        
-        # Add the ticket blacklist role
-        await user_to_blacklist.add_roles(ticketblacklist_role, reason=f"Ticket blacklisted by {message.author}: {blacklist_reason}")
-        dm_status = " (DM sent)" if dm_sent else " (DM failed - user may have DMs disabled)"
-        await message.channel.send(f"✅ {user_to_blacklist.mention} has been added to the ticket blacklist!{dm_status}")
-        
-        # Clean up evidence message after successful action and logging (but not the original command message)
-        if evidence_message != message and evidence_message.attachments:
-            await cleanup_evidence_messages([evidence_message], delay=5)
-            
-    except discord.Forbidden:
-        await message.channel.send("❌ I don't have permission to manage roles for this user.")
-    except discord.HTTPException:
-        await message.channel.send("❌ Failed to add the ticket blacklist role.")
+    if not embed.fields:
+        embed.add_field(name="No data", value="No moderation actions since the bot started.", inline=False)
+    
+    waits = rest_scheduler.wait_summary()
+    if waits:
+        embed.add_field(
+            name="📬 REST Queue Wait",
+            value="\n".join(f"{priority}: median {median:.2f}s, worst {worst:.2f}s ({samples})"
+                            for priority, (samples, median, worst) in waits.items()),
+            inline=False
+        )
+    
+    dms = dm_outbox.metrics()
+    dm_latency = dm_outbox.latency_summary()
+    embed.add_field(
+        name="✉️ DMs",
+        value=f"Sent: {dms['sent']} • Failed: {dms['failed']} • Duplicates skipped: {dms['deduped']}\n"
+              f"Closed-DM cache: {dms['closed_hits']} hits / {dms['closed_misses']} misses ({dms['closed_cached']} users)\n"
+              f"DM channel cache: {dms['channel_hits']} hits / {dms['channel_misses']} misses"
+              + (f"\nLatency: median {dm_latency[1]:.2f}s, worst {dm_latency[2]:.2f}s" if dm_latency else ""),
+        inline=False
+    )
+    
+    images = evidence_images.metrics()
+    if evidence_images.enabled or images['files']:
+        embed.add_field(
+            name="🖼️ Evidence Compression",
+            value=f"Compressed: {images['files']} • Failed: {images['failed']} • CPU: {images['cpu_seconds']:.1f}s\n"
+                  f"Saved {format_size(images['bytes_saved'])} of {format_size(images['bytes_in'])}",
+            inline=False
+        )
+    
+    metrics = moderation_pipeline.metrics()
+    rest = rest_scheduler.metrics()
+    embed.set_footer(text=f"{metrics['completed']} completed • {metrics['failed']} failed • "
+                          f"{metrics['logging_in_background']} still logging • "
+                          f"{rest['pending']} REST calls pending, {rest['rate_limited']} rate limited")
+    await safe_send_message(message.channel, embed=embed)
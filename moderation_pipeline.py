@@ -0,0 +1,252 @@
+"""
+Moderation Action Pipeline for Discord Bot
+One execution path for every moderation action: DM first, enforce right away, log in the background
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+import discord
+from config import DM_ENFORCE_WAIT
+from utils import log_action, notify_user_dm, safe_send_message, send_followup
+from rest_scheduler import rest_scheduler, Priority, Route, ban_route, member_route, member_role_route
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 200  # Recent actions kept per action type
+
+@dataclass(slots=True)
+class ModerationContext:
+    """Everything about one moderation action, whichever command it came from
+
+    `origin` is the Interaction or Message the moderator used; replies go
+    back through it. The context also stands in for the command message
+    when logging: log_action reads `mentions`, `attachments` and `content`.
+    The action counts as submitted when the context is created, i.e. once
+    the moderator has finished giving the details. Time spent answering
+    prompts or collecting evidence is therefore not part of the measured
+    latency, which covers the DM and the enforcement call.
+    """
+    action: str  # Key into ACTIONS
+    target: object
+    moderator: object
+    guild: object
+    reason: str
+    origin: object
+    duration: Optional[str] = None
+    evidence: List = field(default_factory=list)
+    content: str = ""  # Command text; links in it are logged as evidence
+    timeout: Optional[datetime] = None  # When a timeout ends, as returned by parse_duration
+    delete_message_days: int = 0
+    role: object = None
+    cleanup_messages: List = field(default_factory=list)
+    cleanup_delay: int = 3
+    submitted_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def mentions(self) -> List:
+        return [self.target]
+
+    @property
+    def attachments(self) -> List:
+        return self.evidence
+
+    @property
+    def from_slash(self) -> bool:
+        return isinstance(self.origin, discord.Interaction)
+
+    async def reply(self, text: str, error: bool = False):
+        if self.from_slash:
+            await send_followup(self.origin, text, ephemeral=error)
+        else:
+            await safe_send_message(self.origin.channel, text)
+
+@dataclass(frozen=True)
+class ActionSpec:
+    """How one kind of action is carried out and reported"""
+    log_label: str
+    enforce: Callable[[ModerationContext], Awaitable]
+    route: Callable[[ModerationContext], Route]  # Endpoint enforce() calls, for rate limit bucketing
+    confirm: Callable[[ModerationContext, Optional[bool]], str]
+    failed: str  # May use {error}
+    forbidden: Optional[str] = None
+    not_found: Optional[str] = None
+    dm_label: Optional[str] = None  # DM the user first, unless None
+
+DM_PENDING = "pending"  # The DM was still waiting for its turn when the action was enforced
+DMStatus = Union[bool, str, None]
+
+def dm_status(dm_sent: DMStatus) -> str:
+    if dm_sent is None:
+        return ""
+    if dm_sent == DM_PENDING:
+        return " (DM queued)"
+    return " (DM sent)" if dm_sent else " (DM failed - user may have DMs disabled)"
+
+ACTIONS: Dict[str, ActionSpec] = {
+    'ban': ActionSpec(
+        log_label="Banned",
+        dm_label="Banned",
+        enforce=lambda ctx: ctx.guild.ban(
+            ctx.target,
+            reason=f"Banned by {ctx.moderator}: {ctx.reason}",
+            delete_message_days=ctx.delete_message_days
+        ),
+        route=lambda ctx: ban_route(ctx.guild, 'PUT'),
+        confirm=lambda ctx, dm: f"✅ {ctx.target.mention} has been banned!{dm_status(dm)}"
+                                f"{' Messages from last 7 days deleted.' if ctx.delete_message_days else ''}",
+        forbidden="❌ I don't have permission to ban this user.",
+        failed="❌ Failed to ban the user."
+    ),
+    'kick': ActionSpec(
+        log_label="Kicked",
+        dm_label="Kicked",
+        enforce=lambda ctx: ctx.guild.kick(ctx.target, reason=f"Kicked by {ctx.moderator}: {ctx.reason}"),
+        route=lambda ctx: member_route(ctx.guild, 'DELETE'),
+        confirm=lambda ctx, dm: f"✅ {ctx.target.mention} has been kicked!{dm_status(dm)}",
+        forbidden="❌ I don't have permission to kick this user.",
+        failed="❌ Failed to kick the user."
+    ),
+    'timeout': ActionSpec(
+        log_label="Timed out",
+        dm_label="Timed out",
+        enforce=lambda ctx: ctx.target.timeout(ctx.timeout, reason=f"Timed out by {ctx.moderator}: {ctx.reason}"),
+        route=lambda ctx: member_route(ctx.guild),
+        confirm=lambda ctx, dm: f"✅ {ctx.target.mention} has been timed out for {ctx.duration}!{dm_status(dm)}",
+        forbidden="❌ I don't have permission to timeout this user.",
+        failed="❌ Failed to timeout the user."
+    ),
+    'ticketblacklist': ActionSpec(
+        log_label="Ticket Blacklisted",
+        dm_label="Ticket Blacklisted",
+        enforce=lambda ctx: ctx.target.add_roles(ctx.role, reason=f"Ticket blacklisted by {ctx.moderator}: {ctx.reason}"),
+        route=lambda ctx: member_role_route(ctx.guild, 'PUT'),
+        confirm=lambda ctx, dm: f"✅ {ctx.target.mention} has been added to the ticket blacklist!{dm_status(dm)}",
+        forbidden="❌ I don't have permission to manage roles for this user.",
+        failed="❌ Failed to add the ticket blacklist role."
+    ),
+    'unban': ActionSpec(
+        log_label="Unban",
+        enforce=lambda ctx: ctx.guild.unban(ctx.target, reason=ctx.reason),
+        route=lambda ctx: ban_route(ctx.guild, 'DELETE'),
+        confirm=lambda ctx, dm: f"✅ **{ctx.target.name}** has been unbanned.\nReason: {ctx.reason}",
+        not_found="❌ User not found or not banned.",
+        failed="❌ Failed to unban user: {error}"
+    ),
+    'untimeout': ActionSpec(
+        log_label="Untimeout",
+        dm_label="Timeout Removed",
+        enforce=lambda ctx: ctx.target.timeout(None, reason=ctx.reason),
+        route=lambda ctx: member_route(ctx.guild),
+        confirm=lambda ctx, dm: f"✅ **{ctx.target.name}**'s timeout has been removed.\nReason: {ctx.reason}",
+        failed="❌ Failed to remove timeout: {error}"
+    ),
+}
+
+@dataclass
+class ActionResult:
+    dm_sent: DMStatus
+    latency: float  # Seconds from submission until the enforcement call returned
+
+class ModerationPipeline:
+    """Runs moderation actions in the order that matters to the user
+
+    The DM goes first, while the user can still receive it, then the
+    enforcement call, then the confirmation to the moderator. Enforcement
+    waits at most DM_ENFORCE_WAIT seconds for the DM; during a burst of
+    actions the paced DM outbox falls behind, and the DM then finishes in
+    the background. Logging, evidence re-upload and evidence cleanup
+    continue as a background task. Submit-to-enforced latency is kept per
+    action type.
+    """
+
+    def __init__(self):
+        self.background: Set[asyncio.Task] = set()
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.completed = 0
+        self.failed = 0
+
+    async def execute(self, client, ctx: ModerationContext) -> Optional[ActionResult]:
+        """Carry out an action and report back to the moderator; None if it failed"""
+        spec = ACTIONS[ctx.action]
+        dm_sent = None
+        if spec.dm_label:
+            dm = asyncio.ensure_future(notify_user_dm(
+                ctx.target,
+                spec.dm_label,
+                ctx.guild.name,
+                ctx.moderator,
+                reason=ctx.reason,
+                duration=ctx.duration
+            ))
+            try:
+                dm_sent = await asyncio.wait_for(asyncio.shield(dm), DM_ENFORCE_WAIT)
+            except asyncio.TimeoutError:
+                dm_sent = DM_PENDING
+                self._keep(dm)
+
+        try:
+            await rest_scheduler.call(Priority.ENFORCE, spec.route(ctx), lambda: spec.enforce(ctx))
+        except Exception as e:
+            self.failed += 1
+            await ctx.reply(self._failure_message(spec, e), error=True)
+            return None
+
+        latency = time.monotonic() - ctx.submitted_at
+        self.completed += 1
+        self.latencies.setdefault(spec.log_label, deque(maxlen=LATENCY_SAMPLES)).append(latency)
+        logger.info(f"⏱️ {spec.log_label} {ctx.target} {latency:.2f}s after submission ({'slash' if ctx.from_slash else 'prefix'})")
+
+        self._keep(asyncio.create_task(self._log_and_cleanup(client, ctx, spec)))
+
+        await ctx.reply(spec.confirm(ctx, dm_sent))
+        return ActionResult(dm_sent, latency)
+
+    def _keep(self, task: asyncio.Future):
+        """Hold a reference to a background task until it finishes"""
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    @staticmethod
+    def _failure_message(spec: ActionSpec, error: Exception) -> str:
+        if isinstance(error, discord.Forbidden) and spec.forbidden:
+            return spec.forbidden
+        if isinstance(error, discord.NotFound) and spec.not_found:
+            return spec.not_found
+        if not isinstance(error, discord.HTTPException):
+            logger.error(f"{spec.log_label} failed: Unexpected error - {error}")
+        return spec.failed.format(error=error)
+
+    async def _log_and_cleanup(self, client, ctx: ModerationContext, spec: ActionSpec):
+        try:
+            await log_action(client, ctx, spec.log_label, ctx.moderator, ctx.reason, ctx.duration)
+        except Exception as e:
+            logger.error(f"Background logging failed for {spec.log_label} {ctx.target}: {e}")
+            return  # Keep the evidence messages if they weren't logged
+
+        if ctx.cleanup_messages:
+            # Imported here: moderation imports this module
+            from moderation import cleanup_evidence_messages
+            await cleanup_evidence_messages(ctx.cleanup_messages, delay=ctx.cleanup_delay)
+
+    def latency_summary(self) -> Dict[str, Tuple[int, float, float]]:
+        """(samples, median, worst) submit-to-enforced seconds per action type"""
+        summary = {}
+        for action_type, samples in self.latencies.items():
+            ordered = sorted(samples)
+            summary[action_type] = (len(ordered), ordered[len(ordered) // 2], ordered[-1])
+        return summary
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "logging_in_background": len(self.background),
+        }
+
+# Global instance
+moderation_pipeline = ModerationPipeline()
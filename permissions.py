@@ -0,0 +1,64 @@
+"""
+Permission Resolution for Discord Bot
+Caches which members hold one of the configured moderator roles
+"""
+
+import logging
+from typing import Dict, FrozenSet, Iterable, Tuple
+from config import ALLOWED_ROLES
+from role_index import role_index
+
+logger = logging.getLogger(__name__)
+
+class PermissionResolver:
+    """Memoizes moderator checks per member
+
+    ALLOWED_ROLES is resolved to a set of role IDs once per guild through the
+    role index. Decisions are cached per (guild, member) and tagged with the
+    index's version for the guild, so a role change in the guild or on the
+    member drops the stale answer.
+    """
+
+    def __init__(self, allowed_role_names: Iterable[str] = ALLOWED_ROLES):
+        self.allowed_role_names = tuple(allowed_role_names)
+        self.guild_role_ids: Dict[int, Tuple[int, FrozenSet[int]]] = {}
+        self.decisions: Dict[Tuple[int, int], Tuple[int, bool]] = {}
+
+    def allowed_role_ids(self, guild) -> FrozenSet[int]:
+        """Return the IDs of the guild's roles named in ALLOWED_ROLES"""
+        version = role_index.version(guild)
+        cached = self.guild_role_ids.get(guild.id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        role_ids = frozenset(
+            role_id
+            for name in self.allowed_role_names
+            for role_id in role_index.role_ids(guild, name)
+        )
+        self.guild_role_ids[guild.id] = (role_index.version(guild), role_ids)
+        return role_ids
+
+    def is_allowed(self, member) -> bool:
+        """Check if a guild member holds any of the allowed roles"""
+        guild = getattr(member, 'guild', None)
+        if guild is None:
+            return False  # Plain users (e.g. in DMs) have no roles
+
+        key = (guild.id, member.id)
+        role_ids = self.allowed_role_ids(guild)
+        version = role_index.version(guild)
+        cached = self.decisions.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        decision = any(member.get_role(role_id) is not None for role_id in role_ids)
+        self.decisions[key] = (version, decision)
+        return decision
+
+    def invalidate_member(self, member):
+        """Forget a member's cached decision after their roles change"""
+        self.decisions.pop((member.guild.id, member.id), None)
+
+# Global instance
+permission_resolver = PermissionResolver()
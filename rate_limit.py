@@ -0,0 +1,206 @@
+"""
+Rate Limiting for Discord Bot
+GCRA cooldowns per user, channel or guild for commands and buttons
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+from config import RATE_LIMIT_SNAPSHOT, RATE_LIMIT_MAX_KEYS
+from storage import data_path, load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ('user', 'channel', 'guild')
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Allow `rate` uses per `per` seconds, with up to `burst` back to back"""
+    rate: int
+    per: float
+    burst: int = 1
+    scope: str = 'user'
+
+    def __post_init__(self):
+        if self.scope not in SCOPES:
+            raise ValueError(f"Unknown rate limit scope '{self.scope}' (expected one of {', '.join(SCOPES)})")
+
+    @property
+    def interval(self) -> float:
+        """Seconds between uses at the sustained rate"""
+        return self.per / self.rate
+
+    @property
+    def tolerance(self) -> float:
+        return self.interval * self.burst
+
+    def key_for(self, source) -> Optional[int]:
+        """The ID this limit counts against for a message or interaction"""
+        if self.scope == 'user':
+            user = getattr(source, 'author', None) or getattr(source, 'user', None)
+            return user.id if user else None
+        if self.scope == 'channel':
+            return getattr(source, 'channel_id', None) or getattr(getattr(source, 'channel', None), 'id', None)
+        guild = getattr(source, 'guild', None)
+        return guild.id if guild else None
+
+class RateLimiter:
+    """Generic cell rate algorithm keyed by ID
+
+    Each key stores only its theoretical arrival time (TAT) on the monotonic
+    clock. A key whose TAT has passed is indistinguishable from a new one, so
+    keys are kept in least-recently-used order and expired ones are evicted
+    from the front a few at a time on every hit. max_keys caps memory even if
+    every key is still active.
+    """
+
+    def __init__(self, limit: RateLimit, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.limit = limit
+        self.max_keys = max_keys
+        self.interval = limit.interval
+        self.slack = limit.tolerance - limit.interval  # How far the TAT may run ahead of now
+        self.tats: 'OrderedDict[int, float]' = OrderedDict()
+        self.warned: 'OrderedDict[int, float]' = OrderedDict()  # Key -> end of the cooldown it was told about
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.tats)
+
+    def hit(self, key, now: Optional[float] = None) -> float:
+        """Record a use; return 0 if allowed, otherwise seconds until it would be"""
+        if now is None:
+            now = time.monotonic()
+        tats = self.tats
+
+        tat = tats.get(key, now)
+        if tat < now:
+            tat = now
+        # Compare without subtracting now, so a fresh key is never refused by float rounding
+        allowed_at = tat - self.slack
+        if allowed_at > now:
+            return allowed_at - now
+
+        tats[key] = tat + self.interval
+        tats.move_to_end(key)
+        self._evict(now)
+        return 0.0
+
+    def retry_after(self, key, now: Optional[float] = None) -> float:
+        """Seconds until the key may be used again, without recording a use"""
+        if now is None:
+            now = time.monotonic()
+        tat = self.tats.get(key)
+        if tat is None:
+            return 0.0
+        return max(0.0, tat - self.slack - now)
+
+    def should_warn(self, key, retry_after: float, now: Optional[float] = None) -> bool:
+        """Whether a refused key should be told so: once per cooldown, not on every attempt"""
+        if now is None:
+            now = time.monotonic()
+        until = self.warned.get(key)
+        if until is not None and until > now:
+            return False
+        self.warned[key] = now + retry_after
+        self.warned.move_to_end(key)
+        if len(self.warned) > self.max_keys:
+            self.warned.popitem(last=False)
+        return True
+
+    def reset(self, key):
+        self.tats.pop(key, None)
+        self.warned.pop(key, None)
+
+    def _evict(self, now: float, batch: int = 2):
+        # Evicting two per hit keeps up with one insertion per hit
+        tats = self.tats
+        for _ in range(batch):
+            if not tats:
+                return
+            key, tat = next(iter(tats.items()))
+            if tat > now and len(tats) <= self.max_keys:
+                return
+            del tats[key]
+            self.evicted += 1
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, float]:
+        """Remaining time per active key, for saving across restarts"""
+        if now is None:
+            now = time.monotonic()
+        return {str(key): tat - now for key, tat in self.tats.items() if tat > now}
+
+    def restore(self, remaining: Dict[str, float], elapsed: float = 0.0, now: Optional[float] = None):
+        """Load a snapshot, discounting the time the bot was offline"""
+        if now is None:
+            now = time.monotonic()
+        for key, left in sorted(remaining.items(), key=lambda item: item[1]):
+            if left > elapsed:
+                self.tats[int(key)] = now + left - elapsed
+
+class RateLimitRegistry:
+    """Named limiters shared by commands and buttons, optionally saved to disk"""
+
+    def __init__(self, snapshot: bool = RATE_LIMIT_SNAPSHOT):
+        self.limiters: Dict[str, RateLimiter] = {}
+        self.snapshot_enabled = snapshot
+        self.snapshot_path = data_path('rate_limits.json') if snapshot else None
+        self.saved = load_json(self.snapshot_path, {}) if snapshot else {}
+        self.snapshot_task: Optional[asyncio.Task] = None
+
+    def limiter(self, name: str, limit: RateLimit) -> RateLimiter:
+        """Get or create the limiter for a command or button"""
+        limiter = self.limiters.get(name)
+        if limiter is None or limiter.limit != limit:
+            limiter = self.limiters[name] = RateLimiter(limit)
+            saved = self.saved.get('limiters', {}).pop(name, None)
+            if saved:
+                limiter.restore(saved, elapsed=max(0.0, time.time() - self.saved.get('saved_at', 0)))
+        return limiter
+
+    def check(self, name: str, limit: RateLimit, source) -> float:
+        """Record a use of a command or button; return seconds to wait, or 0 if allowed"""
+        key = limit.key_for(source)
+        if key is None:
+            return 0.0
+        return self.limiter(name, limit).hit(key)
+
+    def should_warn(self, name: str, limit: RateLimit, source, retry_after: float) -> bool:
+        """Whether to reply to a refused use; later attempts in the same cooldown stay silent"""
+        key = limit.key_for(source)
+        return key is not None and self.limiter(name, limit).should_warn(key, retry_after)
+
+    def save(self):
+        if not self.snapshot_enabled:
+            return
+        data = {
+            "saved_at": time.time(),
+            "limiters": {name: limiter.snapshot() for name, limiter in self.limiters.items()},
+        }
+        try:
+            save_json(self.snapshot_path, data)
+        except OSError as e:
+            logger.error(f"Failed to save rate limit snapshot: {e}")
+
+    def start_snapshots(self, interval: float = 60):
+        """Save the snapshot periodically (no-op unless snapshots are enabled)"""
+        if self.snapshot_enabled and (self.snapshot_task is None or self.snapshot_task.done()):
+            self.snapshot_task = asyncio.create_task(self._snapshot_loop(interval))
+
+    async def _snapshot_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.save()
+
+def format_retry_after(seconds: float) -> str:
+    """Human readable wait time for cooldown messages"""
+    seconds = max(1, int(seconds + 0.999))
+    if seconds < 60:
+        return f"{seconds} second{'s' if seconds != 1 else ''}"
+    minutes, seconds = divmod(seconds, 60)
+    return f"{minutes}m {seconds}s" if seconds else f"{minutes}m"
+
+# Global instance
+rate_limits = RateLimitRegistry()
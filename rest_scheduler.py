@@ -0,0 +1,339 @@
+"""
+Outbound REST Scheduler for Discord Bot
+Queues every bot-initiated REST call by priority and waits out rate limits per bucket
+"""
+
+import re
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+import aiohttp
+import discord
+from config import REST_CONCURRENCY, REST_RESERVED_WORKERS, REST_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+WAIT_SAMPLES = 500  # Recent queue waits kept per priority
+MAX_TRACKED_BUCKETS = 10000  # Idle buckets are forgotten beyond this
+API_PREFIX = re.compile(r'^/api/v\d+')
+MAJOR_RESOURCES = ('channels', 'guilds', 'webhooks')
+
+class Priority(IntEnum):
+    """Lower runs first"""
+    ENFORCE = 0  # Bans, kicks, timeouts, role changes a moderator asked for, rule-breaking message removal
+    DM = 1  # Telling the user what happened, before they lose access
+    PROMPT = 2  # Questions and replies to a moderator waiting in a channel
+    LOG = 3  # Log channel embeds and evidence uploads
+    BACKGROUND = 4  # Automatic role upkeep and evidence cleanup
+
+URGENT = Priority.DM  # Reserved workers only take calls at or above this priority
+
+@dataclass(frozen=True)
+class Route:
+    """One Discord endpoint: method, path template with IDs as {id}, and its major parameter
+
+    Discord rate limits per (bucket, major parameter), and a bucket is shared
+    by every call with the same method and template, so bans and member
+    edits in the same guild are limited separately.
+    """
+    method: str
+    template: str
+    major: Hashable = None
+
+def parse_path(method: str, path: str) -> Route:
+    """The Route of a request path, as seen by the aiohttp trace"""
+    segments = API_PREFIX.sub('', path).strip('/').split('/')
+    template = []
+    major = None
+    for i, segment in enumerate(segments):
+        previous = segments[i - 1] if i else ''
+        if segment.isdigit():
+            if major is None and previous in MAJOR_RESOURCES:
+                major = int(segment)
+            template.append('{id}')
+        elif i >= 2 and segments[i - 2] == 'webhooks' and previous.isdigit():
+            major = (major, segment)  # Interaction webhooks are limited per token
+            template.append('{token}')
+        else:
+            template.append(segment)
+    return Route(method.upper(), '/' + '/'.join(template), major)
+
+def channel_route(channel) -> Route:
+    """Sending a message in a channel"""
+    return Route('POST', '/channels/{id}/messages', channel.id)
+
+def message_route(channel, method: str) -> Route:
+    """Editing (PATCH) or deleting (DELETE) one message"""
+    return Route(method, '/channels/{id}/messages/{id}', channel.id)
+
+def bulk_delete_route(channel) -> Route:
+    return Route('POST', '/channels/{id}/messages/bulk-delete', channel.id)
+
+def followup_route(interaction) -> Route:
+    """Interaction followups go to the interaction's webhook, not the channel"""
+    return Route('POST', '/webhooks/{id}/{token}', (interaction.application_id, interaction.token))
+
+def followup_edit_route(interaction) -> Route:
+    """Editing a followup message"""
+    return Route('PATCH', '/webhooks/{id}/{token}/messages/{id}', (interaction.application_id, interaction.token))
+
+def member_route(guild, method: str = 'PATCH') -> Route:
+    """Editing (PATCH: roles, timeouts) or kicking (DELETE) a member"""
+    return Route(method, '/guilds/{id}/members/{id}', guild.id)
+
+def member_role_route(guild, method: str) -> Route:
+    """Adding (PUT) or removing (DELETE) a single role"""
+    return Route(method, '/guilds/{id}/members/{id}/roles/{id}', guild.id)
+
+def ban_route(guild, method: str) -> Route:
+    """Banning (PUT) or unbanning (DELETE) a user"""
+    return Route(method, '/guilds/{id}/bans/{id}', guild.id)
+
+CREATE_DM_ROUTE = Route('POST', '/users/@me/channels')
+
+def retry_after_from(error: discord.HTTPException, default=5.0) -> float:
+    """Read the Retry-After header from a 429 response"""
+    headers = getattr(error.response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After', default))
+    except (TypeError, ValueError):
+        return default
+
+def is_global_limit(error: discord.HTTPException) -> bool:
+    headers = getattr(error.response, 'headers', None) or {}
+    return headers.get('X-RateLimit-Global') == 'true' or headers.get('X-RateLimit-Scope') == 'global'
+
+@dataclass
+class RateLimitBucket:
+    """What Discord's response headers last said about one bucket and major parameter"""
+    remaining: Optional[int] = None
+    blocked_until: float = 0.0
+    rate_limited: int = 0
+
+@dataclass(order=True)
+class RestJob:
+    priority: int
+    sequence: int  # Keeps submission order within a priority
+    route: Route = field(compare=False)
+    factory: Callable[[], Awaitable] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    submitted: float = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+class RestScheduler:
+    """One outbound queue for log embeds, DMs, prompts, role edits and deletions
+
+    Calls wait in a priority heap served by REST_CONCURRENCY workers, plus
+    REST_RESERVED_WORKERS that only take ENFORCE and DM calls, so those never
+    wait behind slow background calls that are already running. Each
+    response's X-RateLimit headers are read through an aiohttp trace and
+    kept per bucket: calls are grouped by method and path template until
+    Discord names their X-RateLimit-Bucket, then by that hash, always per
+    major parameter. Once a bucket is empty or answers 429, its queued calls
+    are parked until the exact reset while every other bucket keeps going.
+    Rate-limited calls are retried up to REST_MAX_RETRIES times; any other
+    error is raised to the caller unchanged.
+    """
+
+    def __init__(self, concurrency: int = REST_CONCURRENCY, reserved: int = REST_RESERVED_WORKERS,
+                 max_retries: int = REST_MAX_RETRIES):
+        self.concurrency = concurrency
+        self.reserved = reserved
+        self.max_retries = max_retries
+        self.ready: List[RestJob] = []  # Heap
+        self.wakeup = asyncio.Event()
+        self.workers: List[asyncio.Task] = []
+        self.reserved_workers: List[asyncio.Task] = []
+        self.sequence = itertools.count()
+
+        self.bucket_hashes: Dict[Tuple[str, str], str] = {}  # (method, template) -> X-RateLimit-Bucket
+        self.buckets: Dict[Tuple[str, Hashable], RateLimitBucket] = {}
+        self.parked: Dict[Tuple[str, Hashable], List[RestJob]] = {}
+        self.global_until = 0.0
+
+        self.waits: Dict[Priority, Deque[float]] = {priority: deque(maxlen=WAIT_SAMPLES) for priority in Priority}
+        self.pending: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self.completed = 0
+        self.failed = 0
+        self.rate_limited = 0
+
+    async def call(self, priority: Priority, route: Route, factory: Callable[[], Awaitable]):
+        """Run a REST call when its turn comes; returns its result or raises its error
+
+        `factory` is called again for each retry, so it must start a fresh request.
+        """
+        self._start_workers()
+        job = RestJob(priority, next(self.sequence), route, factory,
+                      asyncio.get_running_loop().create_future(), time.monotonic())
+        self.pending[priority] += 1
+        self._push(job)
+        try:
+            return await job.future
+        finally:
+            self.pending[priority] -= 1
+
+    def _start_workers(self):
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        while len(self.workers) < self.concurrency:
+            self.workers.append(asyncio.create_task(self._worker(urgent_only=False)))
+        self.reserved_workers = [worker for worker in self.reserved_workers if not worker.done()]
+        while len(self.reserved_workers) < self.reserved:
+            self.reserved_workers.append(asyncio.create_task(self._worker(urgent_only=True)))
+
+    def _push(self, job: RestJob):
+        heapq.heappush(self.ready, job)
+        self.wakeup.set()
+
+    def _pop(self, urgent_only: bool) -> Optional[RestJob]:
+        while self.ready:
+            if urgent_only and self.ready[0].priority > URGENT:
+                return None
+            job = heapq.heappop(self.ready)
+            if not job.future.done():  # Otherwise the caller gave up
+                return job
+        return None
+
+    async def _worker(self, urgent_only: bool):
+        while True:
+            now = time.monotonic()
+            if self.global_until > now:
+                # Whatever is most urgent goes first once the global limit lifts
+                await asyncio.sleep(self.global_until - now)
+                continue
+            job = self._pop(urgent_only)
+            if job is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            key = self.bucket_key(job.route)
+            bucket = self.buckets.get(key)
+            if bucket is not None and bucket.blocked_until > now:
+                self._park(key, job, bucket.blocked_until - now)
+                continue
+            await self._run(job)
+
+    async def _run(self, job: RestJob):
+        if job.attempts == 0:
+            self.waits[job.priority].append(time.monotonic() - job.submitted)
+        job.attempts += 1
+        try:
+            result = await job.factory()
+        except discord.RateLimited as e:
+            # discord.py would have slept longer than max_ratelimit_timeout
+            self._retry(job, e, e.retry_after, is_global=False)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self._retry(job, e, retry_after_from(e), is_global_limit(e))
+            else:
+                self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.completed += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _retry(self, job: RestJob, error: Exception, retry_after: float, is_global: bool):
+        self.rate_limited += 1
+        self.block(job.route, retry_after, is_global)
+        if job.attempts > self.max_retries:
+            logger.warning(f"Giving up on {job.priority.name} call to {job.route.method} {job.route.template} "
+                           f"after {job.attempts} rate limits")
+            self._fail(job, error)
+            return
+        self._push(job)  # The bucket is blocked now, so a worker parks it until the reset
+
+    def _fail(self, job: RestJob, error: Exception):
+        self.failed += 1
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    def _park(self, key: Tuple[str, Hashable], job: RestJob, delay: float):
+        parked = self.parked.setdefault(key, [])
+        parked.append(job)
+        if len(parked) == 1:
+            asyncio.get_running_loop().call_later(delay, self._release, key)
+
+    def _release(self, key: Tuple[str, Hashable]):
+        for job in self.parked.pop(key, []):
+            self._push(job)  # Re-parked if the bucket was blocked again meanwhile
+
+    def bucket_key(self, route: Route) -> Tuple[str, Hashable]:
+        """Discord's bucket hash once learned, else method and template; always with the major parameter"""
+        endpoint = (route.method, route.template)
+        return self.bucket_hashes.get(endpoint, f"{route.method} {route.template}"), route.major
+
+    def block(self, route: Optional[Route], seconds: float, is_global: bool = False):
+        """Hold calls in a route's bucket (or every call) for the given number of seconds"""
+        until = time.monotonic() + seconds
+        if is_global:
+            self.global_until = max(self.global_until, until)
+            logger.warning(f"⏳ Global REST rate limit, holding all calls for {seconds:.2f}s")
+            return
+        bucket = self._bucket(self.bucket_key(route))
+        bucket.blocked_until = max(bucket.blocked_until, until)
+
+    def _bucket(self, key: Tuple[str, Hashable]) -> RateLimitBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= MAX_TRACKED_BUCKETS:
+                now = time.monotonic()
+                self.buckets = {k: v for k, v in self.buckets.items() if v.blocked_until > now}
+            bucket = self.buckets[key] = RateLimitBucket()
+        return bucket
+
+    def observe(self, method: str, path: str, status: int, headers):
+        """Update bucket state from one REST response's rate limit headers"""
+        if status == 429 and (headers.get('X-RateLimit-Global') == 'true' or headers.get('X-RateLimit-Scope') == 'global'):
+            self.block(None, float(headers.get('Retry-After', 1)), is_global=True)
+            return
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+        route = parse_path(method, path)
+        bucket_hash = headers.get('X-RateLimit-Bucket')
+        if bucket_hash:
+            self.bucket_hashes[(route.method, route.template)] = bucket_hash
+        bucket = self._bucket(self.bucket_key(route))
+        bucket.remaining = int(remaining)
+        if status == 429:
+            bucket.rate_limited += 1
+            self.block(route, float(headers.get('Retry-After', 1)))
+        elif bucket.remaining == 0:
+            self.block(route, float(headers.get('X-RateLimit-Reset-After', 1)))
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """aiohttp trace for the bot's HTTP session that feeds observe()"""
+        async def on_request_end(session, context, params):
+            self.observe(params.method, params.url.path, params.response.status, params.response.headers)
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(on_request_end)
+        return trace
+
+    def wait_summary(self) -> Dict[str, Tuple[int, float, float]]:
+        """(samples, median, worst) seconds spent queued per priority"""
+        summary = {}
+        for priority, samples in self.waits.items():
+            if samples:
+                ordered = sorted(samples)
+                summary[priority.name] = (len(ordered), ordered[len(ordered) // 2], ordered[-1])
+        return summary
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "pending": sum(self.pending.values()),
+            "parked": sum(len(jobs) for jobs in self.parked.values()),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+        }
+
+# Global instance
+rest_scheduler = RestScheduler()
@@ -3,7 +3,8 @@ import aiohttp
 import json
 import logging
 from discord import app_commands
-from config import ROBLOX_API_KEY, UNIVERSE_ID, ROBLOX_TOPIC_NAME, ALLOWED_ROLES
+from config import ROBLOX_API_KEY, UNIVERSE_ID, ROBLOX_TOPIC_NAME
+from utils import has_permission
 
 # --- Helper Function: Convert Username to ID ---
 async def get_id_from_username(username: str):
@@ -74,7 +75,7 @@ async def setup_roblox_ban_command(bot):
     )
     async def roblox_ban(interaction: discord.Interaction, username_or_id: str, reason: str, duration: int = -1):
         # 1. Permission Check
-        if not any(role.name in ALLOWED_ROLES for role in interaction.user.roles):
+        if not has_permission(interaction.user):
             await interaction.response.send_message("❌ You do not have permission to use this command.", ephemeral=True)
             return
 
@@ -0,0 +1,103 @@
+"""
+Member x Role Bitmap for Discord Bot
+Finds which members need auto-role changes in one pass, before any API calls
+"""
+
+import time
+import logging
+from typing import Dict, Iterable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+def member_role_ids(member) -> Sequence[int]:
+    """Role IDs of a member straight from the cache
+
+    Member.roles builds and sorts Role objects on every access, which dominates
+    a pass over 100k+ members; the cached ID array holds the same information.
+    """
+    role_ids = getattr(member, '_roles', None)
+    if role_ids is None:
+        role_ids = [role.id for role in member.roles]
+    return role_ids
+
+def iter_bits(mask: int, size: int) -> Iterable[int]:
+    """Yield the positions of the set bits in a mask, in ascending order"""
+    data = mask.to_bytes((size + 7) // 8, 'little')
+    for byte_index, byte in enumerate(data):
+        if byte:
+            base = byte_index * 8
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield base + bit
+
+class MemberRoleBitmap:
+    """Packed bit columns, one per role, with one bit per member
+
+    Each column is a Python int used as a bit array, so evaluating a rule for
+    every member at once is a handful of big-integer AND/NOT operations.
+    """
+
+    def __init__(self, members: Sequence, role_ids: Iterable[int]):
+        self.members = list(members)
+        self.size = len(self.members)
+        self.universe = (1 << self.size) - 1
+
+        positions: Dict[int, List[int]] = {role_id: [] for role_id in role_ids}
+        bots = []
+        for index, member in enumerate(self.members):
+            if member.bot:
+                bots.append(index)
+                continue
+            for role_id in member_role_ids(member):
+                bucket = positions.get(role_id)
+                if bucket is not None:
+                    bucket.append(index)
+
+        self.columns: Dict[int, int] = {role_id: self._pack(indexes) for role_id, indexes in positions.items()}
+        self.humans = self.universe & ~self._pack(bots)  # Bots never get auto-roles
+
+    def _pack(self, indexes: List[int]) -> int:
+        data = bytearray((self.size + 7) // 8)
+        for index in indexes:
+            data[index >> 3] |= 1 << (index & 7)
+        return int.from_bytes(data, 'little')
+
+    @classmethod
+    def for_rules(cls, members: Sequence, compiled) -> 'MemberRoleBitmap':
+        """Build a bitmap holding only the roles the compiled rules refer to"""
+        return cls(members, compiled.relevant_role_ids)
+
+    def column(self, role_id: int) -> int:
+        return self.columns.get(role_id, 0)
+
+    def satisfied(self, rule) -> int:
+        """Members matching a rule's expression"""
+        column_of = {name: self.column(role_id) for name, role_id in rule.role_id_of.items()}
+        return rule.expression.columns(column_of, self.humans) & self.humans
+
+    def gains(self, compiled) -> Dict[object, int]:
+        """Per rule, the members who qualify but don't have the target role yet"""
+        return {rule: self.satisfied(rule) & ~self.column(rule.target_role_id) for rule in compiled.rules}
+
+    def members_needing_change(self, compiled) -> List[int]:
+        """Indexes of members that a full role check would update"""
+        combined = 0
+        for mask in self.gains(compiled).values():
+            combined |= mask
+        return list(iter_bits(combined, self.size))
+
+def preview_role_changes(guild, compiled):
+    """Dry run of a full role check: how many members would gain each role
+
+    Returns (summary rows, total members affected, seconds taken).
+    """
+    started = time.perf_counter()
+    bitmap = MemberRoleBitmap.for_rules(guild.members, compiled)
+
+    rows = []
+    combined = 0
+    for rule, mask in bitmap.gains(compiled).items():
+        combined |= mask
+        rows.append((rule, mask.bit_count()))
+
+    return rows, combined.bit_count(), time.perf_counter() - started
@@ -0,0 +1,275 @@
+"""
+Role Expressions for Discord Bot
+Parses boolean role rules (all, any, not, atleast) and compiles them to bitmask predicates
+"""
+
+import re
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Set
+
+Predicate = Callable[[int], bool]
+
+FUNCTIONS = ('all', 'any', 'not', 'atleast')
+
+class ExpressionError(ValueError):
+    """Raised for a role expression that can't be parsed"""
+
+class RoleExpression(ABC):
+    """A node of a parsed role expression
+
+    Expressions refer to roles by name. compile() turns one into a predicate
+    over an int whose bits are the member's roles, and columns() evaluates it
+    for many members at once over per-role bit columns.
+    """
+
+    @abstractmethod
+    def role_names(self) -> Set[str]:
+        """Every role name the expression refers to"""
+
+    @abstractmethod
+    def compile(self, bit_of: Dict[str, int]) -> Predicate:
+        """Predicate over a role mask, given each role name's bit"""
+
+    @abstractmethod
+    def columns(self, column_of: Dict[str, int], universe: int) -> int:
+        """Bit column of the members matching, given each role name's column"""
+
+    def unmet(self, bits: int, bit_of: Dict[str, int]) -> List[str]:
+        """What a member with these role bits is missing, empty if the expression holds"""
+        return [] if self.compile(bit_of)(bits) else [str(self)]
+
+    def plain_role_names(self) -> Optional[List[str]]:
+        """The role names if this is a plain "has all of these roles" rule"""
+        return None
+
+class RoleRef(RoleExpression):
+    """Member has the named role"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def role_names(self):
+        return {self.name}
+
+    def compile(self, bit_of):
+        bit = 1 << bit_of[self.name]
+        return lambda bits: bits & bit != 0
+
+    def columns(self, column_of, universe):
+        return column_of[self.name]
+
+    def unmet(self, bits, bit_of):
+        return [] if bits >> bit_of[self.name] & 1 else [self.name]
+
+    def plain_role_names(self):
+        return [self.name]
+
+    def __str__(self):
+        if re.search(r'[(),"]', self.name) or self.name.lower() in FUNCTIONS or self.name != self.name.strip():
+            return f'"{self.name}"'
+        return self.name
+
+class _Group(RoleExpression):
+    keyword = ''
+
+    def __init__(self, children: Sequence[RoleExpression]):
+        self.children = list(children)
+
+    def role_names(self):
+        return set().union(*(child.role_names() for child in self.children))
+
+    def _role_mask(self, bit_of) -> Optional[int]:
+        """Bitmask of the children if they are all plain role references"""
+        if not all(isinstance(child, RoleRef) for child in self.children):
+            return None
+        mask = 0
+        for child in self.children:
+            mask |= 1 << bit_of[child.name]
+        return mask
+
+    def _args(self) -> str:
+        return ', '.join(str(child) for child in self.children)
+
+    def __str__(self):
+        return f"{self.keyword}({self._args()})"
+
+class AllOf(_Group):
+    """Member matches every child"""
+    keyword = 'all'
+
+    def compile(self, bit_of):
+        mask = self._role_mask(bit_of)
+        if mask is not None:
+            return lambda bits: bits & mask == mask
+        predicates = [child.compile(bit_of) for child in self.children]
+        return lambda bits: all(predicate(bits) for predicate in predicates)
+
+    def columns(self, column_of, universe):
+        result = universe
+        for child in self.children:
+            result &= child.columns(column_of, universe)
+        return result
+
+    def unmet(self, bits, bit_of):
+        return [missing for child in self.children for missing in child.unmet(bits, bit_of)]
+
+    def plain_role_names(self):
+        if all(isinstance(child, RoleRef) for child in self.children):
+            return [child.name for child in self.children]
+        return None
+
+class AnyOf(_Group):
+    """Member matches at least one child"""
+    keyword = 'any'
+
+    def compile(self, bit_of):
+        mask = self._role_mask(bit_of)
+        if mask is not None:
+            return lambda bits: bits & mask != 0
+        predicates = [child.compile(bit_of) for child in self.children]
+        return lambda bits: any(predicate(bits) for predicate in predicates)
+
+    def columns(self, column_of, universe):
+        result = 0
+        for child in self.children:
+            result |= child.columns(column_of, universe)
+        return result
+
+class Not(_Group):
+    """Member doesn't match the child"""
+    keyword = 'not'
+
+    def compile(self, bit_of):
+        predicate = self.children[0].compile(bit_of)
+        return lambda bits: not predicate(bits)
+
+    def columns(self, column_of, universe):
+        return universe & ~self.children[0].columns(column_of, universe)
+
+class AtLeast(_Group):
+    """Member matches at least `count` of the children"""
+    keyword = 'atleast'
+
+    def __init__(self, count: int, children: Sequence[RoleExpression]):
+        super().__init__(children)
+        self.count = count
+
+    def compile(self, bit_of):
+        count = self.count
+        mask = self._role_mask(bit_of)
+        if mask is not None and mask.bit_count() == len(self.children):  # A repeated role counts twice
+            return lambda bits: (bits & mask).bit_count() >= count
+        predicates = [child.compile(bit_of) for child in self.children]
+        return lambda bits: sum(1 for predicate in predicates if predicate(bits)) >= count
+
+    def columns(self, column_of, universe):
+        # reached[j] holds the members matching at least j of the children seen so far
+        reached = [universe] + [0] * self.count
+        for child in self.children:
+            column = child.columns(column_of, universe)
+            for j in range(self.count, 0, -1):
+                reached[j] |= reached[j - 1] & column
+        return reached[self.count]
+
+    def _args(self):
+        return f"{self.count}, {super()._args()}"
+
+_TOKEN = re.compile(r'\s*(?:(?P<open>\()|(?P<close>\))|(?P<comma>,)|"(?P<quoted>[^"]*)"|(?P<word>[^(),"]+))')
+
+_TOKEN_NAMES = {'open': "'('", 'close': "')'", 'comma': "','", 'word': "a role name"}
+
+def _tokenize(text: str):
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise ExpressionError(f"Unexpected character at position {position + 1}: {text[position:position + 10]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        tokens.append((kind, value.strip() if kind == 'word' else value))
+    return tokens
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, kind):
+        token_kind, value = self.peek()
+        if token_kind != kind:
+            raise ExpressionError(f"Expected {_TOKEN_NAMES[kind]} but found {value or 'end of expression'!r}")
+        self.position += 1
+        return value
+
+    def arguments(self) -> List:
+        args = [self.expression()]
+        while self.peek()[0] == 'comma':
+            self.position += 1
+            args.append(self.expression())
+        return args
+
+    def expression(self) -> RoleExpression:
+        kind, value = self.peek()
+        if kind == 'quoted':
+            self.position += 1
+            return RoleRef(value)
+        if kind != 'word':
+            raise ExpressionError(f"Expected a role name or function but found {value or 'end of expression'!r}")
+
+        keyword = value.lower()
+        if keyword in FUNCTIONS and self.peek(1)[0] == 'open':
+            self.position += 2
+            if keyword == 'atleast':
+                count_text = self.take('word')
+                if not count_text.isdigit():
+                    raise ExpressionError(f"atleast() needs a number first, got {count_text!r}")
+                self.take('comma')
+                node = AtLeast(int(count_text), self.arguments())
+                if node.count > len(node.children):
+                    raise ExpressionError(f"atleast({node.count}, ...) can never match {len(node.children)} option(s)")
+            else:
+                args = self.arguments()
+                if keyword == 'not' and len(args) != 1:
+                    raise ExpressionError("not() takes exactly one argument")
+                node = {'all': AllOf, 'any': AnyOf, 'not': Not}[keyword](args)
+            self.take('close')
+            return node
+
+        self.position += 1
+        return RoleRef(value)
+
+def parse_expression(text: str) -> RoleExpression:
+    """Parse a role expression such as ``all(Verified, any(Booster, VIP), not(Muted))``
+
+    A bare comma-separated list of role names means all of them. Role names
+    containing commas, brackets or quotes must be wrapped in double quotes.
+    """
+    parser = _Parser(text)
+    if not parser.tokens:
+        raise ExpressionError("Expression is empty")
+    args = parser.arguments()
+    if parser.position != len(parser.tokens):
+        raise ExpressionError(f"Unexpected {parser.peek()[1]!r} after the end of the expression")
+    return args[0] if len(args) == 1 else AllOf(args)
+
+def combination_expression(combo: Dict) -> RoleExpression:
+    """The expression for a combination, from 'expression' or the older 'required_roles' list"""
+    if combo.get('expression'):
+        return parse_expression(combo['expression'])
+    return AllOf([RoleRef(name) for name in combo.get('required_roles', [])])
+
+def describe_combination(combo: Dict) -> str:
+    """Human readable requirement of a combination for embeds"""
+    try:
+        expression = combination_expression(combo)
+    except ExpressionError:
+        return combo.get('expression', '?')
+    names = expression.plain_role_names()
+    return " + ".join(names) if names is not None else str(expression)
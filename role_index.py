@@ -0,0 +1,85 @@
+"""
+Guild Role Index for Discord Bot
+Resolves role names to roles without scanning guild.roles on every lookup
+"""
+
+import logging
+from typing import Dict, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class GuildRoleIndex:
+    """Name to role ID map for a single guild, with negative entries"""
+
+    def __init__(self):
+        self.role_ids_by_name: Dict[str, Tuple[int, ...]] = {}
+        self.missing: Set[str] = set()  # Names already reported as not found
+        self.version = 0
+        self.dirty = True
+
+    def rebuild(self, guild):
+        """Re-read the guild's roles (guild.roles is ordered by position)"""
+        role_ids_by_name: Dict[str, list] = {}
+        for role in guild.roles:
+            role_ids_by_name.setdefault(role.name, []).append(role.id)
+
+        self.role_ids_by_name = {name: tuple(ids) for name, ids in role_ids_by_name.items()}
+        self.missing.difference_update(self.role_ids_by_name)
+        self.dirty = False
+
+class RoleIndex:
+    """Per-guild role lookups kept current by role create, update and delete events"""
+
+    def __init__(self):
+        self.guilds: Dict[int, GuildRoleIndex] = {}
+
+    def _index(self, guild) -> GuildRoleIndex:
+        index = self.guilds.get(guild.id)
+        if index is None:
+            index = self.guilds[guild.id] = GuildRoleIndex()
+        if index.dirty:
+            index.rebuild(guild)
+        return index
+
+    def version(self, guild) -> int:
+        """Counter that changes whenever the guild's roles change"""
+        index = self.guilds.get(guild.id)
+        return index.version if index else 0
+
+    def role_ids(self, guild, name: str) -> Tuple[int, ...]:
+        """Return the IDs of every role with this name, lowest position first"""
+        return self._index(guild).role_ids_by_name.get(name, ())
+
+    def get_role(self, guild, name: str):
+        """Find a role by name, like discord.utils.get(guild.roles, name=name)
+
+        A missing role is logged once and then remembered, so repeated lookups
+        from member updates don't flood the log.
+        """
+        index = self._index(guild)
+        role_ids = index.role_ids_by_name.get(name)
+        if role_ids:
+            role = guild.get_role(role_ids[0])
+            if role is not None:
+                return role
+            # The cache is behind the gateway; fall back to a fresh read
+            index.rebuild(guild)
+            role_ids = index.role_ids_by_name.get(name)
+            if role_ids:
+                return guild.get_role(role_ids[0])
+
+        if name not in index.missing:
+            index.missing.add(name)
+            logger.warning(f"Role '{name}' not found in guild {guild.name}")
+        return None
+
+    def invalidate_guild(self, guild):
+        """Mark the guild's index stale after a role is created, updated or deleted"""
+        index = self.guilds.get(guild.id)
+        if index is None:
+            index = self.guilds[guild.id] = GuildRoleIndex()
+        index.dirty = True
+        index.version += 1
+
+# Global instance
+role_index = RoleIndex()
@@ -4,14 +4,29 @@ Handles automatic role assignment based on role combinations
 """
 
 import discord
+import time
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Set
+from typing import List, Dict, FrozenSet, Optional, Set
 from discord import app_commands
 from discord.ext import commands
-from config import AUTO_ROLE_COMBINATIONS, ENABLE_AUTO_ROLES, AUTO_ROLE_LOG_CHANNEL_ID, ALLOWED_ROLES, ROLE_CHECK_COOLDOWN
+from config import (
+    ENABLE_AUTO_ROLES, AUTO_ROLE_LOG_CHANNEL_ID, ROLE_CHECK_COOLDOWN,
+    ROLE_UPDATE_CONCURRENCY, ROLE_UPDATE_BATCH_WINDOW, ROLE_UPDATE_MAX_PENDING
+)
 from utils import has_permission
+from role_rules import RoleRuleEngine, RoleChangePlan
+from role_rule_store import RoleRuleStore
+from role_expressions import describe_combination
+from role_sweep import RoleSweepJob
+from role_bitmap import preview_role_changes, member_role_ids
+from role_snapshot import RoleSnapshot, RoleReconciler
+from work_queue import KeyedCoalescingQueue
+from role_stats import RoleStatsTracker
+from log_writer import LogEntry, log_writers
+from rate_limit import RateLimit, rate_limits, format_retry_after
+from rest_scheduler import rest_scheduler, Priority, member_route, member_role_route
 
 logger = logging.getLogger(__name__)
 
@@ -21,8 +36,7 @@ class RoleCheckButton(discord.ui.View):
     def __init__(self, role_manager):
         super().__init__(timeout=None)  # Persistent view
         self.role_manager = role_manager
-        self.user_cooldowns = {}  # Track user cooldowns to prevent spam
-        self.cooldown_duration = ROLE_CHECK_COOLDOWN  # Configurable cooldown duration
+        self.cooldown = RateLimit(1, ROLE_CHECK_COOLDOWN)  # One check per user per cooldown
     
     @discord.ui.button(
         label="🔄 Check My Roles", 
@@ -36,24 +50,15 @@ class RoleCheckButton(discord.ui.View):
         
         # Check if user is on cooldown
         user_id = interaction.user.id
-        current_time = datetime.utcnow()
-        
-        if user_id in self.user_cooldowns:
-            last_used = self.user_cooldowns[user_id]
-            time_diff = (current_time - last_used).total_seconds()
-            
-            if time_diff < self.cooldown_duration:
-                remaining = int(self.cooldown_duration - time_diff)
-                await interaction.followup.send(
-                    f"⏰ **Cooldown Active**\n"
-                    f"You can check your roles again in {remaining} seconds.\n"
-                    f"This prevents spam and helps keep the bot responsive for everyone!",
-                    ephemeral=True
-                )
-                return
-        
-        # Set cooldown
-        self.user_cooldowns[user_id] = current_time
+        retry_after = rate_limits.check("check_roles_button", self.cooldown, interaction)
+        if retry_after:
+            await interaction.followup.send(
+                f"⏰ **Cooldown Active**\n"
+                f"You can check your roles again in {format_retry_after(retry_after)}.\n"
+                f"This prevents spam and helps keep the bot responsive for everyone!",
+                ephemeral=True
+            )
+            return
         
         if not ENABLE_AUTO_ROLES:
             await interaction.followup.send("❌ Automatic role management is currently disabled.", ephemeral=True)
@@ -69,33 +74,29 @@ class RoleCheckButton(discord.ui.View):
             await interaction.followup.send("❌ Unable to find your member data.", ephemeral=True)
             return
         
-        await interaction.followup.send("🔍 **Checking your roles...** This may take a moment.", ephemeral=True)
-        
         try:
-            # Check the user's current roles against all combinations
-            old_roles = member.roles.copy()
-            roles_before_count = len(old_roles)
-            
-            # Simulate checking by using empty old roles (this will trigger assignments if they qualify)
-            await self.role_manager.check_and_update_roles(member, [], member.roles)
-            
-            # Check if anything changed
-            new_roles = member.roles
-            roles_after_count = len(new_roles)
+            # One cached lookup gives both the status of every combination and the grants to make
+            status = self.role_manager.rule_engine.status(member.guild, member_role_ids(member))
+            roles_added = []
+            if status.plan:
+                roles_added, _ = await self.role_manager.apply_role_plan(member, status.plan, Priority.PROMPT)
+                if roles_added:
+                    await self.role_manager.log_role_changes(member, roles_added, [])
             
             # Create response embed
             embed = discord.Embed(
                 title="🎭 Role Check Results",
-                color=0x00ff00 if roles_after_count > roles_before_count else 0x0099ff,
+                color=0x00ff00 if roles_added else 0x0099ff,
                 timestamp=datetime.utcnow()
             )
             
-            if roles_after_count > roles_before_count:
+            role_count = len(member.roles) + len(roles_added)
+            if roles_added:
                 # User got new roles
                 embed.description = "✅ **Great news!** You've been assigned new roles based on your current roles!"
                 embed.add_field(
                     name="📈 Status",
-                    value=f"You now have {roles_after_count} roles (gained {roles_after_count - roles_before_count})",
+                    value=f"You now have {role_count} roles (gained {len(roles_added)})",
                     inline=False
                 )
             else:
@@ -103,37 +104,27 @@ class RoleCheckButton(discord.ui.View):
                 embed.description = "✅ **All good!** Your roles are already up to date."
                 embed.add_field(
                     name="📊 Status", 
-                    value=f"You have {roles_after_count} roles and they're all correctly assigned.",
+                    value=f"You have {role_count} roles and they're all correctly assigned.",
                     inline=False
                 )
             
             # Show active combinations they could potentially get
-            active_combos = self.role_manager.get_active_combinations()
-            if active_combos:
-                combo_status = []
-                user_role_names = {role.name for role in member.roles}
-                
-                for combo in active_combos:
-                    required_roles = set(combo['required_roles'])
-                    target_role = combo['target_role']
-                    has_target = target_role in user_role_names
-                    
-                    if has_target:
-                        combo_status.append(f"✅ **{combo['name']}**: You have this role!")
-                    else:
-                        missing_roles = required_roles - user_role_names
-                        if not missing_roles:
-                            combo_status.append(f"🔄 **{combo['name']}**: Processing...")
-                        else:
-                            missing_list = ", ".join(missing_roles)
-                            combo_status.append(f"⏳ **{combo['name']}**: Need `{missing_list}`")
-                
-                if combo_status:
-                    embed.add_field(
-                        name="🎯 Available Role Combinations",
-                        value="\n".join(combo_status[:5]),  # Show max 5 to avoid embed limits
-                        inline=False
-                    )
+            combo_status = []
+            for rule_status in status.statuses[:5]:  # Show max 5 to avoid embed limits
+                rule = rule_status.rule
+                if rule_status.has_target or rule.target_role_name in roles_added:
+                    combo_status.append(f"✅ **{rule.name}**: You have this role!")
+                elif rule_status.eligible:
+                    combo_status.append(f"🔄 **{rule.name}**: Processing...")
+                else:
+                    combo_status.append(f"⏳ **{rule.name}**: Need `{', '.join(rule_status.missing_role_names)}`")
+            
+            if combo_status:
+                embed.add_field(
+                    name="🎯 Available Role Combinations",
+                    value="\n".join(combo_status),
+                    inline=False
+                )
             
             embed.set_footer(text="Role checks help ensure everyone has the correct roles!")
             
@@ -153,8 +144,22 @@ class RoleManager:
     
     def __init__(self, bot):
         self.bot = bot
-        self.processing_users: Set[int] = set()  # Prevent duplicate processing
+        # Role changes per member; a burst keeps the earliest "before" and the latest "after"
+        self.update_queue = KeyedCoalescingQueue(
+            self.process_member_update,
+            merge=lambda pending, new: (pending[0], new[1]),
+            concurrency=ROLE_UPDATE_CONCURRENCY,
+            window=ROLE_UPDATE_BATCH_WINDOW,
+            max_pending=ROLE_UPDATE_MAX_PENDING,
+            name="Role update queue"
+        )
+        self.snapshot = RoleSnapshot()
+        self.reconciler = RoleReconciler(self, self.snapshot)
         self.role_check_view = None  # Will store the persistent button view
+        self.rule_store = RoleRuleStore()
+        self.rule_engine = RoleRuleEngine(self.rule_store.combinations)
+        self.sweeps: Dict[int, RoleSweepJob] = {}  # Background /checkroles jobs per guild
+        self.stats = RoleStatsTracker(self.rule_engine)
     
     async def setup_persistent_view(self):
         """Setup the persistent button view"""
@@ -183,7 +188,7 @@ class RoleManager:
         if active_combos:
             combo_info = []
             for combo in active_combos[:3]:  # Show max 3 to avoid embed limits
-                required = " + ".join(combo['required_roles'])
+                required = describe_combination(combo)
                 target = combo['target_role']
                 combo_info.append(f"• `{required}` → **{target}**")
             
@@ -223,90 +228,115 @@ class RoleManager:
     
     async def handle_member_update(self, before: discord.Member, after: discord.Member):
         """Handle member update events to check for role changes"""
-        if not ENABLE_AUTO_ROLES:
-            return
-        
         # Check if roles actually changed
         if before.roles == after.roles:
             return
         
-        # Prevent processing the same user multiple times simultaneously
-        if after.id in self.processing_users:
+        # Bots aren't counted in the role stats and never get auto-roles
+        if after.bot:
             return
         
-        self.processing_users.add(after.id)
+        old_role_ids = frozenset(member_role_ids(before))
+        self.stats.member_changed(after.guild, old_role_ids, frozenset(member_role_ids(after)))
+        
+        if not ENABLE_AUTO_ROLES:
+            return
         
+        # Queue the change; updates for a member already waiting are merged into one check
+        self.update_queue.submit((after.guild.id, after.id), (old_role_ids, after))
+    
+    async def process_member_update(self, key, change):
+        """Check a member's coalesced role change (called by the update queue)"""
+        old_role_ids, after = change
+        new_role_ids = frozenset(member_role_ids(after))
         try:
-            await self.check_and_update_roles(after, before.roles, after.roles)
+            await self.apply_rules(after, old_role_ids, new_role_ids)
         except Exception as e:
             logger.error(f"Error processing role update for {after}: {e}")
-        finally:
-            self.processing_users.discard(after.id)
+        
+        # Remember what the rules have seen so a restart only re-checks later changes
+        relevant = self.rule_engine.rules_for(after.guild).relevant_role_ids
+        self.snapshot.record(after.guild.id, after.id, new_role_ids & relevant)
+    
+    def forget_member(self, member: discord.Member):
+        """Drop a member who left from the role snapshot and counters"""
+        self.snapshot.forget(member.guild.id, member.id)
+        self.stats.member_left(member)
+    
+    async def catch_up(self):
+        """Re-check members whose roles changed while the bot was offline"""
+        if not ENABLE_AUTO_ROLES:
+            return
+        await self.reconciler.reconcile_all(self.bot.guilds)
+        self.reconciler.start_drift_check(self.bot)
     
     async def check_and_update_roles(self, member: discord.Member, old_roles: List[discord.Role], new_roles: List[discord.Role]):
-        """Check if member's new roles trigger any automatic role assignments"""
+        """Check if member's new roles trigger any automatic role assignments
+
+        Returns True if any roles were changed.
+        """
         
-        # Get role names for easier comparison
-        old_role_names = {role.name for role in old_roles}
-        new_role_names = {role.name for role in new_roles}
+        # Compare role IDs so only rules touching the changed roles are evaluated
+        old_role_ids = frozenset(role.id for role in old_roles)
+        new_role_ids = frozenset(role.id for role in new_roles)
+        return await self.apply_rules(member, old_role_ids, new_role_ids)
+    
+    async def apply_rules(self, member: discord.Member, old_role_ids: FrozenSet[int], new_role_ids: FrozenSet[int]):
+        """Apply the rules affected by a change from old_role_ids to new_role_ids
+
+        Returns True if any roles were changed.
+        """
+        plan = self.rule_engine.plan(member.guild, old_role_ids, new_role_ids)
+        if not plan:
+            return False
         
-        # Track changes made
-        roles_added = []
-        roles_removed = []
-        
-        for combo in AUTO_ROLE_COMBINATIONS:
-            if not combo.get('enabled', False):
-                continue
-            
-            required_roles = set(combo['required_roles'])
-            target_role_name = combo['target_role']
-            remove_on_loss = combo.get('remove_on_loss', True)
-            
-            # Find the target role in the guild
-            target_role = discord.utils.get(member.guild.roles, name=target_role_name)
-            if not target_role:
-                logger.warning(f"Target role '{target_role_name}' not found in guild {member.guild.name}")
-                continue
-            
-            # Check if user has all required roles now
-            has_all_required = required_roles.issubset(new_role_names)
-            # Check if user had all required roles before
-            had_all_required = required_roles.issubset(old_role_names)
-            # Check if user currently has the target role
-            has_target_role = target_role in new_roles
-            
-            # Case 1: User gained all required roles and doesn't have target role yet
-            if has_all_required and not has_target_role:
-                try:
-                    await member.add_roles(target_role, reason=f"Auto-role: User has all required roles: {', '.join(required_roles)}")
-                    roles_added.append(target_role_name)
-                    logger.info(f"Added role '{target_role_name}' to {member} (combo: {combo['name']})")
-                except discord.HTTPException as e:
-                    logger.error(f"Failed to add role '{target_role_name}' to {member}: {e}")
-            
-            # Case 2: User lost a required role and has target role (and removal is enabled)
-            elif not has_all_required and had_all_required and has_target_role and remove_on_loss:
-                # Make sure they actually lost a role (not just gained extra ones)
-                lost_required_roles = required_roles - new_role_names
-                if lost_required_roles:
-                    try:
-                        await member.remove_roles(target_role, reason=f"Auto-role removal: User lost required role(s): {', '.join(lost_required_roles)}")
-                        roles_removed.append(target_role_name)
-                        logger.info(f"Removed role '{target_role_name}' from {member} (combo: {combo['name']}) - lost roles: {', '.join(lost_required_roles)}")
-                    except discord.HTTPException as e:
-                        logger.error(f"Failed to remove role '{target_role_name}' from {member}: {e}")
+        roles_added, roles_removed = await self.apply_role_plan(member, plan)
         
         # Log the changes if any were made
         if roles_added or roles_removed:
             await self.log_role_changes(member, roles_added, roles_removed)
+            return True
+        return False
+    
+    async def apply_role_plan(self, member: discord.Member, plan: RoleChangePlan, priority: Priority = Priority.BACKGROUND):
+        """Apply a member's combined role changes in a single request"""
+        roles_added = [decision.rule.target_role_name for decision in plan.to_add.values()]
+        roles_removed = [decision.rule.target_role_name for decision in plan.to_remove.values()]
+        reason = plan.audit_reason()
+        
+        def edit():
+            if plan.change_count == 1:
+                # A single add or remove is atomic and can't race other role edits
+                if plan.to_add:
+                    return member.add_roles(discord.Object(id=next(iter(plan.to_add))), reason=reason)
+                return member.remove_roles(discord.Object(id=next(iter(plan.to_remove))), reason=reason)
+            current_role_ids = [role.id for role in member.roles[1:]]  # Skip @everyone
+            final_roles = [discord.Object(id=role_id) for role_id in plan.target_role_ids(current_role_ids)]
+            return member.edit(roles=final_roles, reason=reason)
+        
+        if plan.change_count == 1:
+            route = member_role_route(member.guild, 'PUT' if plan.to_add else 'DELETE')
+        else:
+            route = member_route(member.guild)
+        
+        try:
+            await rest_scheduler.call(priority, route, edit)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                raise  # Let bulk sweeps pace themselves
+            logger.error(f"Failed to update roles for {member} (add: {roles_added}, remove: {roles_removed}): {e}")
+            return [], []
+        
+        for decision in plan.to_add.values():
+            logger.info(f"Added role '{decision.rule.target_role_name}' to {member} (combo: {decision.rule.name})")
+        for decision in plan.to_remove.values():
+            logger.info(f"Removed role '{decision.rule.target_role_name}' from {member} (combo: {decision.rule.name}) - lost roles: {', '.join(decision.lost_role_names)}")
+        
+        return roles_added, roles_removed
     
     async def log_role_changes(self, member: discord.Member, roles_added: List[str], roles_removed: List[str]):
         """Log automatic role changes to the designated channel"""
         try:
-            log_channel = self.bot.get_channel(AUTO_ROLE_LOG_CHANNEL_ID)
-            if not log_channel:
-                return
-            
             # Create embed for the log
             embed = discord.Embed(
                 title="🤖 Automatic Role Update",
@@ -324,54 +354,161 @@ class RoleManager:
             
             embed.set_footer(text=f"User ID: {member.id}")
             
-            await log_channel.send(embed=embed)
+            # During bulk runs these are summarized into a digest with a CSV of every change
+            row = {"user_id": member.id, "user": str(member)}
+            digest = [(f"members received `{role}`", {**row, "change": "added", "role": role}) for role in roles_added]
+            digest += [(f"members lost `{role}`", {**row, "change": "removed", "role": role}) for role in roles_removed]
+            await log_writers.write(self.bot, AUTO_ROLE_LOG_CHANNEL_ID, LogEntry(embed=embed, digest=digest))
             
         except Exception as e:
             logger.error(f"Failed to log role changes for {member}: {e}")
     
+    def start_role_sweep(self, guild: discord.Guild, resume: bool = False, on_complete=None) -> RoleSweepJob:
+        """Start a background sweep of every member in the guild"""
+        job = self.sweeps.get(guild.id)
+        if job and job.is_running:
+            return job
+        
+        job = RoleSweepJob(self, guild, resume=resume, on_complete=on_complete)
+        self.sweeps[guild.id] = job
+        return job.start()
+    
     async def check_all_members(self, guild: discord.Guild):
         """Check all members in a guild for role combinations (useful for initial setup)"""
         if not ENABLE_AUTO_ROLES:
             return {"processed": 0, "updated": 0, "errors": 0}
         
-        processed = 0
-        updated = 0
-        errors = 0
+        job = self.start_role_sweep(guild)
+        await job.wait()
+        return job.results()
+    
+    def handle_sweep_action(self, guild: discord.Guild, action: str, on_complete=None, prefix: str = '/'):
+        """Run a /checkroles action (start, status, cancel, resume, preview) and return (content, embed)"""
+        job = self.sweeps.get(guild.id)
+        running = job is not None and job.is_running
+        
+        if action == 'preview':
+            return None, build_preview_embed(guild, *preview_role_changes(guild, self.rule_engine.rules_for(guild)))
         
-        for member in guild.members:
-            if member.bot:  # Skip bots
-                continue
+        if action in ('start', 'resume'):
+            if running:
+                return "⚠️ **A role check is already running.**", build_sweep_embed(job)
             
-            try:
-                # Simulate a role update by checking current roles against empty previous roles
-                empty_roles = []
-                
-                old_roles_count = len(member.roles)
-                await self.check_and_update_roles(member, empty_roles, member.roles)
-                new_roles_count = len(member.roles)
-                
-                if new_roles_count != old_roles_count:
-                    updated += 1
-                
-                processed += 1
-                
-                # Add small delay to prevent rate limiting
-                if processed % 10 == 0:
-                    await asyncio.sleep(1)
-                    
-            except Exception as e:
-                logger.error(f"Error checking member {member}: {e}")
-                errors += 1
-        
-        return {"processed": processed, "updated": updated, "errors": errors}
+            resume = action == 'resume'
+            if resume and not RoleSweepJob.saved_state(guild):
+                return "❌ There is no interrupted role check to resume.", None
+            
+            job = self.start_role_sweep(guild, resume=resume, on_complete=on_complete)
+            verb = "Resuming" if resume else "Started"
+            return (
+                f"🔄 **{verb} checking all members for role combinations** in the background.\n"
+                f"Use `{prefix}checkroles status` to follow progress or `{prefix}checkroles cancel` to stop it.",
+                None
+            )
+        
+        if action == 'cancel':
+            if not running:
+                return "❌ No role check is running.", None
+            job.cancel()
+            return f"🛑 **Role check cancelled.** Use `{prefix}checkroles resume` to continue from where it stopped.", None
+        
+        # status
+        if job is not None:
+            return None, build_sweep_embed(job)
+        saved = RoleSweepJob.saved_state(guild)
+        if saved:
+            return (
+                f"⏸️ An interrupted role check stopped at member ID {saved.get('cursor', 0)}. "
+                f"Use `{prefix}checkroles resume` to continue it.",
+                None
+            )
+        return "ℹ️ No role check has been run since the bot started.", None
     
     def get_active_combinations(self) -> List[Dict]:
         """Get list of currently active role combinations"""
-        return [combo for combo in AUTO_ROLE_COMBINATIONS if combo.get('enabled', False)]
+        return [combo for combo in self.rule_store.combinations if combo.get('enabled', False)]
     
     def get_all_combinations(self) -> List[Dict]:
         """Get list of all role combinations (enabled and disabled)"""
-        return AUTO_ROLE_COMBINATIONS.copy()
+        return list(self.rule_store.combinations)
+    
+    def reload_rules(self, from_disk: bool = False):
+        """Recompile the rule store for every guild and swap it in without a restart"""
+        if from_disk:
+            self.rule_store.reload()
+        self.rule_engine.reload(self.rule_store.combinations, self.bot.guilds)
+        logger.info(f"🔄 Reloaded {len(self.get_active_combinations())} active role combination(s)")
+
+SWEEP_ACTIONS = ('start', 'status', 'cancel', 'resume', 'preview')
+
+def build_sweep_embed(job: RoleSweepJob) -> discord.Embed:
+    """Build the progress or result embed for a role sweep"""
+    progress = job.progress()
+    titles = {
+        'pending': "⏳ Role Check Starting",
+        'running': "🔄 Role Check In Progress",
+        'completed': "✅ Role Check Complete",
+        'cancelled': "🛑 Role Check Cancelled",
+        'failed': "❌ Role Check Failed",
+    }
+    embed = discord.Embed(
+        title=titles.get(progress['status'], "🎭 Role Check"),
+        color=0x00ff00 if progress['status'] == 'completed' else 0x0099ff,
+        timestamp=datetime.utcnow()
+    )
+    
+    total = progress['total'] or progress['processed']
+    embed.add_field(name="Members Processed", value=f"{progress['processed']}/{total}", inline=True)
+    embed.add_field(name="Members Updated", value=progress['updated'], inline=True)
+    embed.add_field(name="Errors", value=progress['errors'], inline=True)
+    if progress['status'] == 'running':
+        embed.add_field(name="Speed", value=f"{progress['rate']:.0f} members/s", inline=True)
+        embed.add_field(name="Request Interval", value=f"{progress['interval']:.2f}s", inline=True)
+    
+    embed.set_footer(text=f"Resume cursor: member ID {progress['cursor']}")
+    return embed
+
+def build_preview_embed(guild: discord.Guild, rows, total: int, seconds: float) -> discord.Embed:
+    """Build the dry-run embed showing what a full role check would change"""
+    embed = discord.Embed(
+        title="🔍 Role Check Preview",
+        description=f"**{total}** member(s) would be updated by a full role check.",
+        color=0x0099ff,
+        timestamp=datetime.utcnow()
+    )
+    
+    lines = [f"• **{rule.name}**: {count} member(s) would gain `{rule.target_role_name}`" for rule, count in rows]
+    embed.add_field(name="Combinations", value="\n".join(lines)[:1024] if lines else "No active combinations.", inline=False)
+    embed.set_footer(text=f"Checked {guild.member_count or len(guild.members)} members in {seconds * 1000:.0f} ms • no roles were changed")
+    return embed
+
+def build_role_stats_embed(guild: discord.Guild, role: discord.Role = None, without: discord.Role = None) -> discord.Embed:
+    """Build the /rolestats embed from the incrementally maintained counters"""
+    stats = role_manager.stats.stats_for(guild)
+    embed = discord.Embed(
+        title="📊 Role Statistics",
+        description=f"Counting **{stats.members}** members (bots excluded).",
+        color=0x0099ff,
+        timestamp=datetime.utcnow()
+    )
+    
+    if role is not None:
+        count = stats.count_with(role.id, without.id if without else None)
+        if count is None:
+            # Pairs outside the combination roles aren't tracked; count them directly
+            count = sum(1 for m in guild.members if not m.bot and m.get_role(role.id) and not m.get_role(without.id))
+        label = f"{role.name} without {without.name}" if without else role.name
+        embed.add_field(name=f"🎭 {label}", value=f"**{count}** member(s)", inline=False)
+    else:
+        lines = [
+            f"• **{rule.name}** → `{rule.target_role_name}`: {matched} match • {holding} have the role • {near} one role away"
+            for rule, matched, holding, near in stats.combo_counts()
+        ]
+        embed.add_field(name="🎯 Combinations", value="\n".join(lines)[:1024] if lines else "No active combinations.", inline=False)
+    
+    minutes = int((time.time() - stats.counted_at) // 60)
+    embed.set_footer(text=f"Live counters • last full recount {minutes} min ago")
+    return embed
 
 # Global instance
 role_manager = None
@@ -379,7 +516,11 @@ role_manager = None
 async def setup_role_management(bot):
     """Initialize the role management system"""
     global role_manager
+    if role_manager is not None:
+        return  # on_ready fires again after reconnects; keep the queue and snapshot
+    
     role_manager = RoleManager(bot)
+    role_manager.stats.start_recounts(bot)
     await setup_role_management_commands(bot)
     
     # Setup persistent view for buttons
@@ -391,13 +532,14 @@ async def setup_role_management_commands(bot):
     """Setup slash commands for role management"""
     
     @bot.tree.command(name="checkroles", description="Check all members for role combinations and apply them")
-    @app_commands.describe()
-    async def check_roles_slash(interaction: discord.Interaction):
+    @app_commands.describe(action="Start a new check, show progress, cancel it, resume an interrupted one, or preview the changes")
+    @app_commands.choices(action=[app_commands.Choice(name=action, value=action) for action in SWEEP_ACTIONS])
+    async def check_roles_slash(interaction: discord.Interaction, action: str = 'start'):
         """Slash command to check all members for role combinations"""
         await interaction.response.defer(ephemeral=True)
         
         # Check permissions
-        if not has_permission(interaction.user, ALLOWED_ROLES):
+        if not has_permission(interaction.user):
             await interaction.followup.send("❌ You don't have permission to check roles.", ephemeral=True)
             return
         
@@ -409,34 +551,53 @@ async def setup_role_management_commands(bot):
             await interaction.followup.send("❌ Role management system not initialized.", ephemeral=True)
             return
         
-        await interaction.followup.send("🔄 **Checking all members for role combinations...** This may take a while.", ephemeral=True)
+        async def report_result(job):
+            # Interaction tokens expire after 15 minutes; long sweeps report in the channel instead
+            embed = build_sweep_embed(job)
+            try:
+                await interaction.followup.send(embed=embed, ephemeral=True)
+            except discord.HTTPException:
+                await interaction.channel.send(f"{interaction.user.mention}", embed=embed)
         
         try:
-            results = await role_manager.check_all_members(interaction.guild)
-            
-            embed = discord.Embed(
-                title="✅ Role Check Complete",
-                color=0x00ff00,
-                timestamp=datetime.utcnow()
-            )
-            
-            embed.add_field(name="Members Processed", value=results['processed'], inline=True)
-            embed.add_field(name="Members Updated", value=results['updated'], inline=True)
-            embed.add_field(name="Errors", value=results['errors'], inline=True)
-            
-            await interaction.followup.send(embed=embed, ephemeral=True)
-            
+            content, embed = role_manager.handle_sweep_action(interaction.guild, action, on_complete=report_result)
+            await interaction.followup.send(content=content, embed=embed, ephemeral=True)
         except Exception as e:
             await interaction.followup.send(f"❌ **Error during role check:** {e}", ephemeral=True)
     
-    @bot.tree.command(name="rolecombo", description="Show current role combination configuration")
-    @app_commands.describe()
+    @bot.tree.command(name="rolestats", description="Show how many members have each role and role combination")
+    @app_commands.describe(
+        role="Count members with this role",
+        without="Only count members who don't have this role (use together with role)"
+    )
+    async def role_stats_slash(interaction: discord.Interaction, role: discord.Role = None, without: discord.Role = None):
+        """Slash command to show role population counters"""
+        await interaction.response.defer(ephemeral=True)
+        
+        # Check permissions
+        if not has_permission(interaction.user):
+            await interaction.followup.send("❌ You don't have permission to view role statistics.", ephemeral=True)
+            return
+        
+        if not role_manager:
+            await interaction.followup.send("❌ Role management system not initialized.", ephemeral=True)
+            return
+        
+        if without is not None and role is None:
+            await interaction.followup.send("❌ `without` needs a `role` to compare against.", ephemeral=True)
+            return
+        
+        await interaction.followup.send(embed=build_role_stats_embed(interaction.guild, role, without), ephemeral=True)
+    
+    rolecombo_group = app_commands.Group(name="rolecombo", description="View and edit automatic role combinations")
+    
+    @rolecombo_group.command(name="list", description="Show current role combination configuration")
     async def role_combo_slash(interaction: discord.Interaction):
         """Slash command to show role combinations"""
         await interaction.response.defer(ephemeral=True)
         
         # Check permissions
-        if not has_permission(interaction.user, ALLOWED_ROLES):
+        if not has_permission(interaction.user):
             await interaction.followup.send("❌ You don't have permission to view role combinations.", ephemeral=True)
             return
         
@@ -457,7 +618,7 @@ async def setup_role_management_commands(bot):
         if active_combos:
             active_text = ""
             for combo in active_combos:
-                required = " + ".join(combo['required_roles'])
+                required = describe_combination(combo)
                 target = combo['target_role']
                 remove_text = " (auto-remove)" if combo.get('remove_on_loss', True) else " (keep on loss)"
                 active_text += f"• **{combo['name']}**: `{required}` → `{target}`{remove_text}\n"
@@ -468,7 +629,7 @@ async def setup_role_management_commands(bot):
         if disabled_combos:
             disabled_text = ""
             for combo in disabled_combos:
-                required = " + ".join(combo['required_roles'])
+                required = describe_combination(combo)
                 target = combo['target_role']
                 disabled_text += f"• **{combo['name']}**: `{required}` → `{target}`\n"
             
@@ -477,10 +638,96 @@ async def setup_role_management_commands(bot):
         if not all_combos:
             embed.add_field(name="No Combinations", value="No role combinations are configured.", inline=False)
         
-        embed.set_footer(text="Edit config.py to modify role combinations")
+        queue = role_manager.update_queue.metrics()
+        embed.add_field(
+            name="📊 Update Queue",
+            value=(
+                f"Pending: {queue['depth']} • Running: {queue['running']}\n"
+                f"Processed: {queue['processed']} • Merged: {queue['coalesced']} • "
+                f"Dropped: {queue['dropped']} • Failed: {queue['failed']}"
+            ),
+            inline=False
+        )
+        
+        embed.set_footer(text="Use /rolecombo add, remove, enable or disable to edit combinations")
         
         await interaction.followup.send(embed=embed, ephemeral=True)
     
+    async def edit_combinations(interaction: discord.Interaction, edit):
+        """Apply a change to the rule store and hot-reload the compiled rules"""
+        await interaction.response.defer(ephemeral=True)
+        
+        if not has_permission(interaction.user):
+            await interaction.followup.send("❌ You don't have permission to edit role combinations.", ephemeral=True)
+            return
+        
+        if not role_manager:
+            await interaction.followup.send("❌ Role management system not initialized.", ephemeral=True)
+            return
+        
+        try:
+            message = edit(role_manager.rule_store)
+            role_manager.reload_rules()
+        except (ValueError, LookupError) as e:  # Includes ExpressionError
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+        except Exception as e:
+            logger.error(f"Failed to edit role combinations: {e}")
+            await interaction.followup.send(f"❌ **Error updating role combinations:** {e}", ephemeral=True)
+            return
+        
+        await interaction.followup.send(
+            f"{message}\n"
+            f"Members are updated as their roles change; use `/checkroles preview` to see who qualifies now.",
+            ephemeral=True
+        )
+    
+    @rolecombo_group.command(name="add", description="Add an automatic role combination")
+    @app_commands.describe(
+        name="Friendly name for the combination",
+        expression="Required roles, e.g. all(Verified, any(Booster, VIP), not(Muted)) or atleast(2, A, B, C)",
+        target_role="Role to assign when a member matches",
+        remove_on_loss="Remove the target role when the member stops matching"
+    )
+    async def role_combo_add(interaction: discord.Interaction, name: str, expression: str,
+                             target_role: discord.Role, remove_on_loss: bool = True):
+        """Slash command to add a role combination"""
+        def edit(store):
+            combo = store.add(name, expression, target_role.name, remove_on_loss=remove_on_loss)
+            return f"✅ **Added combination {combo['name']}:** `{describe_combination(combo)}` → `{combo['target_role']}`"
+        await edit_combinations(interaction, edit)
+    
+    @rolecombo_group.command(name="remove", description="Delete an automatic role combination")
+    @app_commands.describe(name="Name of the combination to delete")
+    async def role_combo_remove(interaction: discord.Interaction, name: str):
+        """Slash command to delete a role combination"""
+        def edit(store):
+            combo = store.remove(name)
+            return f"🗑️ **Removed combination {combo['name']}.** Roles it already granted are kept."
+        await edit_combinations(interaction, edit)
+    
+    @rolecombo_group.command(name="enable", description="Turn an automatic role combination on")
+    @app_commands.describe(name="Name of the combination to enable")
+    async def role_combo_enable(interaction: discord.Interaction, name: str):
+        """Slash command to enable a role combination"""
+        await edit_combinations(interaction, lambda store: f"✅ **Enabled combination {store.set_enabled(name, True)['name']}.**")
+    
+    @rolecombo_group.command(name="disable", description="Turn an automatic role combination off")
+    @app_commands.describe(name="Name of the combination to disable")
+    async def role_combo_disable(interaction: discord.Interaction, name: str):
+        """Slash command to disable a role combination"""
+        await edit_combinations(interaction, lambda store: f"⏸️ **Disabled combination {store.set_enabled(name, False)['name']}.**")
+    
+    @rolecombo_group.command(name="reload", description="Reload role combinations from the saved file")
+    async def role_combo_reload(interaction: discord.Interaction):
+        """Slash command to re-read hand-edited role combinations"""
+        def edit(store):
+            store.reload()
+            return f"🔄 **Reloaded {len(store.combinations)} combination(s) from disk.**"
+        await edit_combinations(interaction, edit)
+    
+    bot.tree.add_command(rolecombo_group)
+    
     @bot.tree.command(name="rolepanel", description="Send the self-service role check panel to this channel")
     @app_commands.describe(channel="Channel to send the role panel to (optional, defaults to current channel)")
     async def role_panel_slash(interaction: discord.Interaction, channel: discord.TextChannel = None):
@@ -488,7 +735,7 @@ async def setup_role_management_commands(bot):
         await interaction.response.defer(ephemeral=True)
         
         # Check permissions
-        if not has_permission(interaction.user, ALLOWED_ROLES):
+        if not has_permission(interaction.user):
             await interaction.followup.send("❌ You don't have permission to send role panels.", ephemeral=True)
             return
         
@@ -521,14 +768,27 @@ async def handle_member_update(before: discord.Member, after: discord.Member):
     if role_manager:
         await role_manager.handle_member_update(before, after)
 
+async def handle_member_join(member: discord.Member):
+    """Handle members joining the guild"""
+    if role_manager:
+        role_manager.stats.member_joined(member)
+
+async def handle_member_remove(member: discord.Member):
+    """Handle members leaving the guild"""
+    if role_manager:
+        role_manager.forget_member(member)
+
+async def catch_up_role_changes():
+    """Reconcile role changes missed while disconnected (on ready and on resume)"""
+    if role_manager:
+        await role_manager.catch_up()
+
 # Command functions for managing role combinations
 async def handle_check_roles_command(bot, message):
-    """Handle the !checkroles command to manually check all members"""
-    from utils import has_permission
-    from config import ALLOWED_ROLES
+    """Handle the !checkroles [start|status|cancel|resume|preview] command to check all members"""
     
     # Check permissions
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         await message.channel.send("❌ You don't have permission to check roles.", delete_after=5)
         return
     
@@ -540,33 +800,27 @@ async def handle_check_roles_command(bot, message):
         await message.channel.send("❌ Role management system not initialized.", delete_after=10)
         return
     
-    await message.channel.send("🔄 **Checking all members for role combinations...** This may take a while.")
+    parts = message.content.split()
+    action = parts[1].lower() if len(parts) > 1 else 'start'
+    if action not in SWEEP_ACTIONS:
+        await message.channel.send(f"Usage: `!checkroles [{'|'.join(SWEEP_ACTIONS)}]`")
+        return
+    
+    async def report_result(job):
+        await message.channel.send(embed=build_sweep_embed(job))
     
     try:
-        results = await role_manager.check_all_members(message.guild)
-        
-        embed = discord.Embed(
-            title="✅ Role Check Complete",
-            color=0x00ff00,
-            timestamp=datetime.utcnow()
-        )
-        
-        embed.add_field(name="Members Processed", value=results['processed'], inline=True)
-        embed.add_field(name="Members Updated", value=results['updated'], inline=True)
-        embed.add_field(name="Errors", value=results['errors'], inline=True)
-        
-        await message.channel.send(embed=embed)
+        content, embed = role_manager.handle_sweep_action(message.guild, action, on_complete=report_result, prefix='!')
+        await message.channel.send(content=content, embed=embed)
         
     except Exception as e:
         await message.channel.send(f"❌ **Error during role check:** {e}")
 
 async def handle_list_role_combos_command(bot, message):
     """Handle the !listrolecombo command to show active role combinations"""
-    from utils import has_permission
-    from config import ALLOWED_ROLES
     
     # Check permissions
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         await message.channel.send("❌ You don't have permission to view role combinations.", delete_after=5)
         return
     
@@ -587,7 +841,7 @@ async def handle_list_role_combos_command(bot, message):
     if active_combos:
         active_text = ""
         for combo in active_combos:
-            required = " + ".join(combo['required_roles'])
+            required = describe_combination(combo)
             target = combo['target_role']
             remove_text = " (auto-remove)" if combo.get('remove_on_loss', True) else " (keep on loss)"
             active_text += f"• **{combo['name']}**: `{required}` → `{target}`{remove_text}\n"
@@ -598,7 +852,7 @@ async def handle_list_role_combos_command(bot, message):
     if disabled_combos:
         disabled_text = ""
         for combo in disabled_combos:
-            required = " + ".join(combo['required_roles'])
+            required = describe_combination(combo)
             target = combo['target_role']
             disabled_text += f"• **{combo['name']}**: `{required}` → `{target}`\n"
         
@@ -607,17 +861,15 @@ async def handle_list_role_combos_command(bot, message):
     if not all_combos:
         embed.add_field(name="No Combinations", value="No role combinations are configured.", inline=False)
     
-    embed.set_footer(text="Edit config.py to modify role combinations")
+    embed.set_footer(text="Use /rolecombo add, remove, enable or disable to edit combinations")
     
     await message.channel.send(embed=embed)
 
 async def handle_role_panel_command(bot, message):
     """Handle the !rolepanel command to send the role check panel"""
-    from utils import has_permission
-    from config import ALLOWED_ROLES
     
     # Check permissions
-    if not has_permission(message.author, ALLOWED_ROLES):
+    if not has_permission(message.author):
         await message.channel.send("❌ You don't have permission to send role panels.", delete_after=5)
         return
     
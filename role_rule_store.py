@@ -0,0 +1,84 @@
+"""
+Auto-Role Rule Storage for Discord Bot
+Keeps role combinations in DATA_DIR so they can be edited without a restart
+"""
+
+import copy
+import logging
+from typing import Dict, List, Optional
+from config import AUTO_ROLE_COMBINATIONS
+from storage import data_path, load_json, save_json
+from role_expressions import parse_expression
+
+logger = logging.getLogger(__name__)
+
+class RoleRuleStore:
+    """Role combinations saved as JSON, seeded from config.py on first run
+
+    Each combination has a name, a target role, enabled and remove_on_loss
+    flags, and either an 'expression' or the older 'required_roles' list.
+    """
+
+    def __init__(self, path: Optional[str] = None, defaults: List[Dict] = AUTO_ROLE_COMBINATIONS):
+        self.path = path or data_path('auto_roles.json')
+        self.defaults = defaults
+        self.combinations: List[Dict] = []
+        self.reload()
+
+    def reload(self) -> List[Dict]:
+        """Re-read the file (e.g. after editing it by hand)"""
+        saved = load_json(self.path)
+        if saved is None:
+            self.combinations = copy.deepcopy(self.defaults)
+            self.save()
+            logger.info(f"Seeded {len(self.combinations)} role combination(s) from config.py into {self.path}")
+        else:
+            self.combinations = saved.get('combinations', [])
+        return self.combinations
+
+    def save(self):
+        save_json(self.path, {"combinations": self.combinations})
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Find a combination by name, ignoring case"""
+        for combo in self.combinations:
+            if combo['name'].lower() == name.lower():
+                return combo
+        return None
+
+    def add(self, name: str, expression: str, target_role: str, remove_on_loss: bool = True, enabled: bool = True) -> Dict:
+        """Add a combination; raises ValueError for a duplicate name or a bad expression"""
+        if self.get(name):
+            raise ValueError(f"A combination named '{name}' already exists")
+
+        parsed = parse_expression(expression)  # Raises ExpressionError (a ValueError)
+        combo = {
+            'name': name,
+            'expression': str(parsed),
+            'target_role': target_role,
+            'enabled': enabled,
+            'remove_on_loss': remove_on_loss,
+        }
+        self.combinations = [*self.combinations, combo]
+        self.save()
+        return combo
+
+    def remove(self, name: str) -> Dict:
+        combo = self._require(name)
+        self.combinations = [c for c in self.combinations if c is not combo]
+        self.save()
+        return combo
+
+    def set_enabled(self, name: str, enabled: bool) -> Dict:
+        combo = self._require(name)
+        updated = {**combo, 'enabled': enabled}
+        # Replace rather than mutate, so the live rule table only changes on reload
+        self.combinations = [updated if c is combo else c for c in self.combinations]
+        self.save()
+        return updated
+
+    def _require(self, name: str) -> Dict:
+        combo = self.get(name)
+        if combo is None:
+            raise LookupError(f"No combination named '{name}'")
+        return combo
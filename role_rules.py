@@ -0,0 +1,316 @@
+"""
+Auto-Role Rule Engine for Discord Bot
+Compiles auto-role combinations into bitmask rules with an inverted index
+"""
+
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+from role_index import role_index
+from role_expressions import ExpressionError, Predicate, RoleExpression, combination_expression
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True, eq=False)
+class RoleRule:
+    """A compiled role combination for one guild"""
+    name: str
+    expression: RoleExpression
+    role_id_of: Dict[str, int]  # Role name -> ID for every role the expression names
+    bit_of: Dict[str, int]  # Role name -> bit in the rule set's role masks
+    matches: Predicate  # Compiled expression over a role mask
+    target_role_id: int
+    target_role_name: str
+    target_bit: int
+    remove_on_loss: bool
+
+    @property
+    def role_ids(self) -> FrozenSet[int]:
+        return frozenset(self.role_id_of.values())
+
+    def unmet(self, bits: int) -> List[str]:
+        """What a member with this role mask is missing for the rule"""
+        return self.expression.unmet(bits, self.bit_of)
+
+@dataclass(frozen=True)
+class RuleDecision:
+    """What a rule wants done to a member's target role"""
+    rule: RoleRule
+    add: bool
+    lost_role_names: Tuple[str, ...] = ()
+
+@dataclass(frozen=True)
+class RuleStatus:
+    """Where a member stands on one rule"""
+    rule: RoleRule
+    has_target: bool
+    missing_role_names: Tuple[str, ...]
+
+    @property
+    def eligible(self) -> bool:
+        """Qualifies for the target role but doesn't have it yet"""
+        return not self.has_target and not self.missing_role_names
+
+AUDIT_REASON_LIMIT = 512  # Discord truncates longer audit log reasons
+
+class RoleChangePlan:
+    """The combined target-role changes for one member"""
+
+    def __init__(self, decisions: Iterable[RuleDecision]):
+        self.to_add: Dict[int, RuleDecision] = {}
+        self.to_remove: Dict[int, RuleDecision] = {}
+        for decision in decisions:
+            if decision.add:
+                self.to_add[decision.rule.target_role_id] = decision
+            else:
+                self.to_remove.setdefault(decision.rule.target_role_id, decision)
+
+        # If one rule grants a role another would take away, keep it
+        for role_id in self.to_add.keys() & self.to_remove.keys():
+            del self.to_remove[role_id]
+
+    def __bool__(self):
+        return bool(self.to_add or self.to_remove)
+
+    @property
+    def change_count(self) -> int:
+        return len(self.to_add) + len(self.to_remove)
+
+    def target_role_ids(self, current_role_ids: Iterable[int]) -> List[int]:
+        """The member's final role IDs once the plan is applied"""
+        final = [role_id for role_id in current_role_ids if role_id not in self.to_remove]
+        final.extend(role_id for role_id in self.to_add if role_id not in final)
+        return final
+
+    def audit_reason(self) -> str:
+        """One audit log reason covering every rule in the plan"""
+        parts = []
+        for decision in self.to_add.values():
+            required_names = decision.rule.expression.plain_role_names()
+            if required_names is not None:
+                parts.append(f"User has all required roles: {', '.join(required_names)}")
+            else:
+                parts.append(f"User matches {decision.rule.expression}")
+        for decision in self.to_remove.values():
+            parts.append(f"User lost required role(s): {', '.join(decision.lost_role_names)}")
+
+        reason = f"Auto-role: {'; '.join(parts)}"
+        if len(reason) > AUDIT_REASON_LIMIT:
+            reason = reason[:AUDIT_REASON_LIMIT - 3] + "..."
+        return reason
+
+class MemberRuleStatus:
+    """Every rule's status for one set of roles, with the grants it calls for"""
+
+    __slots__ = ('statuses', 'plan')
+
+    def __init__(self, statuses: Iterable[RuleStatus]):
+        self.statuses: Tuple[RuleStatus, ...] = tuple(statuses)
+        self.plan = RoleChangePlan(RuleDecision(status.rule, add=True) for status in self.statuses if status.eligible)
+
+STATUS_CACHE_SIZE = 4096
+
+class CompiledRuleSet:
+    """All enabled rules for a guild, indexed by the role IDs they depend on
+
+    Every role a rule refers to gets a bit, so a member's relevant roles fit
+    in one int and each rule is a compiled predicate over it.
+    """
+
+    def __init__(self, rules: Iterable[RoleRule], version: int, bit_of: Dict[int, int]):
+        self.rules: Tuple[RoleRule, ...] = tuple(rules)
+        self.version = version
+        self.bit_of = bit_of  # Role ID -> bit
+
+        by_role_id: Dict[int, List[RoleRule]] = {}
+        unconditional = []
+        for rule in self.rules:
+            # The target role is indexed too, so losing it re-runs the rule
+            for role_id in rule.role_ids | {rule.target_role_id}:
+                by_role_id.setdefault(role_id, []).append(rule)
+            if not rule.role_id_of:
+                unconditional.append(rule)
+
+        self.by_role_id: Dict[int, Tuple[RoleRule, ...]] = {
+            role_id: tuple(rules) for role_id, rules in by_role_id.items()
+        }
+        self.unconditional: Tuple[RoleRule, ...] = tuple(unconditional)
+        self.relevant_role_ids: FrozenSet[int] = frozenset(self.by_role_id)
+        self.status_cache: 'OrderedDict[int, MemberRuleStatus]' = OrderedDict()
+
+    def mask_of(self, role_ids: Iterable[int]) -> int:
+        """Pack the relevant roles out of a set of role IDs into a bitmask"""
+        bit_of = self.bit_of
+        mask = 0
+        for role_id in role_ids:
+            bit = bit_of.get(role_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def status_for(self, role_ids: Iterable[int]) -> MemberRuleStatus:
+        """Status of every rule for a member holding these roles
+
+        Results are cached by the member's fingerprint, the mask of their
+        roles the rules refer to, so members with the same relevant roles
+        share one entry.
+        """
+        fingerprint = self.mask_of(role_ids)
+        cached = self.status_cache.get(fingerprint)
+        if cached is not None:
+            self.status_cache.move_to_end(fingerprint)
+            return cached
+
+        status = MemberRuleStatus(
+            RuleStatus(
+                rule=rule,
+                has_target=bool(fingerprint & rule.target_bit),
+                missing_role_names=tuple(rule.unmet(fingerprint)),
+            )
+            for rule in self.rules
+        )
+        self.status_cache[fingerprint] = status
+        if len(self.status_cache) > STATUS_CACHE_SIZE:
+            self.status_cache.popitem(last=False)
+        return status
+
+    def affected_rules(self, changed_role_ids: Iterable[int]) -> List[RoleRule]:
+        """Rules that depend on at least one of the changed roles"""
+        affected = {}
+        for rule in self.unconditional:
+            affected[id(rule)] = rule
+        for role_id in changed_role_ids:
+            for rule in self.by_role_id.get(role_id, ()):
+                affected[id(rule)] = rule
+        return list(affected.values())
+
+def compile_rules(guild, combinations: Iterable[Dict]) -> CompiledRuleSet:
+    """Resolve role names in the combinations to role IDs and compile their expressions"""
+    version = role_index.version(guild)
+    resolved = []
+
+    for combo in combinations:
+        if not combo.get('enabled', False):
+            continue
+
+        try:
+            expression = combination_expression(combo)
+        except ExpressionError as e:
+            logger.error(f"Skipping combination '{combo['name']}': invalid expression: {e}")
+            continue
+
+        target_role = role_index.get_role(guild, combo['target_role'])
+        if target_role is None:
+            continue  # Reported once by the role index
+
+        role_id_of = {}
+        for role_name in expression.role_names():
+            role = role_index.get_role(guild, role_name)
+            if role is None:
+                break
+            role_id_of[role_name] = role.id
+        else:
+            resolved.append((combo, expression, role_id_of, target_role))
+            continue
+
+        # A role in the expression doesn't exist, so the combination can't be evaluated
+        logger.info(f"Skipping combination '{combo['name']}' in {guild.name}: a required role is missing")
+
+    # One bit per role any rule refers to
+    bit_of: Dict[int, int] = {}
+    for _, _, role_id_of, target_role in resolved:
+        for role_id in (*role_id_of.values(), target_role.id):
+            bit_of.setdefault(role_id, len(bit_of))
+
+    rules = []
+    for combo, expression, role_id_of, target_role in resolved:
+        rule_bits = {name: bit_of[role_id] for name, role_id in role_id_of.items()}
+        rules.append(RoleRule(
+            name=combo['name'],
+            expression=expression,
+            role_id_of=role_id_of,
+            bit_of=rule_bits,
+            matches=expression.compile(rule_bits),
+            target_role_id=target_role.id,
+            target_role_name=target_role.name,
+            target_bit=1 << bit_of[target_role.id],
+            remove_on_loss=combo.get('remove_on_loss', True),
+        ))
+
+    return CompiledRuleSet(rules, version, bit_of)
+
+class RoleRuleEngine:
+    """Evaluates compiled rules against the roles that changed on a member"""
+
+    def __init__(self, combinations: List[Dict]):
+        self.combinations = combinations
+        self.compiled: Dict[int, CompiledRuleSet] = {}
+
+    def rules_for(self, guild) -> CompiledRuleSet:
+        """Return the guild's compiled rules, recompiling after role changes"""
+        compiled = self.compiled.get(guild.id)
+        if compiled is None or compiled.version != role_index.version(guild):
+            compiled = self.compiled[guild.id] = compile_rules(guild, self.combinations)
+        return compiled
+
+    def evaluate(self, guild, old_role_ids: FrozenSet[int], new_role_ids: FrozenSet[int]) -> List[RuleDecision]:
+        """Decide which target roles to add or remove for a member's role change
+
+        Only rules touching the symmetric difference of the old and new roles
+        are checked, so the cost follows the number of roles that changed. A
+        full check of a member, with no earlier roles to compare, goes through
+        full_plan() instead.
+        """
+        compiled = self.rules_for(guild)
+        affected = compiled.affected_rules(old_role_ids ^ new_role_ids)
+        if not affected:
+            return []
+
+        old_bits = compiled.mask_of(old_role_ids)
+        new_bits = compiled.mask_of(new_role_ids)
+        decisions = []
+
+        for rule in affected:
+            matches = rule.matches(new_bits)
+            has_target_role = new_bits & rule.target_bit
+
+            # Case 1: User matches the rule and doesn't have target role yet
+            if matches and not has_target_role:
+                decisions.append(RuleDecision(rule, add=True))
+
+            # Case 2: User stopped matching and has target role (and removal is enabled)
+            elif not matches and has_target_role and rule.remove_on_loss and rule.matches(old_bits):
+                decisions.append(RuleDecision(rule, add=False, lost_role_names=tuple(rule.unmet(new_bits))))
+
+        return decisions
+
+    def status(self, guild, role_ids: Iterable[int]) -> MemberRuleStatus:
+        """Cached per-rule status for a member's current roles"""
+        return self.rules_for(guild).status_for(role_ids)
+
+    def plan(self, guild, old_role_ids: FrozenSet[int], new_role_ids: FrozenSet[int]) -> RoleChangePlan:
+        """Combine every rule decision into the member's final role changes"""
+        return RoleChangePlan(self.evaluate(guild, old_role_ids, new_role_ids))
+
+    def full_plan(self, guild, role_ids: Iterable[int]) -> RoleChangePlan:
+        """Grants from every rule for a member's current roles, as a full role check makes them
+
+        Unlike plan(), this doesn't depend on what changed, so rules on roles
+        the member lacks (e.g. not(X)) are checked too. It is the per-member
+        counterpart of MemberRoleBitmap.members_needing_change().
+        """
+        return self.rules_for(guild).status_for(role_ids).plan
+
+    def reload(self, combinations: List[Dict], guilds: Iterable = ()):
+        """Swap in new combinations, compiled for the given guilds before anything changes
+
+        The new table replaces the old one in a single assignment, so a member
+        update never sees a mix of old and new rules.
+        """
+        compiled = {guild.id: compile_rules(guild, combinations) for guild in guilds}
+        self.combinations, self.compiled = list(combinations), compiled
+
+    def invalidate(self):
+        """Drop every compiled rule set (e.g. after the combinations change)"""
+        self.compiled.clear()
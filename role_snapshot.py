@@ -0,0 +1,199 @@
+"""
+Auto-Role Snapshot for Discord Bot
+Remembers each member's combo-relevant roles so changes missed while offline can be caught up
+"""
+
+import time
+import array
+import bisect
+import asyncio
+import sqlite3
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+from config import ROLE_DRIFT_CHECK_INTERVAL, ROLE_DRIFT_CHECK_SLICE
+from storage import data_path
+from role_bitmap import member_role_ids
+
+logger = logging.getLogger(__name__)
+
+RoleIds = Tuple[int, ...]
+
+def pack_role_ids(role_ids: Iterable[int]) -> bytes:
+    """Sorted role IDs as a compact array of 64-bit ints"""
+    return array.array('Q', sorted(role_ids)).tobytes()
+
+def unpack_role_ids(blob: bytes) -> RoleIds:
+    role_ids = array.array('Q')
+    role_ids.frombytes(blob)
+    return tuple(role_ids)
+
+class RoleSnapshot:
+    """SQLite table of the relevant role IDs last seen for each member
+
+    Only roles referenced by a role combination are stored. Updates from
+    member events are buffered in memory and written in batches.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or data_path('role_snapshot.sqlite3')
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS member_roles ("
+            "guild_id INTEGER NOT NULL, member_id INTEGER NOT NULL, role_ids BLOB NOT NULL, "
+            "PRIMARY KEY (guild_id, member_id)) WITHOUT ROWID"
+        )
+        self.db.commit()
+        self.lock = asyncio.Lock()  # One thread uses the connection at a time
+        self.dirty: Dict[Tuple[int, int], Optional[RoleIds]] = {}  # None marks a deletion
+
+    def record(self, guild_id: int, member_id: int, role_ids: Iterable[int]):
+        """Buffer a member's current relevant roles"""
+        self.dirty[(guild_id, member_id)] = tuple(sorted(role_ids))
+
+    def forget(self, guild_id: int, member_id: int):
+        """Buffer the removal of a member who left"""
+        self.dirty[(guild_id, member_id)] = None
+
+    def pending(self, guild_id: int, member_id: int):
+        """Return (True, roles) if the member has an unflushed entry"""
+        key = (guild_id, member_id)
+        if key in self.dirty:
+            return True, self.dirty[key]
+        return False, None
+
+    def _load(self, guild_id: int, low: int, high: int) -> Dict[int, RoleIds]:
+        rows = self.db.execute(
+            "SELECT member_id, role_ids FROM member_roles WHERE guild_id = ? AND member_id BETWEEN ? AND ?",
+            (guild_id, low, high)
+        )
+        return {member_id: unpack_role_ids(blob) for member_id, blob in rows}
+
+    async def load(self, guild_id: int, low: int = 0, high: int = 2 ** 63 - 1) -> Dict[int, RoleIds]:
+        """Saved roles for the guild's members with IDs in [low, high]"""
+        async with self.lock:
+            return await asyncio.to_thread(self._load, guild_id, low, high)
+
+    def _write(self, changes):
+        upserts = [(guild_id, member_id, pack_role_ids(role_ids))
+                   for (guild_id, member_id), role_ids in changes.items() if role_ids is not None]
+        deletes = [key for key, role_ids in changes.items() if role_ids is None]
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO member_roles VALUES (?, ?, ?)", upserts)
+            self.db.executemany("DELETE FROM member_roles WHERE guild_id = ? AND member_id = ?", deletes)
+
+    async def flush(self):
+        """Write buffered changes to disk"""
+        if not self.dirty:
+            return
+        changes, self.dirty = self.dirty, {}
+        async with self.lock:
+            try:
+                await asyncio.to_thread(self._write, changes)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to save role snapshot: {e}")
+                for key, role_ids in changes.items():
+                    self.dirty.setdefault(key, role_ids)  # Retry on the next flush
+
+    def close(self):
+        self.db.close()
+
+class RoleReconciler:
+    """Catches up on role changes the bot didn't see
+
+    After a restart or a gateway gap the live member cache is compared with
+    the snapshot, and only members whose relevant roles differ are sent to
+    the role manager's update queue. A background drift check walks the
+    members in small ID-ordered slices to catch anything missed later.
+    """
+
+    def __init__(self, role_manager, snapshot: RoleSnapshot):
+        self.role_manager = role_manager
+        self.snapshot = snapshot
+        self.drift_cursors: Dict[int, int] = {}
+        self.drift_task: Optional[asyncio.Task] = None
+
+    def relevant_role_ids(self, guild):
+        return self.role_manager.rule_engine.rules_for(guild).relevant_role_ids
+
+    async def _diff(self, guild, members, saved: Dict[int, RoleIds]) -> int:
+        """Queue members whose relevant roles differ from the snapshot"""
+        relevant = self.relevant_role_ids(guild)
+        queue = self.role_manager.update_queue
+        queued = 0
+        for i, member in enumerate(members, 1):
+            if i % 1000 == 0:
+                await asyncio.sleep(0)
+
+            if member.bot:
+                continue
+            live = tuple(sorted(role_id for role_id in member_role_ids(member) if role_id in relevant))
+            has_pending, old = self.snapshot.pending(guild.id, member.id)
+            if not has_pending:
+                old = saved.get(member.id)
+            if old == live:
+                continue
+            if old is None and not live:
+                self.snapshot.record(guild.id, member.id, live)  # Nothing a rule could act on
+                continue
+
+            # Members never seen before are checked for grants only, like a full sweep
+            await queue.put((guild.id, member.id), (frozenset(old or ()), member))
+            queued += 1
+        return queued
+
+    async def reconcile_guild(self, guild) -> int:
+        """Diff every cached member of a guild against the snapshot"""
+        started = time.perf_counter()
+        saved = await self.snapshot.load(guild.id)
+
+        queued = await self._diff(guild, guild.members, saved)
+
+        # Members who left while the bot was offline
+        for member_id in saved.keys() - {member.id for member in guild.members}:
+            self.snapshot.forget(guild.id, member_id)
+        await self.snapshot.flush()
+
+        logger.info(
+            f"🔁 Role catch-up for {guild.name}: {queued} of {len(guild.members)} members changed "
+            f"while offline ({time.perf_counter() - started:.2f}s)"
+        )
+        return queued
+
+    async def reconcile_all(self, guilds):
+        for guild in guilds:
+            try:
+                await self.reconcile_guild(guild)
+            except Exception as e:
+                logger.error(f"Role catch-up failed for {guild.name}: {e}")
+
+    async def check_drift_slice(self, guild) -> int:
+        """Compare the next slice of members (by ID) with the snapshot"""
+        members = sorted((m for m in guild.members if not m.bot), key=lambda m: m.id)
+        if not members:
+            return 0
+
+        start = bisect.bisect_right([m.id for m in members], self.drift_cursors.get(guild.id, 0))
+        batch = members[start:start + ROLE_DRIFT_CHECK_SLICE]
+        if not batch:
+            batch = members[:ROLE_DRIFT_CHECK_SLICE]  # Wrap around
+        self.drift_cursors[guild.id] = batch[-1].id
+
+        saved = await self.snapshot.load(guild.id, batch[0].id, batch[-1].id)
+        queued = await self._diff(guild, batch, saved)
+        if queued:
+            logger.info(f"🔁 Drift check in {guild.name}: {queued} member(s) out of sync")
+        return queued
+
+    def start_drift_check(self, bot):
+        if self.drift_task is None or self.drift_task.done():
+            self.drift_task = asyncio.create_task(self._drift_loop(bot))
+
+    async def _drift_loop(self, bot):
+        while True:
+            await asyncio.sleep(ROLE_DRIFT_CHECK_INTERVAL)
+            for guild in bot.guilds:
+                try:
+                    await self.check_drift_slice(guild)
+                except Exception as e:
+                    logger.error(f"Role drift check failed for {guild.name}: {e}")
+            await self.snapshot.flush()
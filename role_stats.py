@@ -0,0 +1,166 @@
+"""
+Role Population Statistics for Discord Bot
+Counts members per role and per role combination, kept current from member events
+"""
+
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from config import ROLE_STATS_RECOUNT_INTERVAL
+from role_bitmap import member_role_ids
+
+logger = logging.getLogger(__name__)
+
+MATCHED, HOLDING, NEAR_MISS = range(3)
+
+def near_miss(rule, bits: int) -> bool:
+    """The member doesn't match the rule, but one more role would make them"""
+    if rule.matches(bits):
+        return False
+    for bit in rule.bit_of.values():
+        if not bits >> bit & 1 and rule.matches(bits | 1 << bit):
+            return True
+    return False
+
+class GuildRoleStats:
+    """Counters for one guild against one compiled rule set
+
+    role_counts covers every role. fingerprints counts members per mask of
+    the roles the rules refer to, which answers "has A but not B" questions
+    for those roles without touching the member list. Each rule keeps how
+    many members match it, hold its target role, and miss exactly one role.
+    """
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.members = 0
+        self.role_counts: Counter = Counter()
+        self.fingerprints: Counter = Counter()
+        self.combos: Dict[object, List[int]] = {rule: [0, 0, 0] for rule in compiled.rules}
+        self.counted_at = time.time()
+
+    def _count_rules(self, rules, bits: int, sign: int):
+        for rule in rules:
+            counts = self.combos[rule]
+            if rule.matches(bits):
+                counts[MATCHED] += sign
+            elif near_miss(rule, bits):
+                counts[NEAR_MISS] += sign
+            if bits & rule.target_bit:
+                counts[HOLDING] += sign
+
+    def _move_fingerprint(self, old_bits: Optional[int], new_bits: Optional[int]):
+        for bits, sign in ((old_bits, -1), (new_bits, 1)):
+            if bits is None:
+                continue
+            self.fingerprints[bits] += sign
+            if not self.fingerprints[bits]:
+                del self.fingerprints[bits]
+
+    def add_member(self, role_ids: Iterable[int], sign: int = 1):
+        """Count a member joining (sign=1) or leaving (sign=-1)"""
+        role_ids = list(role_ids)
+        self.members += sign
+        for role_id in role_ids:
+            self.role_counts[role_id] += sign
+        bits = self.compiled.mask_of(role_ids)
+        self._move_fingerprint(None if sign > 0 else bits, bits if sign > 0 else None)
+        self._count_rules(self.compiled.rules, bits, sign)
+
+    def update_member(self, old_role_ids: frozenset, new_role_ids: frozenset):
+        """Move a member's counts after a role change"""
+        changed = old_role_ids ^ new_role_ids
+        for role_id in changed:
+            self.role_counts[role_id] += 1 if role_id in new_role_ids else -1
+
+        old_bits = self.compiled.mask_of(old_role_ids)
+        new_bits = self.compiled.mask_of(new_role_ids)
+        if old_bits == new_bits:
+            return
+        self._move_fingerprint(old_bits, new_bits)
+
+        rules = [rule for rule in self.compiled.affected_rules(changed) if rule in self.combos]
+        self._count_rules(rules, old_bits, -1)
+        self._count_rules(rules, new_bits, 1)
+
+    def count_with(self, role_id: int, without_role_id: Optional[int] = None) -> Optional[int]:
+        """Members with one role and optionally without another, or None if not answerable here"""
+        if without_role_id is None:
+            return self.role_counts.get(role_id, 0)
+
+        bit_of = self.compiled.bit_of
+        if role_id not in bit_of or without_role_id not in bit_of:
+            return None
+        has, lacks = 1 << bit_of[role_id], 1 << bit_of[without_role_id]
+        return sum(count for bits, count in self.fingerprints.items() if bits & has and not bits & lacks)
+
+    def combo_counts(self):
+        """(rule, matched, holding target, missing exactly one) for every rule"""
+        return [(rule, *self.combos[rule]) for rule in self.compiled.rules]
+
+class RoleStatsTracker:
+    """Role counters for every guild, recounted occasionally to correct drift"""
+
+    def __init__(self, rule_engine):
+        self.rule_engine = rule_engine
+        self.guilds: Dict[int, GuildRoleStats] = {}
+        self.recount_task: Optional[asyncio.Task] = None
+
+    def _current(self, guild) -> Optional[GuildRoleStats]:
+        """The guild's counters, or None if they were never built or the rules changed"""
+        stats = self.guilds.get(guild.id)
+        if stats is None or stats.compiled is not self.rule_engine.rules_for(guild):
+            return None
+        return stats
+
+    def recount(self, guild) -> GuildRoleStats:
+        """Rebuild a guild's counters from the member cache"""
+        started = time.perf_counter()
+        stats = GuildRoleStats(self.rule_engine.rules_for(guild))
+        for member in guild.members:
+            if not member.bot:
+                stats.add_member(member_role_ids(member))
+
+        previous = self._current(guild)
+        self.guilds[guild.id] = stats
+        if previous is not None:
+            drift = sum(1 for role_id, count in stats.role_counts.items() if previous.role_counts.get(role_id, 0) != count)
+            drift += sum(1 for rule, *counts in stats.combo_counts() if previous.combos.get(rule) != counts)
+            if drift:
+                logger.info(f"📊 Role stats recount for {guild.name} corrected {drift} counter(s)")
+        logger.info(f"📊 Counted roles for {stats.members} members in {guild.name} ({time.perf_counter() - started:.2f}s)")
+        return stats
+
+    def stats_for(self, guild) -> GuildRoleStats:
+        return self._current(guild) or self.recount(guild)
+
+    def member_changed(self, guild, old_role_ids: frozenset, new_role_ids: frozenset):
+        stats = self._current(guild)
+        if stats is not None:
+            stats.update_member(old_role_ids, new_role_ids)  # Otherwise rebuilt on the next query
+
+    def member_joined(self, member):
+        stats = self._current(member.guild)
+        if stats is not None and not member.bot:
+            stats.add_member(member_role_ids(member))
+
+    def member_left(self, member):
+        stats = self._current(member.guild)
+        if stats is not None and not member.bot:
+            stats.add_member(member_role_ids(member), sign=-1)
+
+    def start_recounts(self, bot):
+        if self.recount_task is None or self.recount_task.done():
+            self.recount_task = asyncio.create_task(self._recount_loop(bot))
+
+    async def _recount_loop(self, bot):
+        while True:
+            await asyncio.sleep(ROLE_STATS_RECOUNT_INTERVAL)
+            for guild in bot.guilds:
+                try:
+                    self.recount(guild)
+                except Exception as e:
+                    logger.error(f"Role stats recount failed for {guild.name}: {e}")
+                await asyncio.sleep(0)
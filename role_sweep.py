@@ -0,0 +1,268 @@
+"""
+Bulk Role Sweep for Discord Bot
+Resumable background job that checks every member of a guild for auto-roles
+"""
+
+import time
+import asyncio
+import bisect
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional
+import discord
+from config import ROLE_SWEEP_WORKERS, ROLE_SWEEP_CHECKPOINT_INTERVAL
+from storage import data_path, load_json, save_json
+from role_bitmap import MemberRoleBitmap, member_role_ids
+from rest_scheduler import retry_after_from
+
+logger = logging.getLogger(__name__)
+
+class AdaptivePacer:
+    """Spaces out REST calls, backing off when Discord starts rate limiting
+
+    discord.py waits out rate-limit buckets internally, so a call that takes
+    much longer than usual means a bucket was exhausted. Those slow calls and
+    explicit 429s (with their Retry-After header) widen the interval; fast
+    calls narrow it again.
+    """
+
+    def __init__(self, min_interval=0.0, max_interval=10.0, slow_threshold=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.slow_threshold = slow_threshold
+        self.interval = min_interval
+        self.next_slot = 0.0
+
+    async def wait(self):
+        """Wait for the next free slot"""
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def record_success(self, elapsed):
+        """Adjust the interval after a completed call"""
+        if elapsed > self.slow_threshold:
+            self._back_off()
+        else:
+            self.interval = max(self.min_interval, self.interval - 0.05)
+
+    def record_rate_limit(self, retry_after):
+        """Hold every worker until the Retry-After window has passed"""
+        self._back_off()
+        self.next_slot = max(self.next_slot, time.monotonic() + retry_after)
+
+    def _back_off(self):
+        self.interval = min(self.max_interval, max(self.interval * 2, 0.25))
+
+class RoleSweepJob:
+    """Checks every member of a guild against the auto-role rules
+
+    Members are visited in ID order and only those whose roles need to change
+    are handed to a bounded pool of workers. The cursor saved to disk is the
+    highest member ID below which every member is finished, so a restarted or
+    cancelled sweep can resume where it stopped. A member x role bitmap picks
+    out the members that need a change before any request is made.
+    """
+
+    def __init__(self, role_manager, guild: discord.Guild, workers: int = ROLE_SWEEP_WORKERS,
+                 resume: bool = False, on_complete: Optional[Callable[['RoleSweepJob'], Awaitable[None]]] = None):
+        self.role_manager = role_manager
+        self.guild = guild
+        self.workers = max(1, workers)
+        self.on_complete = on_complete
+        self.state_path = data_path('role_sweeps', f'{guild.id}.json')
+        self.pacer = AdaptivePacer()
+
+        state = load_json(self.state_path, {}) if resume else {}
+        self.cursor = state.get('cursor', 0)
+        self.processed = 0
+        self.updated = state.get('updated', 0)
+        self.errors = state.get('errors', 0)
+        self.total = 0
+        self.status = 'pending'
+        self.started_at = None
+        self.finished_at = None
+
+        self.task: Optional[asyncio.Task] = None
+        self._dispatched = deque()  # Member IDs in the order they were visited
+        self._done = set()
+
+    @staticmethod
+    def saved_state(guild: discord.Guild):
+        """Return the checkpoint of an unfinished sweep, if any"""
+        state = load_json(data_path('role_sweeps', f'{guild.id}.json'))
+        if state and state.get('status') in ('running', 'cancelled'):
+            return state
+        return None
+
+    @property
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self) -> 'RoleSweepJob':
+        """Run the sweep in the background"""
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    def cancel(self) -> bool:
+        """Stop the sweep; its cursor is kept so it can be resumed"""
+        if not self.is_running:
+            return False
+        self.task.cancel()
+        return True
+
+    async def wait(self):
+        """Wait for the sweep to finish"""
+        if self.task:
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def results(self):
+        return {"processed": self.processed, "updated": self.updated, "errors": self.errors}
+
+    def progress(self):
+        """Snapshot of the sweep's progress for status commands"""
+        elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0
+        return {
+            **self.results(),
+            "status": self.status,
+            "total": self.total,
+            "cursor": self.cursor,
+            "elapsed": elapsed,
+            "rate": self.processed / elapsed if elapsed else 0.0,
+            "interval": self.pacer.interval,
+        }
+
+    def checkpoint(self):
+        """Save the resumable cursor and counters"""
+        try:
+            save_json(self.state_path, {
+                "guild_id": self.guild.id,
+                "status": self.status,
+                "cursor": self.cursor,
+                "updated": self.updated,
+                "errors": self.errors,
+            })
+        except OSError as e:
+            logger.error(f"Failed to save role sweep checkpoint for {self.guild.name}: {e}")
+
+    def _mark_done(self, member_id: int):
+        self.processed += 1
+        self._done.add(member_id)
+        while self._dispatched and self._dispatched[0] in self._done:
+            self.cursor = self._dispatched.popleft()
+            self._done.discard(self.cursor)
+
+    async def run(self):
+        self.status = 'running'
+        self.started_at = time.monotonic()
+        members = sorted((m for m in self.guild.members if not m.bot), key=lambda m: m.id)
+        start = bisect.bisect_right([m.id for m in members], self.cursor)
+        remaining = members[start:]
+        self.total = len(members)
+        self.processed = start  # Everyone up to the cursor was finished by an earlier run
+
+        queue = asyncio.Queue(maxsize=self.workers * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.workers)]
+        checkpointer = asyncio.create_task(self._checkpoint_loop())
+        engine = self.role_manager.rule_engine
+
+        try:
+            # One vectorized pass finds the members that actually need a change
+            compiled = engine.rules_for(self.guild)
+            candidates = MemberRoleBitmap.for_rules(remaining, compiled).members_needing_change(compiled)
+            self.processed += len(remaining) - len(candidates)
+            disagreements = 0
+            logger.info(
+                f"Role sweep for {self.guild.name}: {len(candidates)} of {len(remaining)} members "
+                f"need changes (cursor {self.cursor})"
+            )
+
+            for i, index in enumerate(candidates, 1):
+                member = remaining[index]
+                self._dispatched.append(member.id)
+                try:
+                    plan = engine.full_plan(self.guild, member_role_ids(member))
+                except Exception as e:
+                    logger.error(f"Error checking member {member}: {e}")
+                    self.errors += 1
+                    self._mark_done(member.id)
+                    continue
+
+                if plan:
+                    await queue.put((member, plan))  # Blocks while the workers are busy
+                else:
+                    # The bitmap and the rules should agree on who needs a change
+                    disagreements += 1
+                    self._mark_done(member.id)
+
+                if i % 500 == 0:
+                    await asyncio.sleep(0)  # Let the gateway breathe on large guilds
+
+            await queue.join()
+            if disagreements:
+                logger.warning(
+                    f"Role sweep for {self.guild.name}: {disagreements} bitmap candidate(s) had nothing to change"
+                )
+            if members:
+                self.cursor = members[-1].id
+            self.status = 'completed'
+        except asyncio.CancelledError:
+            self.status = 'cancelled'
+            raise
+        except Exception as e:
+            logger.error(f"Role sweep for {self.guild.name} failed: {e}")
+            self.status = 'failed'
+        finally:
+            for task in (*workers, checkpointer):
+                task.cancel()
+            self.finished_at = time.monotonic()
+            self.checkpoint()
+            logger.info(f"Role sweep for {self.guild.name} {self.status}: {self.results()}")
+            if self.on_complete:
+                asyncio.create_task(self._notify())
+
+    async def _notify(self):
+        try:
+            await self.on_complete(self)
+        except Exception as e:
+            logger.error(f"Failed to report role sweep result: {e}")
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            member, plan = await queue.get()
+            try:
+                await self._apply(member, plan)
+            finally:
+                self._mark_done(member.id)
+                queue.task_done()
+
+    async def _apply(self, member, plan, retries=1):
+        await self.pacer.wait()
+        started = time.monotonic()
+        try:
+            roles_added, roles_removed = await self.role_manager.apply_role_plan(member, plan)
+        except discord.HTTPException as e:
+            if e.status == 429 and retries > 0:
+                self.pacer.record_rate_limit(retry_after_from(e))
+                return await self._apply(member, plan, retries - 1)
+            logger.error(f"Error updating member {member}: {e}")
+            self.errors += 1
+            return
+        except Exception as e:
+            logger.error(f"Error updating member {member}: {e}")
+            self.errors += 1
+            return
+
+        self.pacer.record_success(time.monotonic() - started)
+        if roles_added or roles_removed:
+            self.updated += 1
+            await self.role_manager.log_role_changes(member, roles_added, roles_removed)
+        else:
+            self.errors += 1  # apply_role_plan already logged the failure
+
+    async def _checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(ROLE_SWEEP_CHECKPOINT_INTERVAL)
+            self.checkpoint()
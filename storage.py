@@ -0,0 +1,42 @@
+"""
+Local Storage Helpers for Discord Bot
+Small JSON files under DATA_DIR for state that should survive restarts
+"""
+
+import os
+import json
+import logging
+from config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+def data_path(*parts):
+    """Return a path inside DATA_DIR, creating its parent directory"""
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def load_json(path, default=None):
+    """Read a JSON file, returning default if it is missing or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to read {path}: {e}")
+        return default
+
+def save_json(path, data):
+    """Write a JSON file atomically so a crash never leaves it half-written"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def delete_file(path):
+    """Remove a file if it exists"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,67 @@
+"""
+Tests for routing messages to interactive prompts
+"""
+
+import asyncio
+from types import SimpleNamespace
+import pytest
+from conversations import ConversationRouter
+
+def message(content, author_id=1, channel_id=10):
+    return SimpleNamespace(content=content, author=SimpleNamespace(id=author_id), channel=SimpleNamespace(id=channel_id))
+
+def test_reply_goes_to_the_waiting_prompt_only():
+    async def run():
+        router = ConversationRouter()
+        waiter = asyncio.create_task(router.wait_for_reply(10, 1, timeout=1))
+        await asyncio.sleep(0)
+        assert not router.feed(message("other user", author_id=2))
+        assert not router.feed(message("other channel", channel_id=11))
+        assert router.feed(message("yes"))
+        assert (await waiter).content == "yes"
+
+    asyncio.run(run())
+
+def test_single_reply_prompt_lets_later_messages_through():
+    async def run():
+        router = ConversationRouter()
+        waiter = asyncio.create_task(router.wait_for_reply(10, 1, timeout=1))
+        await asyncio.sleep(0)
+        assert router.feed(message("first"))
+        assert not router.feed(message("second"))  # Not swallowed while the prompt closes
+        assert (await waiter).content == "first"
+
+    asyncio.run(run())
+
+def test_messages_failing_the_check_pass_through():
+    async def run():
+        router = ConversationRouter()
+        async with router.open(10, 1, timeout=1, check=lambda m: m.content.isdigit()) as conversation:
+            assert not router.feed(message("just chatting"))
+            assert router.feed(message("42"))
+            assert (await conversation.next_message()).content == "42"
+        assert not router.sessions
+
+    asyncio.run(run())
+
+def test_prompt_times_out_and_cancel_wakes_waiters():
+    async def run():
+        router = ConversationRouter()
+        with pytest.raises(asyncio.TimeoutError):
+            await router.wait_for_reply(10, 1, timeout=0.01)
+
+        waiter = asyncio.create_task(router.wait_for_reply(10, 1, timeout=5))
+        await asyncio.sleep(0)
+        assert router.cancel(channel_id=10) == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await waiter
+
+    asyncio.run(run())
+
+def test_forum_guard_runs_before_prompts(monkeypatch):
+    import Main
+    monkeypatch.setattr(Main, 'FORUM_CHANNEL_ID', 99)
+    _, thread_routes, default_route = Main.build_channel_routes()
+    forum_route = thread_routes[99]
+    assert forum_route.index(Main.enforce_forum_restrictions) < forum_route.index(Main.route_conversations)
+    assert Main.route_conversations in default_route
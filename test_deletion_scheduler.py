@@ -0,0 +1,102 @@
+"""
+Tests for the timer wheel behind timed message deletions
+"""
+
+import asyncio
+from types import SimpleNamespace
+import discord
+import deletion_scheduler as deletion_module
+from deletion_scheduler import DeletionScheduler
+from rest_scheduler import Priority
+
+class Channel:
+    def __init__(self, channel_id, error=None):
+        self.id = channel_id
+        self.bulk = []
+        self.error = error
+
+    async def delete_messages(self, messages):
+        if self.error is not None:
+            raise self.error
+        self.bulk.append([m.id for m in messages])
+
+def message(message_id, channel, deleted=None):
+    async def delete():
+        if deleted is not None:
+            deleted.append(message_id)
+    return SimpleNamespace(id=message_id, channel=channel, created_at=discord.utils.utcnow(), delete=delete)
+
+class RecordingScheduler:
+    def __init__(self):
+        self.priorities = []
+
+    async def call(self, priority, route, factory):
+        self.priorities.append(priority)
+        return await factory()
+
+def fake_clock(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(deletion_module, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+    return clock
+
+def test_deletions_fall_due_on_time_across_wheel_levels(monkeypatch):
+    clock = fake_clock(monkeypatch)
+
+    async def run():
+        scheduler = DeletionScheduler(tick=0.25)
+        channel = Channel(1)
+        # One slot on level 0, then delays that cascade from levels 1 and 2
+        delays = {1: 0.5, 2: 30, 3: 1500, 4: 1500.1}
+        for message_id, delay in delays.items():
+            scheduler.schedule(message(message_id, channel), delay)
+        scheduler.schedule(message(1, channel), 900)  # Already pending: keeps the first time
+        scheduler.task.cancel()
+
+        due_at = {}
+        while scheduler.pending and clock[0] < 2000:
+            clock[0] += 0.25
+            for deletion in scheduler.take_due():
+                due_at[deletion.message.id] = clock[0]
+        assert set(due_at) == set(delays)
+        for message_id, delay in delays.items():
+            assert delay <= due_at[message_id] <= delay + 0.25
+
+    asyncio.run(run())
+
+def test_flush_groups_by_channel_and_priority(monkeypatch):
+    recorder = RecordingScheduler()
+    monkeypatch.setattr(deletion_module, 'rest_scheduler', recorder)
+
+    async def run():
+        scheduler = DeletionScheduler()
+        first, second = Channel(1), Channel(2)
+        deleted = []
+        due = [deletion_module.PendingDeletion(message(i, first), 0, Priority.ENFORCE) for i in range(3)]
+        due.append(deletion_module.PendingDeletion(message(10, first, deleted), 0))
+        due.append(deletion_module.PendingDeletion(message(20, second, deleted), 0))
+        await scheduler._flush(due)
+
+        assert first.bulk == [[0, 1, 2]]
+        assert sorted(deleted) == [10, 20]  # Alone in their batch, so single deletes
+        assert sorted(recorder.priorities) == [Priority.ENFORCE, Priority.BACKGROUND, Priority.BACKGROUND]
+        assert scheduler.metrics()['deleted'] == 5
+
+    asyncio.run(run())
+
+def test_run_loop_survives_a_failed_flush(monkeypatch):
+    monkeypatch.setattr(deletion_module, 'rest_scheduler', RecordingScheduler())
+
+    async def run():
+        scheduler = DeletionScheduler(tick=0.01)
+        broken, healthy = Channel(1, error=RuntimeError("boom")), Channel(2)
+        scheduler.schedule(message(1, broken))
+        scheduler.schedule(message(2, broken))
+        await asyncio.sleep(0.05)
+        scheduler.schedule(message(3, healthy))
+        scheduler.schedule(message(4, healthy))
+        await asyncio.sleep(0.05)
+        assert not scheduler.task.done()
+        assert healthy.bulk == [[3, 4]]
+        scheduler.task.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,78 @@
+"""
+Tests for the moderation DM outbox
+"""
+
+import asyncio
+from types import SimpleNamespace
+import discord
+import pytest
+import dm_outbox as dm_outbox_module
+from dm_outbox import DMOutbox
+from rest_scheduler import RestScheduler
+from utils import dm_dedupe_key
+
+class FakeChannel:
+    def __init__(self, error=None):
+        self.id = 50
+        self.sent = []
+        self.error = error
+
+    async def send(self, embed=None):
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        self.sent.append(embed)
+
+def fake_user(user_id=1, error=None):
+    return SimpleNamespace(id=user_id, dm_channel=FakeChannel(error))
+
+def run_with_outbox(test, monkeypatch):
+    async def run():
+        monkeypatch.setattr(dm_outbox_module, 'rest_scheduler', RestScheduler(concurrency=2, reserved=0))
+        await test(DMOutbox(interval=0))
+
+    asyncio.run(run())
+
+def test_dedupe_key_tells_actions_apart():
+    timeout = dm_dedupe_key("Timed out", "Guild", "spam", "1h")
+    assert timeout == dm_dedupe_key("Timed out", "Guild", "spam", "1h")
+    assert timeout != dm_dedupe_key("Timed out", "Guild", "spam", "2h")
+    assert timeout != dm_dedupe_key("Timed out", "Guild", "raiding", "1h")
+    assert dm_dedupe_key("Warned", "Guild") != dm_dedupe_key("Banned", "Guild")
+
+def test_concurrent_duplicates_share_one_send(monkeypatch):
+    async def test(outbox):
+        user = fake_user()
+        key = dm_dedupe_key("Warned", "Guild", "spam")
+        results = await asyncio.gather(*(outbox.send(user, discord.Embed(), key=key) for _ in range(3)))
+        assert results == [True, True, True]
+        assert len(user.dm_channel.sent) == 1
+        assert outbox.metrics()['deduped'] == 2
+
+        assert await outbox.send(user, discord.Embed(), key=dm_dedupe_key("Warned", "Guild", "other"))
+        assert len(user.dm_channel.sent) == 2
+
+    run_with_outbox(test, monkeypatch)
+
+def test_duplicates_of_a_send_that_raised_get_false(monkeypatch):
+    async def test(outbox):
+        user = fake_user(error=RuntimeError("boom"))
+        first = asyncio.create_task(outbox.send(user, discord.Embed(), key="k"))
+        await asyncio.sleep(0)
+        duplicate = asyncio.create_task(outbox.send(user, discord.Embed(), key="k"))
+        with pytest.raises(RuntimeError):
+            await first
+        assert await duplicate is False
+
+    run_with_outbox(test, monkeypatch)
+
+def test_closed_dms_are_skipped_without_a_request(monkeypatch):
+    async def test(outbox):
+        response = SimpleNamespace(status=403, reason='Forbidden')
+        user = fake_user(error=discord.Forbidden(response, 'Cannot send messages to this user'))
+        assert not await outbox.send(user, discord.Embed(), key="a")
+        assert not await outbox.send(user, discord.Embed(), key="b")
+        assert outbox.metrics()['closed_hits'] == 1
+        assert outbox.metrics()['failed'] == 1
+
+    run_with_outbox(test, monkeypatch)
@@ -0,0 +1,43 @@
+"""
+Tests for the log channel writer
+"""
+
+import io
+import asyncio
+from types import SimpleNamespace
+import aiohttp
+import discord
+from log_writer import LogEntry, LogWriter
+from evidence_store import EvidenceStore
+
+def test_failed_send_releases_upload_claims_and_closes_files(tmp_path):
+    async def run():
+        store = EvidenceStore(root=str(tmp_path))
+        claim, owned = store.claim_upload('abc')
+        assert owned
+        evidence = SimpleNamespace(sha256='abc', transformed=False)
+
+        writer = LogWriter(SimpleNamespace(get_channel=lambda channel_id: None), 1)
+        sent = []
+
+        async def send(**kwargs):
+            if 'files' in kwargs:
+                raise aiohttp.ClientConnectionError("connection reset")
+            sent.append(kwargs)
+            return SimpleNamespace(jump_url='https://discord.com/channels/1/1/2', attachments=[])
+
+        writer._send = send
+        buffer = io.BytesIO(b'evidence')
+        upload = LogEntry(
+            content="Evidence 1", files=[discord.File(buffer, filename='a.png')],
+            on_done=lambda message: store.record_upload([evidence], message, {'abc': claim})
+        )
+        after = LogEntry(content="next entry")
+        await writer._process([upload, after])
+
+        assert claim.done() and claim.result() is None
+        assert 'abc' not in store.uploading
+        assert buffer.closed
+        assert sent == [{'content': 'next entry', 'embed': None}]  # The rest of the batch still goes out
+
+    asyncio.run(run())
@@ -0,0 +1,68 @@
+"""
+Tests for the moderation action pipeline
+"""
+
+import asyncio
+from types import SimpleNamespace
+from moderation_pipeline import ModerationContext
+
+def make_context(**kwargs):
+    fields = dict(
+        action='warn', target=SimpleNamespace(id=2), moderator=SimpleNamespace(id=1),
+        guild=SimpleNamespace(id=3, name="Guild"), reason="spam", origin=None,
+    )
+    return ModerationContext(**{**fields, **kwargs})
+
+def test_context_is_slotted():
+    ctx = make_context()
+    assert not hasattr(ctx, '__dict__')
+    assert ctx.mentions == [ctx.target]
+
+class RecordingScheduler:
+    def __init__(self):
+        self.calls = []
+
+    async def call(self, priority, route, factory):
+        self.calls.append(priority)
+        return await factory()
+
+def test_enforcement_does_not_wait_out_the_dm_queue(monkeypatch):
+    import moderation_pipeline
+    from moderation_pipeline import ModerationPipeline, DM_PENDING
+
+    delivered = []
+
+    async def slow_dm(user, *args, **kwargs):
+        await asyncio.sleep(0.2)  # Far behind in the paced DM outbox
+        delivered.append(user.id)
+        return True
+
+    async def no_op(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(moderation_pipeline, 'notify_user_dm', slow_dm)
+    monkeypatch.setattr(moderation_pipeline, 'rest_scheduler', RecordingScheduler())
+    monkeypatch.setattr(moderation_pipeline, 'log_action', no_op)
+    monkeypatch.setattr(moderation_pipeline, 'safe_send_message', no_op)
+    monkeypatch.setattr(moderation_pipeline, 'DM_ENFORCE_WAIT', 0.01)
+
+    async def run():
+        pipeline = ModerationPipeline()
+        kicked = []
+
+        async def kick(member, reason=None):
+            kicked.append(member.id)
+
+        ctx = make_context(
+            action='kick', target=SimpleNamespace(id=2, mention="<@2>"),
+            guild=SimpleNamespace(id=3, name="Guild", kick=kick),
+            origin=SimpleNamespace(channel=SimpleNamespace(id=4)),
+        )
+        result = await pipeline.execute(None, ctx)
+
+        assert kicked == [2] and result.dm_sent == DM_PENDING
+        assert result.latency < 0.2
+        await asyncio.gather(*pipeline.background)
+        assert delivered == [2]  # The DM still went out
+
+    asyncio.run(run())
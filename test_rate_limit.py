@@ -0,0 +1,95 @@
+"""
+Tests for the GCRA rate limiter and command cooldowns
+"""
+
+import asyncio
+from types import SimpleNamespace
+import pytest
+import command_router
+from rate_limit import RateLimit, RateLimiter, RateLimitRegistry, format_retry_after
+from command_router import CommandRegistry
+
+def test_burst_then_sustained_rate():
+    limiter = RateLimiter(RateLimit(5, 10, burst=3))  # One use per 2s, three back to back
+    assert [limiter.hit(1, now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.hit(1, now=0.0) == pytest.approx(2.0)
+    assert limiter.retry_after(1, now=1.0) == pytest.approx(1.0)
+    assert limiter.hit(1, now=2.0) == 0.0
+    assert limiter.hit(1, now=2.5) == pytest.approx(1.5)
+    assert limiter.hit(2, now=2.5) == 0.0  # Keys are independent
+
+def test_refused_hits_do_not_extend_the_cooldown():
+    limiter = RateLimiter(RateLimit(1, 60))
+    assert limiter.hit(1, now=0.0) == 0.0
+    for now in (10.0, 20.0, 30.0):
+        assert limiter.hit(1, now=now) == pytest.approx(60.0 - now)
+    assert limiter.hit(1, now=60.0) == 0.0
+
+def test_expired_keys_are_evicted_and_max_keys_holds():
+    limiter = RateLimiter(RateLimit(1, 1), max_keys=10)
+    for key in range(100):
+        limiter.hit(key, now=float(key))  # Each key expires a second after its hit
+    assert len(limiter) <= 3
+
+    crowded = RateLimiter(RateLimit(1, 3600), max_keys=10)
+    for key in range(100):
+        crowded.hit(key, now=0.0)
+    assert len(crowded) <= 11
+
+def test_snapshot_restore_discounts_downtime():
+    limiter = RateLimiter(RateLimit(1, 60))
+    limiter.hit(7, now=0.0)
+    snapshot = limiter.snapshot(now=10.0)
+    restored = RateLimiter(RateLimit(1, 60))
+    restored.restore(snapshot, elapsed=20.0, now=100.0)
+    assert restored.retry_after(7, now=100.0) == pytest.approx(30.0)
+
+def test_warns_once_per_cooldown():
+    limiter = RateLimiter(RateLimit(1, 60))
+    assert limiter.should_warn(1, 60.0, now=0.0)
+    assert not limiter.should_warn(1, 50.0, now=10.0)
+    assert limiter.should_warn(1, 60.0, now=61.0)
+
+def test_format_retry_after():
+    assert format_retry_after(0.2) == "1 second"
+    assert format_retry_after(59.5) == "1m"
+    assert format_retry_after(125) == "2m 5s"
+
+class FakeChannel:
+    def __init__(self):
+        self.id = 5
+        self.sent = []
+
+    async def send(self, content, delete_after=None):
+        self.sent.append(content)
+
+def test_commands_throttle_refusals_and_cooldowns(monkeypatch):
+    monkeypatch.setattr(command_router, 'rate_limits', RateLimitRegistry(snapshot=False))
+
+    async def run():
+        channel = FakeChannel()
+        ran = []
+        is_mod = lambda user: user.id == 1
+
+        async def handler(bot, message):
+            if not is_mod(message.author):
+                await message.channel.send("❌ You don't have permission to use this command.")
+                return
+            ran.append(message.author.id)
+
+        registry = CommandRegistry(default_limit=RateLimit(1, 60), permission=is_mod)
+        registry.register("ban", handler)
+
+        def message(author_id):
+            return SimpleNamespace(content="!ban", author=SimpleNamespace(id=author_id, mention=f"<@{author_id}>"), channel=channel)
+
+        for _ in range(10):
+            await registry.dispatch(None, message(2))  # Not a moderator
+        assert len(channel.sent) == 1  # One refusal for the whole burst
+
+        for _ in range(3):
+            await registry.dispatch(None, message(1))
+        assert ran == [1]  # Refusals didn't use up the moderator's cooldown
+        assert len(channel.sent) == 2  # One slow-down warning for the whole cooldown
+
+    asyncio.run(run())
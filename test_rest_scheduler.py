@@ -0,0 +1,101 @@
+"""
+Tests for the outbound REST scheduler
+"""
+
+import asyncio
+from types import SimpleNamespace
+import discord
+from rest_scheduler import (
+    RestScheduler, Priority, Route, parse_path,
+    ban_route, member_route, channel_route, followup_route
+)
+
+GUILD = SimpleNamespace(id=10)
+
+def http_error(status, headers):
+    response = SimpleNamespace(status=status, reason='error', headers=headers)
+    return discord.HTTPException(response, 'error')
+
+def test_parse_path_matches_route_helpers():
+    assert parse_path('put', '/api/v10/guilds/10/bans/99') == ban_route(GUILD, 'PUT')
+    assert parse_path('PATCH', '/api/v10/guilds/10/members/99') == member_route(GUILD)
+    assert parse_path('POST', '/api/v10/channels/5/messages') == channel_route(SimpleNamespace(id=5))
+    interaction = SimpleNamespace(application_id=7, token='abc')
+    assert parse_path('POST', '/api/v10/webhooks/7/abc') == followup_route(interaction)
+
+def test_exhausted_member_bucket_does_not_block_bans():
+    async def run():
+        scheduler = RestScheduler(concurrency=1, reserved=0)
+        scheduler.observe('PATCH', '/api/v10/guilds/10/members/1', 200, {
+            'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': '5', 'X-RateLimit-Bucket': 'members',
+        })
+        ran = []
+
+        async def call(name):
+            ran.append(name)
+
+        edit = asyncio.create_task(scheduler.call(Priority.BACKGROUND, member_route(GUILD), lambda: call('edit')))
+        await asyncio.wait_for(scheduler.call(Priority.ENFORCE, ban_route(GUILD, 'PUT'), lambda: call('ban')), 1)
+        assert ran == ['ban']
+        assert scheduler.metrics()['parked'] == 1
+        edit.cancel()
+    asyncio.run(run())
+
+def test_learned_bucket_hash_is_shared_between_templates():
+    scheduler = RestScheduler()
+    for method, path in (('PATCH', '/api/v10/guilds/10/members/1'), ('PUT', '/api/v10/guilds/10/members/1/roles/2')):
+        scheduler.observe(method, path, 200, {'X-RateLimit-Remaining': '3', 'X-RateLimit-Bucket': 'shared'})
+    assert scheduler.bucket_key(member_route(GUILD)) == ('shared', 10)
+    assert scheduler.bucket_key(Route('PUT', '/guilds/{id}/members/{id}/roles/{id}', 10)) == ('shared', 10)
+
+def test_reserved_worker_runs_enforcement_while_background_is_busy():
+    async def run():
+        scheduler = RestScheduler(concurrency=2, reserved=1)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+
+        background = [
+            asyncio.create_task(scheduler.call(Priority.BACKGROUND, member_route(SimpleNamespace(id=i)), slow))
+            for i in range(4)
+        ]
+        await asyncio.sleep(0)
+
+        async def ban():
+            return 'banned'
+
+        assert await asyncio.wait_for(scheduler.call(Priority.ENFORCE, ban_route(GUILD, 'PUT'), ban), 1) == 'banned'
+        release.set()
+        await asyncio.gather(*background)
+    asyncio.run(run())
+
+def test_rate_limited_call_is_retried_after_retry_after():
+    async def run():
+        scheduler = RestScheduler(concurrency=1, reserved=0)
+        attempts = []
+
+        async def flaky():
+            attempts.append(asyncio.get_running_loop().time())
+            if len(attempts) == 1:
+                raise http_error(429, {'Retry-After': '0.1'})
+            return 'ok'
+
+        assert await scheduler.call(Priority.LOG, channel_route(SimpleNamespace(id=1)), flaky) == 'ok'
+        assert attempts[1] - attempts[0] >= 0.09
+        assert scheduler.metrics()['rate_limited'] == 1
+    asyncio.run(run())
+
+def test_other_errors_reach_the_caller():
+    async def run():
+        scheduler = RestScheduler()
+
+        async def forbidden():
+            raise discord.Forbidden(SimpleNamespace(status=403, reason='Forbidden', headers={}), 'no')
+
+        try:
+            await scheduler.call(Priority.DM, channel_route(SimpleNamespace(id=1)), forbidden)
+        except discord.Forbidden:
+            return
+        raise AssertionError("Forbidden was swallowed")
+    asyncio.run(run())
@@ -0,0 +1,74 @@
+"""
+Tests for the auto-role rule engine and the member x role bitmap
+"""
+
+import random
+from types import SimpleNamespace
+import pytest
+from role_rules import RoleRuleEngine
+from role_bitmap import MemberRoleBitmap
+from role_expressions import RoleExpression
+
+class FakeGuild:
+    def __init__(self, guild_id, role_names):
+        self.id = guild_id
+        self.name = f"Guild {guild_id}"
+        self.roles = [SimpleNamespace(id=100 + i, name=name, position=i) for i, name in enumerate(role_names)]
+        self._by_id = {role.id: role for role in self.roles}
+
+    def get_role(self, role_id):
+        return self._by_id.get(role_id)
+
+    def ids(self, *names):
+        return frozenset(role.id for role in self.roles if role.name in names)
+
+def member(member_id, role_ids, bot=False):
+    return SimpleNamespace(id=member_id, bot=bot, _roles=list(role_ids))
+
+ROLES = ['A', 'B', 'C', 'Muted', 'Gold', 'Newbie', 'Pair']
+COMBOS = [
+    {'name': 'gold', 'required_roles': ['A', 'B'], 'target_role': 'Gold', 'enabled': True},
+    {'name': 'newbie', 'expression': 'not(Muted)', 'target_role': 'Newbie', 'enabled': True},
+    {'name': 'pair', 'expression': 'all(C, not(A))', 'target_role': 'Pair', 'enabled': True},
+]
+
+def test_plan_only_checks_rules_touching_changed_roles():
+    guild = FakeGuild(1, ROLES)
+    engine = RoleRuleEngine(COMBOS)
+
+    plan = engine.plan(guild, guild.ids('A', 'Newbie'), guild.ids('A', 'B', 'Newbie'))
+    assert set(plan.to_add) == guild.ids('Gold')
+    assert not plan.to_remove
+
+    plan = engine.plan(guild, guild.ids('A', 'B', 'Gold', 'Newbie'), guild.ids('A', 'Gold', 'Newbie'))
+    assert set(plan.to_remove) == guild.ids('Gold')
+
+def test_full_plan_checks_negated_rules():
+    guild = FakeGuild(2, ROLES)
+    engine = RoleRuleEngine(COMBOS)
+
+    # Nothing the member holds is named by the not() rules, but both match
+    plan = engine.full_plan(guild, guild.ids('C'))
+    assert set(plan.to_add) == guild.ids('Newbie', 'Pair')
+    assert not engine.full_plan(guild, guild.ids('A', 'C', 'Muted'))
+
+def test_bitmap_candidates_agree_with_full_plans():
+    guild = FakeGuild(3, ROLES)
+    engine = RoleRuleEngine(COMBOS)
+    compiled = engine.rules_for(guild)
+    rng = random.Random(5)
+    role_ids = [role.id for role in guild.roles]
+    members = [member(i, rng.sample(role_ids, rng.randint(0, 5)), bot=i % 17 == 0) for i in range(500)]
+
+    candidates = MemberRoleBitmap.for_rules(members, compiled).members_needing_change(compiled)
+    expected = [i for i, m in enumerate(members) if not m.bot and engine.full_plan(guild, m._roles)]
+    assert candidates == expected
+    assert candidates  # The random roles have to exercise something
+
+def test_incomplete_expression_nodes_fail_at_construction():
+    class Partial(RoleExpression):
+        def role_names(self):
+            return set()
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -1,29 +1,43 @@
 import discord
 import asyncio
-import io
+import logging
 from datetime import timedelta
-from config import LOG_CHANNEL_ID, COMMAND_TIMEOUT, MESSAGE_DELETE_DELAY, RATE_LIMIT_DELAY, RATE_LIMIT_RETRY_DELAY, ATTACHMENT_SEND_DELAY
+from permissions import permission_resolver
+from log_writer import LogEntry, log_writers
+from evidence import evidence_downloader, pack_files, format_size
+from evidence_store import evidence_store
+from evidence_images import evidence_images
+from conversations import conversations
+from rest_scheduler import rest_scheduler, Priority, channel_route, followup_route
+from dm_outbox import dm_outbox
+from deletion_scheduler import deletion_scheduler
+from config import LOG_CHANNEL_ID, COMMAND_TIMEOUT, MESSAGE_DELETE_DELAY, EVIDENCE_UPLOAD_WAIT
 
-async def safe_send_message(channel, content=None, embed=None, file=None):
-    """Send a message with rate limit handling"""
+logger = logging.getLogger(__name__)
+
+async def safe_send_message(channel, content=None, embed=None, file=None, priority=Priority.PROMPT):
+    """Send a message through the REST scheduler, which waits out rate limits"""
     try:
-        return await channel.send(content=content, embed=embed, file=file)
-    except discord.HTTPException as e:
-        if e.status == 429:  # Rate limited
-            print(f"Rate limited when sending message, waiting...")
-            await asyncio.sleep(RATE_LIMIT_RETRY_DELAY)
-            try:
-                return await channel.send(content=content, embed=embed, file=file)
-            except:
-                print(f"Failed to send message after retry")
-                return None
-        else:
-            print(f"Error sending message: {e}")
-            return None
+        return await rest_scheduler.call(
+            priority, channel_route(channel),
+            lambda: channel.send(content=content, embed=embed, file=file)
+        )
+    except (discord.HTTPException, discord.RateLimited) as e:
+        logger.error(f"Error sending message: {e}")
+        return None
+
+async def send_followup(interaction, content=None, priority=Priority.PROMPT, **kwargs):
+    """Send an interaction followup through the REST scheduler; errors are raised to the caller"""
+    return await rest_scheduler.call(
+        priority, followup_route(interaction),
+        lambda: interaction.followup.send(content, **kwargs)
+    )
 
-def has_permission(user, allowed_roles):
-    """Check if user has any of the allowed roles"""
-    return any(role.name in allowed_roles for role in user.roles)
+def has_permission(user, allowed_roles=None):
+    """Check if user has any of the allowed roles (defaults to the configured moderator roles)"""
+    if allowed_roles is None:
+        return permission_resolver.is_allowed(user)
+    return any(role.name in allowed_roles for role in getattr(user, 'roles', []))
 
 def has_evidence(message):
     """Check if message contains a link or attachment"""
@@ -33,15 +47,15 @@ def has_evidence(message):
 
 async def log_action(client, message, action_type, moderator, reason=None, duration=None):
     """Log moderation action to the log channel with embeds and pings"""
-    print(f"🔍 LOGGING: {action_type} by {moderator.display_name}")
+    logger.info(f"🔍 LOGGING: {action_type} by {moderator.display_name}")
     
     # Get log channel
     log_channel = client.get_channel(LOG_CHANNEL_ID)
     if not log_channel:
-        print(f"❌ CRITICAL: Log channel {LOG_CHANNEL_ID} not found!")
+        logger.critical(f"❌ Log channel {LOG_CHANNEL_ID} not found!")
         return
     
-    print(f"✅ Found log channel: #{log_channel.name}")
+    logger.debug(f"✅ Found log channel: #{log_channel.name}")
     
     # Get target user
     target_user = None
@@ -109,120 +123,180 @@ async def log_action(client, message, action_type, moderator, reason=None, durat
     
     embed.set_footer(text=f"Action ID: {discord.utils.utcnow().strftime('%Y%m%d_%H%M%S')}")
     
+    evidence = None
     try:
-        # Send embed
-        await log_channel.send(embed=embed)
-        print(f"✅ Sent embedded log message")
-        
-        # Send evidence attachments if they exist (download and re-upload)
+        # Download evidence attachments first so the embed can show a thumbnail
         if hasattr(message, 'attachments') and message.attachments:
-            await asyncio.sleep(0.5)  # Small delay to avoid rate limits
-            for i, attachment in enumerate(message.attachments):
-                try:
-                    # Download the attachment data
-                    print(f"⬇️ Downloading attachment: {attachment.filename}")
-                    attachment_data = await attachment.read()
-                    
-                    # Create a new Discord file object
-                    discord_file = discord.File(
-                        fp=io.BytesIO(attachment_data),
-                        filename=f"evidence_{i+1}_{attachment.filename}"
-                    )
-                    
-                    # Upload the file to the log channel
-                    await log_channel.send(
-                        content=f"📎 **Evidence {i+1}:** {attachment.filename}",
-                        file=discord_file
-                    )
-                    print(f"✅ Re-uploaded attachment: {attachment.filename}")
-                    
-                except Exception as e:
-                    print(f"❌ Error re-uploading attachment {attachment.filename}: {e}")
-                    # Fallback to link if download/upload fails
-                    try:
-                        await log_channel.send(
-                            content=f"📎 **Evidence {i+1} (fallback link):** {attachment.filename}\n{attachment.url}"
-                        )
-                        print(f"⚠️ Sent fallback link for: {attachment.filename}")
-                    except Exception as fallback_error:
-                        print(f"❌ Error sending fallback link: {fallback_error}")
-        
-    except discord.Forbidden:
-        print(f"❌ PERMISSION ERROR: Cannot send to log channel")
-    except Exception as e:
-        print(f"❌ LOGGING ERROR: {e}")
-        import traceback
-        traceback.print_exc()
-
-async def notify_user_dm(user, action_type, guild_name, moderator, reason=None, duration=None):
-    """Send a DM to the user informing them about the moderation action"""
-    try:
-        embed = discord.Embed(
-            title=f"You have been {action_type.lower()}",
-            color=discord.Color.red() if action_type.lower() in ["banned", "kicked"] else discord.Color.orange()
-        )
+            evidence = await prepare_evidence(log_channel, message.attachments)
         
-        embed.add_field(name="Server", value=guild_name, inline=True)
-        embed.add_field(name="Moderator", value=moderator.display_name, inline=True)
+        # Queue the embed; the log writer packs it with other log embeds unless it carries a thumbnail
+        entry = LogEntry(embed=embed)
+        if evidence and evidence['thumbnail']:
+            embed.set_thumbnail(url=f"attachment://{evidence['thumbnail'].filename}")
+            entry.files = [evidence['thumbnail']]
+        await log_writers.write(client, LOG_CHANNEL_ID, entry)
+        logger.info("✅ Queued embedded log message")
         
-        if duration:
-            embed.add_field(name="Duration", value=duration, inline=True)
+        # Re-upload the evidence after the embed
+        if evidence:
+            await queue_evidence(client, evidence)
         
-        if reason:
-            embed.add_field(name="Reason", value=reason, inline=False)
+    except Exception as e:
+        logger.exception(f"❌ Logging error: {e}")
+        if evidence:
+            evidence_store.release_uploads(evidence['claims'])
+
+async def prepare_evidence(log_channel, attachments):
+    """Download evidence and decide what needs uploading, skipping files already logged"""
+    size_limit = log_channel.guild.filesize_limit
+    logger.info(f"⬇️ Downloading {len(attachments)} attachment(s)")
+    download = await evidence_downloader.download_all(attachments, size_limit)
+    downloaded_bytes = download.total_bytes
+    
+    to_upload = []
+    already_logged = []
+    first_copy = {}
+    claims = {}  # SHA-256 -> this action's pending upload
+    in_flight = []  # (file, pending upload) for files another action is uploading right now
+    for file in download.downloaded:
+        stored = await evidence_store.put(file)  # Kept locally even after the original message is deleted
+        if file.sha256 in first_copy:
+            already_logged.append(f"📎 **{file.label}:** {file.filename} (same file as {first_copy[file.sha256].label})")
+            file.close()
+        elif stored.message_url:
+            already_logged.append(f"📎 **{file.label}:** {file.filename} (already logged: {stored.message_url})")
+            file.close()
         else:
-            embed.add_field(name="Reason", value="No specific reason provided", inline=False)
-        
-        embed.set_footer(text="If you believe this action was taken in error, please contact server staff.")
-        
-        await user.send(embed=embed)
-        return True  # Successfully sent DM
-    except discord.Forbidden:
-        # User has DMs disabled or blocked the bot
-        return False
-    except discord.HTTPException as e:
-        if e.status == 429:  # Rate limited
-            print(f"Rate limited when sending DM to {user.display_name}, waiting...")
-            await asyncio.sleep(RATE_LIMIT_RETRY_DELAY)
-            try:
-                await user.send(embed=embed)
-                return True
-            except:
-                print(f"Failed to send DM to {user.display_name} after retry")
-                return False
+            first_copy[file.sha256] = file
+            upload, owned = evidence_store.claim_upload(file.sha256)
+            if owned:
+                claims[file.sha256] = upload
+                to_upload.append(file)
+            else:
+                in_flight.append((file, upload))
+    
+    # Optionally shrink large images in the process pool; the first image gives the embed thumbnail
+    images = [file for file in to_upload if evidence_images.is_image(file.filename)]
+    results = await asyncio.gather(*(
+        evidence_images.process(file, evidence_store.path_for(file.sha256), thumbnail=i == 0)
+        for i, file in enumerate(images)
+    ))
+    thumbnail = next((result for result in results if result is not None), None)
+    if images and evidence_images.enabled:
+        stats = evidence_images.metrics()
+        logger.info(f"🗜️ Image stage totals: {stats['files']} file(s), {stats['cpu_seconds']}s CPU, "
+              f"{format_size(stats['bytes_saved'])} saved")
+    
+    for file in download.failed:
+        logger.warning(f"❌ Error downloading attachment {file.filename}: {file.error}")
+    lines = already_logged + [
+        f"📎 **{file.label} (fallback link):** {file.filename} ({file.error})\n{file.url}" for file in download.failed
+    ]
+    
+    uploaded_bytes = sum(file.size for file in to_upload)
+    logger.info(f"✅ Prepared {len(to_upload)} attachment(s) for upload ({format_size(uploaded_bytes)}), "
+          f"{len(already_logged)} already logged, {format_size(downloaded_bytes)} downloaded in "
+          f"{download.elapsed:.2f}s (peak {format_size(download.peak_memory)} in memory)")
+    return {
+        'files': to_upload, 'claims': claims, 'in_flight': in_flight,
+        'lines': lines, 'thumbnail': thumbnail, 'size_limit': size_limit
+    }
+
+async def queue_evidence(client, evidence):
+    """Queue prepared evidence for the log channel, up to ten files per message
+
+    Files another action was already uploading are linked to that upload
+    once it is sent, or uploaded here if it failed.
+    """
+    await queue_uploads(client, evidence['files'], evidence['size_limit'], evidence['claims'])
+    
+    # Our own uploads are queued first, so two actions waiting on each other's files can't deadlock
+    lines = evidence['lines']
+    retry = []
+    for file, pending in evidence['in_flight']:
+        try:
+            jump_url = await asyncio.wait_for(asyncio.shield(pending), EVIDENCE_UPLOAD_WAIT)
+        except asyncio.TimeoutError:
+            jump_url = None
+        if jump_url:
+            lines.append(f"📎 **{file.label}:** {file.filename} (already logged: {jump_url})")
+            file.close()
         else:
-            print(f"Error sending DM: {e}")
-            return False
+            retry.append(file)
+    await queue_uploads(client, retry, evidence['size_limit'])
+    
+    for content in chunk_lines(lines):
+        await log_writers.write(client, LOG_CHANNEL_ID, LogEntry(content=content))
 
-async def wait_for_user_response(client, original_message):
-    """Wait for the next message from the same user in the same channel with rate limit handling"""
-    def check(msg):
-        return msg.author == original_message.author and msg.channel == original_message.channel
+async def queue_uploads(client, files, size_limit, claims=None):
+    """Queue evidence files for the log channel, up to ten per message"""
+    for batch in pack_files(files, size_limit):
+        names = ", ".join(file.filename for file in batch)
+        first, last = batch[0].index + 1, batch[-1].index + 1
+        label = f"Evidence {first}" if first == last else f"Evidence {first}-{last}"
+        fallback = "\n".join(f"📎 **{file.label} (fallback link):** {file.filename}\n{file.url}" for file in batch)
+        # The links are sent instead if the upload fails
+        await log_writers.write(client, LOG_CHANNEL_ID, LogEntry(
+            content=f"📎 **{label}:** {names}"[:2000],
+            files=[file.to_file() for file in batch],
+            fallback=fallback[:2000],
+            on_done=lambda message, batch=batch: evidence_store.record_upload(batch, message, claims)
+        ))
+
+def chunk_lines(lines, limit=2000):
+    """Join lines into as few messages as fit Discord's message length"""
+    chunks = []
+    current = ""
+    for line in lines:
+        line = line[:limit]
+        if current and len(current) + len(line) + 1 > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def notify_user_dm(user, action_type, guild_name, moderator, reason=None, duration=None):
+    """Send a DM to the user informing them about the moderation action"""
+    embed = discord.Embed(
+        title=f"You have been {action_type.lower()}",
+        color=discord.Color.red() if action_type.lower() in ["banned", "kicked"] else discord.Color.orange()
+    )
     
-    try:
-        return await client.wait_for('message', check=check, timeout=COMMAND_TIMEOUT)
-    except discord.HTTPException as e:
-        if e.status == 429:  # Rate limited
-            print(f"Rate limited in wait_for_user_response, waiting...")
-            await asyncio.sleep(RATE_LIMIT_DELAY)
-        return None
-    except asyncio.TimeoutError:
-        await original_message.channel.send("Command timed out. Please try again.")
-        return None
+    embed.add_field(name="Server", value=guild_name, inline=True)
+    embed.add_field(name="Moderator", value=moderator.display_name, inline=True)
+    
+    if duration:
+        embed.add_field(name="Duration", value=duration, inline=True)
+    
+    if reason:
+        embed.add_field(name="Reason", value=reason, inline=False)
+    else:
+        embed.add_field(name="Reason", value="No specific reason provided", inline=False)
+    
+    embed.set_footer(text="If you believe this action was taken in error, please contact server staff.")
+    
+    # Paced, skipped for users known to have DMs closed, and sent once per action
+    return await dm_outbox.send(user, embed, key=dm_dedupe_key(action_type, guild_name, reason, duration))
+
+def dm_dedupe_key(action_type, guild_name, reason=None, duration=None):
+    """Identify a moderation DM, so only a repeat of the same action is deduplicated"""
+    return "\x1f".join(str(part or "") for part in (action_type, guild_name, duration, reason))
+
+async def wait_for_user_response(client, original_message):
+    """Wait for the next message from the same user in the same channel; raises asyncio.TimeoutError"""
+    return await conversations.wait_for_reply(
+        original_message.channel.id,
+        original_message.author.id,
+        COMMAND_TIMEOUT,
+        label=original_message.content.split(" ", 1)[0]
+    )
 
 async def ask_yes_no_question(client, message, question):
-    """Ask a yes/no question and return True for yes, False for no with rate limit handling"""
-    try:
-        await message.channel.send(f"{question} (yes/no)")
-    except discord.HTTPException as e:
-        if e.status == 429:  # Rate limited
-            print(f"Rate limited when asking question, waiting...")
-            await asyncio.sleep(RATE_LIMIT_DELAY)
-            try:
-                await message.channel.send(f"{question} (yes/no)")
-            except:
-                print(f"Failed to send question after retry")
-                return None
+    """Ask a yes/no question and return True for yes, False for no"""
+    if await safe_send_message(message.channel, f"{question} (yes/no)") is None:
+        return None
     
     try:
         response = await wait_for_user_response(client, message)
@@ -236,11 +310,11 @@ async def ask_yes_no_question(client, message, question):
         elif answer in ['no', 'n', 'false', '0']:
             return False
         else:
-            await message.channel.send("❌ Please answer with 'yes' or 'no'. Defaulting to 'no'.")
+            await safe_send_message(message.channel, "❌ Please answer with 'yes' or 'no'. Defaulting to 'no'.")
             return False
             
     except asyncio.TimeoutError:
-        await message.channel.send("❌ You took too long to respond. Defaulting to 'no'.")
+        await safe_send_message(message.channel, "❌ You took too long to respond. Defaulting to 'no'.")
         return False
 
 def parse_yes_no(text):
@@ -303,7 +377,7 @@ async def ensure_evidence_provided(client, message, evidence_message):
         return evidence_message
     
     # No evidence found, give them a second chance
-    await message.channel.send("❌ No evidence detected. Please send a message with a link or attachment as proof:")
+    await safe_send_message(message.channel, "❌ No evidence detected. Please send a message with a link or attachment as proof:")
     
     try:
         second_chance_message = await wait_for_user_response(client, message)
@@ -311,22 +385,16 @@ async def ensure_evidence_provided(client, message, evidence_message):
         if has_evidence(second_chance_message):
             return second_chance_message
         else:
-            await message.channel.send("❌ Still no evidence provided. Command cancelled.")
+            await safe_send_message(message.channel, "❌ Still no evidence provided. Command cancelled.")
             return None
             
     except asyncio.TimeoutError:
-        await message.channel.send("❌ You took too long to provide evidence. Command cancelled.")
+        await safe_send_message(message.channel, "❌ You took too long to provide evidence. Command cancelled.")
         return None
 
 async def delete_message_after_delay(message, delay=MESSAGE_DELETE_DELAY):
     """Delete a message after a specified delay"""
-    await asyncio.sleep(delay)
-    try:
-        await message.delete()
-    except discord.Forbidden:
-        pass  # Bot doesn't have permission to delete messages
-    except discord.NotFound:
-        pass  # Message was already deleted
+    deletion_scheduler.schedule(message, delay)
 
 def parse_duration(duration_text):
     """Parse duration string (e.g., '10m', '1h', '2d', '1w', 'permanent') into a datetime object"""
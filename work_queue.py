@@ -0,0 +1,128 @@
+"""
+Keyed Work Queue for Discord Bot
+Coalesces bursts of events per key and processes different keys in parallel
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set
+
+logger = logging.getLogger(__name__)
+
+class KeyedCoalescingQueue:
+    """Work queue holding at most one pending item per key
+
+    A new item for a key that is already waiting is merged into the pending
+    one instead of being queued again, so a burst of events for one member
+    becomes a single piece of work. Items for the same key never run
+    concurrently and run in submission order; different keys run in parallel
+    up to the concurrency limit. A key waits for the batching window before it
+    is processed so the rest of a burst can be folded in.
+    """
+
+    def __init__(self, handler: Callable[[Hashable, Any], Awaitable[None]],
+                 merge: Callable[[Any, Any], Any] = lambda old, new: new,
+                 concurrency: int = 8, window: float = 0.25, max_pending: int = 10000,
+                 name: str = 'work queue'):
+        self.handler = handler
+        self.merge = merge
+        self.concurrency = max(1, concurrency)
+        self.window = window
+        self.max_pending = max_pending
+        self.name = name
+
+        self.pending: Dict[Hashable, Any] = {}
+        self.ready = deque()  # (ready at, key); ordered because the window is constant
+        self.running: Set[Hashable] = set()
+        self.wakeup = asyncio.Event()
+        self.workers: List[asyncio.Task] = []
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+
+    def submit(self, key: Hashable, item: Any) -> bool:
+        """Queue an item, merging it with the key's pending item if there is one
+
+        Returns False if the queue is full and the item was dropped.
+        """
+        self.submitted += 1
+        if key in self.pending:
+            self.pending[key] = self.merge(self.pending[key], item)
+            self.coalesced += 1
+            return True
+
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"⚠️ {self.name} is full ({self.max_pending} pending), dropped {self.dropped} item(s) so far")
+            return False
+
+        self.pending[key] = item
+        if key not in self.running:
+            self._schedule(key)  # A running key is rescheduled when it finishes
+        self._ensure_workers()
+        return True
+
+    async def put(self, key: Hashable, item: Any):
+        """Queue an item, waiting for room instead of dropping it (for bulk producers)"""
+        while key not in self.pending and len(self.pending) >= self.max_pending:
+            await asyncio.sleep(max(self.window, 0.05))
+        self.submit(key, item)
+
+    def _schedule(self, key: Hashable):
+        self.ready.append((time.monotonic() + self.window, key))
+        self.wakeup.set()
+
+    def _ensure_workers(self):
+        if not self.workers:
+            self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def _worker(self):
+        while True:
+            while not self.ready:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+
+            ready_at, key = self.ready.popleft()
+            delay = ready_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)  # Batching window; later events still merge in
+
+            item = self.pending.pop(key)
+            self.running.add(key)
+            try:
+                await self.handler(key, item)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error processing {self.name} item for {key}: {e}")
+            finally:
+                self.running.discard(key)
+                if key in self.pending:
+                    self._schedule(key)
+
+    def metrics(self) -> Dict[str, int]:
+        """Counters for monitoring the queue"""
+        return {
+            "depth": len(self.pending),
+            "running": len(self.running),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+    async def close(self):
+        """Stop the workers, discarding anything still pending"""
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.pending.clear()
+        self.ready.clear()